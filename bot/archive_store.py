@@ -0,0 +1,602 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import os
+import re
+import sys
+import glob
+import gzip
+import json
+import time
+import zlib
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+from config import (
+    ARCHIVE_DIR_NAME, ARCHIVE_INDEX_FILE_NAME, ARCHIVE_SEGMENT_MAX_BYTES, ARCHIVE_BLOCK_ITEMS,
+    ARCHIVE_RETENTION_DAYS, ARCHIVE_COMPACT_MIN_LIVE_RATIO, ARCHIVE_MAINTENANCE_INTERVAL,
+    ARCHIVE_KEEP_MIGRATED_SNAPSHOTS,
+)
+from queue_store import InterProcessLock, item_id_of
+
+# --- Basic Setup ---
+# The logger is configured in 'main.py' to ensure a consistent format.
+logger = logging.getLogger(__name__)
+
+# --- Path Definitions ---
+BOT_DIR = os.path.dirname(__file__)
+# Directory of the archive segments and their index.
+ARCHIVE_DIR = os.path.join(BOT_DIR, ARCHIVE_DIR_NAME)
+
+# Chunk size used when reading snapshots and compressed blocks.
+READ_CHUNK_SIZE = 64 * 1024
+
+# Snapshot files written by older versions: one file per /send, as a JSON list or NDJSON.
+SNAPSHOT_PATTERNS = ('sent_links_*.json', 'sent_links_*.ndjson')
+SNAPSHOT_TIME_RE = re.compile(r'sent_links_(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})(?:_(\d{6}))?')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    item_id TEXT PRIMARY KEY,
+    item_type TEXT,
+    status TEXT,
+    sent_at REAL,
+    file_ids TEXT,
+    segment_id INTEGER,
+    block_offset INTEGER,
+    chats TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS items_by_block ON items (segment_id, block_offset);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    bytes INTEGER NOT NULL,
+    items INTEGER NOT NULL,
+    newest REAL,
+    closed INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+# --- Snapshot Files ---
+
+def _iter_json_list(f):
+    """Yield the elements of a JSON list from a text file, holding about one element in memory at a time."""
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    started = False
+
+    def read_more():
+        nonlocal buffer, position, eof
+        # Read at least as much as is buffered, so a large element is parsed a few times at most.
+        more = f.read(max(READ_CHUNK_SIZE, len(buffer) - position))
+        eof = not more
+        buffer, position = buffer[position:] + more, 0
+
+    while True:
+        # Skip whitespace and separators.
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) or eof:
+                break
+            read_more()
+        if position >= len(buffer):
+            raise ValueError("Unexpected end of the JSON list.")
+        if not started:
+            if buffer[position] != '[':
+                raise ValueError("The file does not contain a JSON list.")
+            started = True
+            position += 1
+            continue
+        if buffer[position] == ']':
+            return
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if eof:
+                    raise
+                read_more()
+                continue
+            # A number at the end of the buffer may continue in the next chunk.
+            if end < len(buffer) or eof:
+                break
+            read_more()
+        position = end
+        yield value
+
+def iter_snapshot_items(path):
+    """Stream the items of a snapshot file (a JSON list or NDJSON) without loading the whole file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            yield from _iter_json_list(f)
+            return
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.warning("Skipping corrupted line in '%s': %r", path, line[:80])
+
+def snapshot_time(path):
+    """The time a snapshot was written, from its file name or else its modification time."""
+    match = SNAPSHOT_TIME_RE.search(os.path.basename(path))
+    if match:
+        text, fraction = match.groups()
+        return datetime.strptime(f"{text}_{fraction or '000000'}", "%Y-%m-%d_%H-%M-%S_%f").timestamp()
+    return os.path.getmtime(path)
+
+
+# --- Archive ---
+
+class ArchiveBatch:
+    """
+    Items being added to the archive in one SQLite transaction.
+
+    Items are compressed in blocks of 'block_items' and appended to the
+    current segment as separate gzip members, so a single block can be
+    decompressed on its own. Nothing is visible in the index until commit(),
+    which first flushes the segment to disk. Leaving the 'with' block without
+    commit() rolls the batch back; its blocks are cut off the segment again
+    by the next batch.
+    """
+
+    def __init__(self, store, describe):
+        self.store = store
+        self.describe = describe
+        self.count = 0
+        self._db = store._connect()
+        self._file = None
+        self._segment = None  # [id, name, items, newest]
+        self._lines = []
+        self._rows = []
+        self._committed = False
+
+    def __enter__(self):
+        self._db.execute('BEGIN IMMEDIATE')
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if not self._committed:
+            self._db.execute('ROLLBACK')
+
+    def _open_segment(self):
+        """Continue the open segment, or start a new one if there is none or it is full."""
+        row = self._db.execute('SELECT id, name, bytes, items, newest FROM segments WHERE closed = 0').fetchone()
+        if row is not None:
+            segment_id, name, size, items, newest = row
+            path = os.path.join(self.store.root, name)
+            if os.path.exists(path) and size < self.store.segment_max_bytes:
+                self._file = open(path, 'r+b')
+                # Cut off blocks written by a batch that was not committed.
+                self._file.truncate(size)
+                self._file.seek(size)
+                self._segment = [segment_id, name, items, newest]
+                return
+            self._db.execute('UPDATE segments SET closed = 1 WHERE id = ?', (segment_id,))
+        name = f"segment_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S_%f')}.ndjson.gz"
+        self._file = open(os.path.join(self.store.root, name), 'wb')
+        cursor = self._db.execute('INSERT INTO segments (name, bytes, items) VALUES (?, 0, 0)', (name,))
+        self._segment = [cursor.lastrowid, name, 0, None]
+
+    def _finish_segment(self, closed):
+        """Flush the current segment to disk and record its size in the transaction."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        segment_id, _, items, newest = self._segment
+        self._db.execute(
+            'UPDATE segments SET bytes = ?, items = ?, newest = ?, closed = ? WHERE id = ?',
+            (self._file.tell(), items, newest, int(closed), segment_id),
+        )
+        self._file.close()
+        self._file = None
+
+    def _write_block(self):
+        if not self._lines:
+            return
+        if self._file is None:
+            self._open_segment()
+        elif self._file.tell() >= self.store.segment_max_bytes:
+            self._finish_segment(closed=True)
+            self._open_segment()
+        offset = self._file.tell()
+        self._file.write(gzip.compress(b''.join(self._lines), compresslevel=6, mtime=0))
+        segment_id = self._segment[0]
+        self._db.executemany(
+            'INSERT OR REPLACE INTO items (item_id, item_type, status, sent_at, file_ids, chats, segment_id, block_offset) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [row + (segment_id, offset) for row in self._rows],
+        )
+        self._segment[2] += len(self._lines)
+        sent_times = [row[3] for row in self._rows if row[3] is not None]
+        if self._segment[3] is not None:
+            sent_times.append(self._segment[3])
+        if sent_times:
+            self._segment[3] = max(sent_times)
+        self._lines, self._rows = [], []
+
+    def add(self, item, line=None, info=None):
+        """
+        Add an item. 'line' is its JSON line, if it is already encoded, and 'info'
+        its (status, sent_at, file_ids, chats); by default it is taken from 'describe(item)'.
+        """
+        if line is None:
+            line = (json.dumps(item, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        status, sent_at, file_ids, chats = info if info is not None else self.describe(item)
+        item_id = item_id_of(item)
+        self._lines.append(line)
+        if item_id is not None:
+            item_type = item.get('type') if isinstance(item, dict) else 'video'
+            self._rows.append((
+                str(item_id), item_type, status, sent_at,
+                json.dumps(file_ids) if file_ids else None, json.dumps(chats) if chats else None,
+            ))
+        self.count += 1
+        if len(self._lines) >= self.store.block_items:
+            self._write_block()
+
+    def commit(self):
+        """Make the added items durable and visible in the index."""
+        self._write_block()
+        if self._file is not None:
+            self._finish_segment(closed=False)
+        self._db.execute('COMMIT')
+        self._committed = True
+
+
+class ArchiveStore:
+    """
+    Archive of sent items: compressed, rotated segments with an SQLite index.
+
+    Segments are gzip-compressed NDJSON files, 'segment_<time>.ndjson.gz'.
+    A new segment is started once the current one reaches
+    'segment_max_bytes'. The index maps every item ID to when it was sent,
+    its delivery status overall and per chat, its Telegram file_ids and
+    the block of the segment that holds it, so a lookup reads one small
+    block instead of scanning the archive. Writers in all processes are serialized by a lock file.
+    """
+
+    def __init__(self, root, index_file_name=ARCHIVE_INDEX_FILE_NAME,
+                 segment_max_bytes=ARCHIVE_SEGMENT_MAX_BYTES, block_items=ARCHIVE_BLOCK_ITEMS):
+        self.root = root
+        self.index_path = os.path.join(root, index_file_name)
+        self.segment_max_bytes = segment_max_bytes
+        self.block_items = block_items
+        self._db = None
+        self._lock = threading.Lock()
+        self._process_lock = InterProcessLock(os.path.join(root, 'archive.lock'))
+        self._last_maintenance = None
+
+    # --- Internal Helpers ---
+
+    def _connect(self):
+        """Open the index, creating it if needed. Must be called with the lock held."""
+        if self._db is None:
+            os.makedirs(self.root, exist_ok=True)
+            db = sqlite3.connect(self.index_path, timeout=60, isolation_level=None, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            # The queue journal is rewritten right after a commit, so the commit must survive a power loss.
+            db.execute('PRAGMA synchronous=FULL')
+            db.executescript(SCHEMA)
+            # Indexes created before routing existed have no per-chat outcome.
+            if 'chats' not in [row[1] for row in db.execute('PRAGMA table_info(items)')]:
+                db.execute('ALTER TABLE items ADD COLUMN chats TEXT')
+            self._db = db
+        return self._db
+
+    def _checkpoint(self):
+        """Write the SQLite log back into the index and truncate it, e.g. after a large migration."""
+        self._connect().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            with self._process_lock:
+                yield
+
+    def _read_block(self, segment, offset):
+        """Decompress the block starting at 'offset' in a segment."""
+        decompressor = zlib.decompressobj(wbits=31)  # A single gzip member.
+        data = []
+        with open(os.path.join(self.root, segment), 'rb') as f:
+            f.seek(offset)
+            while not decompressor.eof:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    raise ValueError(f"Block at {offset} of '{segment}' is truncated.")
+                data.append(decompressor.decompress(chunk))
+        return b''.join(data)
+
+    # --- Writing ---
+
+    @contextmanager
+    def batch(self, describe):
+        """
+        Start adding items. 'describe(item)' returns the (status, sent_at, file_ids, chats) to index.
+        The batch must be committed inside the 'with' block, otherwise it is rolled back.
+        """
+        with self._locked(), ArchiveBatch(self, describe) as batch:
+            yield batch
+
+    def snapshot_paths(self):
+        """Snapshot files of older versions that were not migrated yet, oldest first."""
+        paths = []
+        for pattern in SNAPSHOT_PATTERNS:
+            paths.extend(glob.glob(os.path.join(self.root, pattern)))
+        return sorted(paths)
+
+    def migrate_snapshots(self, file_ids_of=None, keep=ARCHIVE_KEEP_MIGRATED_SNAPSHOTS):
+        """
+        Move the snapshot files of older versions into the archive, streaming one file at a time.
+        'file_ids_of(item)' may return cached file_ids to index. Returns the number of migrated items.
+        """
+        migrated = 0
+        for path in self.snapshot_paths():
+            sent_at = snapshot_time(path)
+
+            def describe(item):
+                # Snapshots do not record whether an item was delivered.
+                return None, sent_at, file_ids_of(item) if file_ids_of else None, None
+
+            try:
+                with self.batch(describe) as batch:
+                    for item in iter_snapshot_items(path):
+                        batch.add(item)
+                    batch.commit()
+            except (OSError, ValueError) as e:
+                logger.error("Could not migrate archive snapshot '%s': %s", path, e)
+                continue
+            if keep:
+                os.replace(path, path + '.migrated')
+            else:
+                os.remove(path)
+            migrated += batch.count
+            logger.info("Migrated %s items from snapshot '%s' into the archive.", batch.count, path)
+        if migrated:
+            with self._locked():
+                self._checkpoint()
+        return migrated
+
+    # --- Reading ---
+
+    def lookup(self, item_id):
+        """Return the index entry of an item as a dict, or None if it was never archived."""
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT item_id, item_type, status, sent_at, file_ids, chats, segments.name, block_offset '
+                'FROM items LEFT JOIN segments ON segments.id = items.segment_id WHERE item_id = ?',
+                (str(item_id),),
+            ).fetchone()
+        if row is None:
+            return None
+        item_id, item_type, status, sent_at, file_ids, chats, segment, block_offset = row
+        return {
+            'itemId': item_id, 'type': item_type, 'status': status, 'sentAt': sent_at,
+            'fileIds': json.loads(file_ids) if file_ids else None, 'chats': json.loads(chats) if chats else None,
+            'segment': segment, 'blockOffset': block_offset,
+        }
+
+    def get_item(self, item_id):
+        """Return the archived item, or None if it was never archived or its segment was removed."""
+        entry = self.lookup(item_id)
+        if entry is None or entry['segment'] is None:
+            return None
+        found = None
+        # Only lines that contain the ID are parsed.
+        needle = json.dumps(entry['itemId'], ensure_ascii=False).encode('utf-8')[1:-1]
+        for line in self._read_block(entry['segment'], entry['blockOffset']).splitlines():
+            if needle not in line:
+                continue
+            item = json.loads(line)
+            if str(item_id_of(item)) == entry['itemId']:
+                found = item
+        return found
+
+    def iter_item_ids(self):
+        """Stream every indexed item ID, without holding a lock, e.g. to seed the de-duplication index."""
+        if not os.path.exists(self.index_path):
+            return
+        db = sqlite3.connect(self.index_path, timeout=60)
+        try:
+            for (item_id,) in db.execute('SELECT item_id FROM items'):
+                yield item_id
+        finally:
+            db.close()
+
+    def stats(self):
+        """Item and segment counts, sizes and the time range of the archive."""
+        with self._lock:
+            db = self._connect()
+            items, oldest, newest = db.execute('SELECT COUNT(*), MIN(sent_at), MAX(sent_at) FROM items').fetchone()
+            expired = db.execute('SELECT COUNT(*) FROM items WHERE segment_id IS NULL').fetchone()[0]
+            by_status = dict(db.execute("SELECT COALESCE(status, 'unknown'), COUNT(*) FROM items GROUP BY 1"))
+            segments = db.execute('SELECT COUNT(*), COALESCE(SUM(bytes), 0), COALESCE(SUM(items), 0) FROM segments').fetchone()
+        index_bytes = sum(
+            os.path.getsize(path) for path in glob.glob(self.index_path + '*') if os.path.isfile(path)
+        )
+        return {
+            'items': items, 'expired_items': expired, 'by_status': by_status,
+            'oldest': oldest, 'newest': newest,
+            'segments': segments[0], 'segment_bytes': segments[1], 'stored_items': segments[2],
+            'index_bytes': index_bytes, 'snapshots': len(self.snapshot_paths()),
+        }
+
+    # --- Maintenance ---
+
+    def _compact_segment(self, segment_id, name):
+        """Copy the current items of a segment into the open segment and delete it. Returns the freed bytes."""
+        db = self._connect()
+        offsets = [row[0] for row in db.execute(
+            'SELECT DISTINCT block_offset FROM items WHERE segment_id = ? ORDER BY block_offset', (segment_id,)
+        )]
+        with ArchiveBatch(self, describe=None) as batch:
+            for offset in offsets:
+                rows = {
+                    item_id: (status, sent_at, json.loads(file_ids) if file_ids else None, json.loads(chats) if chats else None)
+                    for item_id, status, sent_at, file_ids, chats in db.execute(
+                        'SELECT item_id, status, sent_at, file_ids, chats FROM items WHERE segment_id = ? AND block_offset = ?',
+                        (segment_id, offset),
+                    )
+                }
+                for line in self._read_block(name, offset).splitlines(keepends=True):
+                    item = json.loads(line)
+                    # Earlier copies of an item that was archived again are dropped.
+                    info = rows.pop(str(item_id_of(item)), None)
+                    if info is not None:
+                        batch.add(item, line, info)
+            db.execute('DELETE FROM segments WHERE id = ?', (segment_id,))
+            batch.commit()
+        path = os.path.join(self.root, name)
+        freed = os.path.getsize(path)
+        os.remove(path)
+        return freed
+
+    def maintain(self, retention_days=ARCHIVE_RETENTION_DAYS, min_live_ratio=ARCHIVE_COMPACT_MIN_LIVE_RATIO):
+        """
+        Delete segments older than 'retention_days' and rewrite closed segments in which
+        less than 'min_live_ratio' of the items are current. Expired items stay in the index.
+        Returns a dict with the number of removed and compacted segments and the freed bytes.
+        """
+        result = {'expired_segments': 0, 'expired_items': 0, 'compacted_segments': 0, 'orphaned_files': 0, 'freed_bytes': 0}
+        with self._locked():
+            db = self._connect()
+            known = {row[0] for row in db.execute('SELECT name FROM segments')}
+            # Segments started by a batch that was never committed.
+            for path in glob.glob(os.path.join(self.root, 'segment_*.ndjson.gz')):
+                if os.path.basename(path) not in known:
+                    result['freed_bytes'] += os.path.getsize(path)
+                    os.remove(path)
+                    result['orphaned_files'] += 1
+
+            if retention_days is not None:
+                cutoff = time.time() - retention_days * 24 * 60 * 60
+                expired = db.execute('SELECT id, name FROM segments WHERE newest < ?', (cutoff,)).fetchall()
+                for segment_id, name in expired:
+                    db.execute('BEGIN IMMEDIATE')
+                    cursor = db.execute(
+                        'UPDATE items SET segment_id = NULL, block_offset = NULL WHERE segment_id = ?', (segment_id,)
+                    )
+                    db.execute('DELETE FROM segments WHERE id = ?', (segment_id,))
+                    db.execute('COMMIT')
+                    path = os.path.join(self.root, name)
+                    if os.path.exists(path):
+                        result['freed_bytes'] += os.path.getsize(path)
+                        os.remove(path)
+                    result['expired_segments'] += 1
+                    result['expired_items'] += cursor.rowcount
+
+            candidates = db.execute(
+                'SELECT id, name, items, (SELECT COUNT(*) FROM items WHERE items.segment_id = segments.id) '
+                'FROM segments WHERE closed = 1'
+            ).fetchall()
+            for segment_id, name, stored, live in candidates:
+                if stored and live / stored < min_live_ratio:
+                    result['freed_bytes'] += self._compact_segment(segment_id, name)
+                    result['compacted_segments'] += 1
+            self._checkpoint()
+        return result
+
+    def maintain_if_due(self, interval=ARCHIVE_MAINTENANCE_INTERVAL):
+        """Run maintain() if it has not run for 'interval' seconds. Returns its result, or None."""
+        now = time.monotonic()
+        if self._last_maintenance is not None and now - self._last_maintenance < interval:
+            return None
+        self._last_maintenance = now
+        result = self.maintain()
+        if any(result.values()):
+            logger.info(
+                "Archive maintenance: %s segments expired (%s items), %s compacted, %s orphaned files removed, %.1f MB freed.",
+                result['expired_segments'], result['expired_items'], result['compacted_segments'],
+                result['orphaned_files'], result['freed_bytes'] / 1024 / 1024,
+            )
+        return result
+
+
+# --- Shared Instance ---
+ARCHIVE_STORE = ArchiveStore(ARCHIVE_DIR)
+
+
+# --- Command Line ---
+
+def _format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S") if timestamp is not None else "unknown"
+
+def main(argv=None):
+    """Look up items and maintain the archive from the command line."""
+    parser = argparse.ArgumentParser(prog="archive_store.py", description="Inspect and maintain the archive of sent items.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    lookup_parser = commands.add_parser('lookup', help="Show when items were sent.")
+    lookup_parser.add_argument('item_ids', nargs='+')
+    lookup_parser.add_argument('--item', action='store_true', help="Also print the archived items.")
+    commands.add_parser('stats', help="Show the size and contents of the archive.")
+    migrate_parser = commands.add_parser('migrate', help="Move 'sent_links_*' snapshot files into the archive.")
+    migrate_parser.add_argument(
+        '--keep', action='store_true', default=ARCHIVE_KEEP_MIGRATED_SNAPSHOTS,
+        help="Rename migrated snapshots to '*.migrated' instead of deleting them."
+    )
+    maintain_parser = commands.add_parser('maintain', help="Apply the retention period and compact segments.")
+    maintain_parser.add_argument(
+        '--retention-days', type=float, default=ARCHIVE_RETENTION_DAYS,
+        help="Delete segments older than this (default: %(default)s)."
+    )
+    args = parser.parse_args(argv)
+
+    from log_config import setup_logging
+    setup_logging()
+
+    if args.command == 'lookup':
+        found = True
+        for item_id in args.item_ids:
+            entry = ARCHIVE_STORE.lookup(item_id)
+            if entry is None:
+                print(f"{item_id}: not archived")
+                found = False
+                continue
+            where = f"{entry['segment']} @ {entry['blockOffset']}" if entry['segment'] else "segment removed by retention"
+            print(
+                f"{item_id}: {entry['type']}, {entry['status'] or 'unknown status'}, "
+                f"sent {_format_time(entry['sentAt'])}, file_ids {entry['fileIds'] or '-'}, {where}"
+            )
+            if entry['chats']:
+                print("    chats: " + ', '.join(f"{chat_id} {status}" for chat_id, status in entry['chats'].items()))
+            if args.item and entry['segment']:
+                print(json.dumps(ARCHIVE_STORE.get_item(item_id), ensure_ascii=False, indent=2))
+        return 0 if found else 1
+
+    if args.command == 'stats':
+        stats = ARCHIVE_STORE.stats()
+        print(f"Items:      {stats['items']} indexed ({stats['expired_items']} without a segment)")
+        print(f"Status:     {', '.join(f'{status} {count}' for status, count in sorted(stats['by_status'].items())) or '-'}")
+        print(f"Sent:       {_format_time(stats['oldest'])} to {_format_time(stats['newest'])}")
+        print(f"Segments:   {stats['segments']} ({stats['segment_bytes'] / 1024 / 1024:.1f} MB, {stats['stored_items']} items stored)")
+        print(f"Index:      {stats['index_bytes'] / 1024 / 1024:.1f} MB")
+        print(f"Snapshots:  {stats['snapshots']} not migrated yet")
+        return 0
+
+    if args.command == 'migrate':
+        from file_id_cache import FILE_ID_CACHE
+        FILE_ID_CACHE.load()
+        migrated = ARCHIVE_STORE.migrate_snapshots(FILE_ID_CACHE.file_ids_of, keep=args.keep)
+        print(f"Migrated {migrated} items.")
+        return 0
+
+    result = ARCHIVE_STORE.maintain(retention_days=args.retention_days)
+    print(
+        f"Expired {result['expired_segments']} segments ({result['expired_items']} items), "
+        f"compacted {result['compacted_segments']}, removed {result['orphaned_files']} orphaned files, "
+        f"freed {result['freed_bytes'] / 1024 / 1024:.1f} MB."
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+"""
+Benchmark for the archive of sent items.
+
+Writes 'sent_links_*.json' snapshot files like older versions did (one
+pretty-printed JSON list per /send, with unmodified TikTok API responses),
+then compares them with the archive store from 'archive_store.py':
+
+    - disk use of the snapshots and of the compressed segments plus index,
+    - time and peak Python memory of the migration, for a small and a
+      large snapshot, showing that memory does not grow with the file,
+    - "was item X sent, and when?": scanning the snapshots versus an
+      index lookup, and reading the archived item back.
+
+Usage (from the 'bot' directory):
+    python benchmarks/bench_archive.py [--snapshots 40] [--items 1000] [--large 20000] [--lookups 200]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+# Make the bot modules importable when running from the 'benchmarks' directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive_store import ArchiveStore
+from fake_tiktok_cdn import FakeTikTokCdn
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float('nan')
+
+def _dir_bytes(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def write_snapshots(root, cdn, snapshots, items_per_snapshot, first_id):
+    """Write snapshot files like the old /send did. Returns the item IDs."""
+    kinds = ['video', 'video', 'photo_video', 'message']
+    item_ids = []
+    number = first_id
+    for snapshot in range(snapshots):
+        items = []
+        for _ in range(items_per_snapshot):
+            kind = kinds[number % len(kinds)]
+            item_id = str(7_000_000_000_000_000_000 + number)
+            if kind == 'message':
+                items.append({'type': 'message', 'itemId': item_id, 'author': 'bench_user', 'text': f"Message {number}"})
+            else:
+                items.append(cdn.collected_item(item_id, kind))
+            item_ids.append(item_id)
+            number += 1
+        timestamp = time.strftime("%Y-%m-%d_%H-%M-%S", time.localtime(1_700_000_000 + first_id + snapshot * 3600))
+        with open(os.path.join(root, f"sent_links_{timestamp}.json"), 'w', encoding='utf-8') as f:
+            json.dump(items, f, ensure_ascii=False, indent=4)
+    return item_ids
+
+def scan_snapshots(root, item_id):
+    """Answer "was this item sent?" the old way: read every snapshot until the item is found."""
+    for name in sorted(os.listdir(root)):
+        if name.startswith('sent_links_'):
+            with open(os.path.join(root, name), 'r', encoding='utf-8') as f:
+                for item in json.load(f):
+                    if isinstance(item, dict) and item.get('itemId') == item_id:
+                        return name
+    return None
+
+def migrate_measured(store):
+    """Migrate all snapshots. Returns (items, seconds, peak MB of Python allocations)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    migrated = store.migrate_snapshots()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return migrated, seconds, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--snapshots', type=int, default=40, help="Number of regular snapshot files.")
+    parser.add_argument('--items', type=int, default=1000, help="Items per regular snapshot file.")
+    parser.add_argument('--large', type=int, default=20000, help="Items in the single large snapshot file.")
+    parser.add_argument('--lookups', type=int, default=200, help="Number of random lookups.")
+    args = parser.parse_args()
+
+    random.seed(1)
+    cdn = FakeTikTokCdn(port=0)
+    work_dir = tempfile.mkdtemp(prefix="tt2tg_bench_archive_")
+    try:
+        # Peak memory of migrating a small and a large snapshot on its own.
+        memory = []
+        for count in (args.items, args.large):
+            root = os.path.join(work_dir, f"single_{count}")
+            os.makedirs(root)
+            write_snapshots(root, cdn, 1, count, first_id=0)
+            snapshot_mb = _dir_bytes(root) / 1024 / 1024
+            _, seconds, peak_mb = migrate_measured(ArchiveStore(root))
+            memory.append((count, snapshot_mb, seconds, peak_mb))
+
+        root = os.path.join(work_dir, 'sent_archive')
+        os.makedirs(root)
+        print(f"Writing {args.snapshots} snapshots of {args.items} items...", flush=True)
+        item_ids = write_snapshots(root, cdn, args.snapshots, args.items, first_id=1_000_000)
+        snapshot_bytes = _dir_bytes(root)
+        sample = random.sample(item_ids, min(args.lookups, len(item_ids)))
+
+        # Scanning is slow, so only a few lookups are timed for the old way.
+        scan_times = []
+        for item_id in sample[:10]:
+            start = time.perf_counter()
+            assert scan_snapshots(root, item_id)
+            scan_times.append(time.perf_counter() - start)
+
+        store = ArchiveStore(root)
+        migrated, migrate_seconds, migrate_peak_mb = migrate_measured(store)
+        archive_bytes = _dir_bytes(root)
+
+        lookup_times, read_times = [], []
+        for item_id in sample:
+            start = time.perf_counter()
+            assert store.lookup(item_id)['sentAt']
+            lookup_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            assert store.get_item(item_id)['itemId'] == item_id
+            read_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        stats = store.stats()
+        stats_seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print("\nMigration memory (one snapshot file):")
+    print(f"{'items':>8} | {'snapshot (MB)':>13} | {'time (s)':>8} | {'peak Python memory (MB)':>23}")
+    print("-" * 62)
+    for count, snapshot_mb, seconds, peak_mb in memory:
+        print(f"{count:>8} | {snapshot_mb:>13.1f} | {seconds:>8.2f} | {peak_mb:>23.1f}")
+
+    print(f"\nArchive of {migrated} items in {args.snapshots} snapshots:")
+    print(f"  disk use:        {snapshot_bytes / 1024 / 1024:.1f} MB of snapshots -> "
+          f"{archive_bytes / 1024 / 1024:.1f} MB ({stats['segment_bytes'] / 1024 / 1024:.1f} MB segments, "
+          f"{stats['index_bytes'] / 1024 / 1024:.1f} MB index)")
+    print(f"  migration:       {migrate_seconds:.1f}s ({migrated / migrate_seconds:.0f} items/s), "
+          f"peak Python memory {migrate_peak_mb:.1f} MB")
+    print(f"  was X sent?      scan p50 {_percentile(scan_times, 0.5) * 1000:.0f} ms -> "
+          f"index p50 {_percentile(lookup_times, 0.5) * 1e6:.0f} us / p99 {_percentile(lookup_times, 0.99) * 1e6:.0f} us")
+    print(f"  read item back:  p50 {_percentile(read_times, 0.5) * 1000:.2f} ms / p99 {_percentile(read_times, 0.99) * 1000:.2f} ms")
+    print(f"  stats:           {stats_seconds * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
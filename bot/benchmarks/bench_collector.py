@@ -0,0 +1,116 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+"""
+Load test for the collector server.
+
+Runs the collector app under Flask's development server and under
+waitress in a separate process, fires concurrent '/send_item' requests
+at each, and reports
+requests/sec and latency percentiles. The queue journal and the
+de-duplication index are written to a temporary directory with the
+configured fsync setting, so disk I/O is part of the measurement.
+
+Usage (from the 'bot' directory):
+    python benchmarks/bench_collector.py [--requests 2000] [--clients 32]
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Make the bot modules importable when running from the 'benchmarks' directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import collector
+from config import COLLECTOR_THREADS
+from dedup_index import DEDUP_INDEX
+from queue_store import ITEM_QUEUE
+
+
+def serve(server_name, temp_dir, port_queue):
+    """Run the collector in a separate process, so the load generator does not share its GIL."""
+    # Per-request access logs and queue depth warnings would drown the results.
+    for name in ('werkzeug', 'waitress', 'waitress.queue'):
+        logging.getLogger(name).setLevel(logging.ERROR)
+    ITEM_QUEUE.path = os.path.join(temp_dir, f'{server_name}_urls_to_send.ndjson')
+    DEDUP_INDEX.path = os.path.join(temp_dir, f'{server_name}_dedup_index.ndjson')
+    collector.INGEST_WRITER.start()
+
+    if server_name == 'flask':
+        # The old setup: 'app.run' uses this threaded development server.
+        from werkzeug.serving import make_server
+        server = make_server('127.0.0.1', 0, collector.app, threaded=True)
+        port_queue.put(server.server_port)
+        server.serve_forever()
+    else:
+        from waitress.server import create_server
+        server = create_server(collector.app, host='127.0.0.1', port=0, threads=COLLECTOR_THREADS)
+        port_queue.put(server.effective_port)
+        server.run()
+
+
+def run_load(port, total, clients, prefix):
+    """Send 'total' items from 'clients' threads. Returns (elapsed, latencies, status_counts)."""
+    url = f"http://127.0.0.1:{port}/send_item"
+    local = threading.local()
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def send(n):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        item = {'type': 'message', 'itemId': f"{prefix}_{n}", 'author': 'bench', 'text': f"message {n}"}
+        start = time.perf_counter()
+        response = local.session.post(url, json=item, timeout=60)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(send, range(total)))
+    return time.perf_counter() - start, sorted(latencies), statuses
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--clients', type=int, default=32)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        print(f"{args.requests} requests from {args.clients} clients (fsync={ITEM_QUEUE.fsync})\n")
+        print(f"{'server':>10} | {'req/s':>8} | {'p50 (ms)':>9} | {'p99 (ms)':>9} | statuses")
+        print("-" * 60)
+        for name in ('flask', 'waitress'):
+            port_queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target=serve, args=(name, temp_dir, port_queue), daemon=True)
+            process.start()
+            try:
+                port = port_queue.get(timeout=30)
+                # Warm up connections and code paths before measuring.
+                run_load(port, min(100, args.requests), args.clients, f"{name}_warmup")
+                elapsed, latencies, statuses = run_load(port, args.requests, args.clients, name)
+            finally:
+                process.terminate()
+                process.join()
+            print(f"{name:>10} | {args.requests / elapsed:>8.0f} | {percentile(latencies, 0.5) * 1000:>9.1f} | "
+                  f"{percentile(latencies, 0.99) * 1000:>9.1f} | {statuses}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+"""
+Micro-benchmark for the de-duplication index.
+
+Compares membership checks against the old fixed-size deque with the
+persistent DedupIndex at 10k, 100k and 1M item IDs.
+
+Usage (from the 'bot' directory):
+    python benchmarks/bench_dedup.py
+"""
+
+import os
+import sys
+import time
+import tempfile
+from collections import deque
+
+# Make the bot modules importable when running from the 'benchmarks' directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup_index import DedupIndex
+
+SIZES = [10_000, 100_000, 1_000_000]
+LOOKUPS = 1_000
+
+
+def time_lookups(container, ids):
+    """Return the average lookup time in microseconds."""
+    start = time.perf_counter()
+    for item_id in ids:
+        _ = item_id in container
+    return (time.perf_counter() - start) / len(ids) * 1e6
+
+
+def main():
+    print(f"{'IDs':>10} | {'deque (us)':>12} | {'index (us)':>12} | {'index load (s)':>14}")
+    print("-" * 58)
+    for size in SIZES:
+        ids = [f"7{n:018d}" for n in range(size)]
+        # Worst case for the deque: IDs that are not present at all.
+        probes = [f"8{n:018d}" for n in range(LOOKUPS)]
+
+        cache = deque(ids, maxlen=size)
+        # The deque scan is linear, so only a few probes are needed at large sizes.
+        deque_us = time_lookups(cache, probes[:max(10, LOOKUPS * 10_000 // size)])
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'dedup_index.ndjson')
+            index = DedupIndex(path, max_entries=size)
+            index.add_many(ids)
+            index_us = time_lookups(index, probes)
+
+            start = time.perf_counter()
+            reloaded = DedupIndex(path, max_entries=size)
+            reloaded.load()
+            load_s = time.perf_counter() - start
+
+        print(f"{size:>10} | {deque_us:>12.2f} | {index_us:>12.2f} | {load_s:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
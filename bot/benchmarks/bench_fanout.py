@@ -0,0 +1,95 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+"""
+Benchmark for sending the same items to several chats.
+
+Runs the 'mixed' workload of bench_suite.py (text messages, videos and
+albums) once with a single target chat and once routed to several chats
+(ROUTES), each in a fresh process, and compares:
+
+    - bytes downloaded from the fake TikTok CDN,
+    - bytes uploaded to the fake Bot API,
+    - the Bot API calls made (uploads, file_id re-sends, copyMessage),
+    - the wall time of the dispatch.
+
+The "one bot per chat" column is what running a separate copy of the bot
+for every chat would cost: every item downloaded and uploaded once per chat.
+
+Usage (from the 'bot' directory):
+    python benchmarks/bench_fanout.py [--chats 5] [--scale 0.5] [--video-mb 2]
+"""
+
+import os
+import sys
+import argparse
+import multiprocessing
+
+# Make the bot modules importable when running from the 'benchmarks' directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import CHAT_ID, WORKLOADS, run_workload
+from fake_bot_api import FakeBotApi
+from fake_tiktok_cdn import FakeTikTokCdn
+
+# Bot API methods reported in the comparison.
+METHODS = ('sendMessage', 'sendVideo', 'sendMediaGroup', 'copyMessage')
+
+
+def run(api, cdn, settings, count, chats):
+    """Run the mixed workload routed to 'chats' chats. Returns (result, Bot API calls/bytes, CDN bytes)."""
+    api_before, cdn_before = dict(api.counts), dict(cdn.counts)
+    settings['routes'] = [{'chats': [CHAT_ID - n for n in range(chats)]}] if chats > 1 else []
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=run_workload, args=('mixed', count, settings, results))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"Run with {chats} chats failed with exit code {process.exitcode}.")
+    calls = {key: api.counts.get(key, 0) - api_before.get(key, 0) for key in METHODS + ('bytes',)}
+    return results.get(), calls, cdn.counts['bytes'] - cdn_before['bytes']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chats', type=int, default=5, help="Number of chats every item is routed to.")
+    parser.add_argument('--scale', type=float, default=0.5, help="Multiply the number of items in the workload.")
+    parser.add_argument('--video-mb', type=float, default=2.0, help="Size of each synthetic video (MB).")
+    parser.add_argument('--api-bandwidth', type=float, default=20e6, help="Fake Bot API upload bandwidth (bytes/s).")
+    parser.add_argument('--api-latency', type=float, default=0.02, help="Fake Bot API latency per request (s).")
+    args = parser.parse_args()
+
+    api = FakeBotApi(chat_limit=30, window=1.0, retry_after=1, latency=args.api_latency, bandwidth=args.api_bandwidth).start()
+    cdn = FakeTikTokCdn(video_bytes=int(args.video_mb * 1024 * 1024), latency=0.01).start()
+    settings = {
+        'api_url': api.api_url, 'cdn_url': cdn.base_url, 'chat_rate': 1200,
+        'clients': 4, 'collector_threads': 8,
+    }
+    count = max(1, int(WORKLOADS['mixed'][1] * args.scale))
+    try:
+        print(f"Sending {count} mixed items to 1 chat...", flush=True)
+        single = run(api, cdn, settings, count, 1)
+        print(f"Sending {count} mixed items to {args.chats} chats...", flush=True)
+        fanout = run(api, cdn, settings, count, args.chats)
+    finally:
+        api.stop()
+        cdn.stop()
+
+    (single_result, single_calls, single_cdn), (fanout_result, fanout_calls, fanout_cdn) = single, fanout
+    mb = 1024 * 1024
+    print(f"\n{'':>22} | {'1 chat':>10} | {f'{args.chats} bots':>10} | {f'{args.chats} chats':>10}")
+    print("-" * 62)
+    rows = [
+        ("CDN download (MB)", single_cdn / mb, args.chats * single_cdn / mb, fanout_cdn / mb),
+        ("Bot API upload (MB)", single_calls['bytes'] / mb, args.chats * single_calls['bytes'] / mb, fanout_calls['bytes'] / mb),
+        ("dispatch time (s)", single_result['dispatch']['seconds'], None, fanout_result['dispatch']['seconds']),
+    ]
+    rows += [(method, single_calls[method], args.chats * single_calls[method], fanout_calls[method]) for method in METHODS]
+    for label, one, bots, routed in rows:
+        bots = f"{bots:>10.1f}" if bots is not None else f"{'-':>10}"
+        print(f"{label:>22} | {one:>10.1f} | {bots} | {routed:>10.1f}")
+    print(f"\nDelivered to all chats: {fanout_result['dispatch']['delivered']}/{fanout_result['dispatch']['processed']} items.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+"""
+Benchmark for the collector's ingest path.
+
+Compares the bytes stored per item and the HTTP requests per item for the
+old per-item '/send_item' upload of the full 'item_detail' response with
+gzip-compressed '/send_items' batches of slimmed items.
+
+The API responses are synthetic but follow the shape of a real
+'item_detail' response (author, music, stats, several bitrate variants
+with long signed CDN URLs, subtitles, ...). Pass a captured response to
+measure real data instead.
+
+Usage (from the 'bot' directory):
+    python benchmarks/bench_ingest.py [captured_item_detail.json]
+"""
+
+import os
+import sys
+import gzip
+import json
+import random
+import string
+
+# Make the bot modules importable when running from the 'benchmarks' directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import decode_batch, slim_item
+
+ITEMS = 200
+BATCH_SIZE = 25  # Matches BATCH_MAX_ITEMS in 'extension/background.js'.
+
+
+def _token(length):
+    return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
+
+def _cdn_url(video_id):
+    return (f"https://v16-webapp-prime.tiktok.com/video/tos/useast2a/tos-useast2a-pve-0068/{_token(32)}/"
+            f"?a=1988&bti={_token(24)}&ch=0&cr=3&dr=0&lr=all&cd=0%7C0%7C0%7C&cv=1&br=2400&bt=1200"
+            f"&cs=0&ds=6&ft={_token(20)}&mime_type=video_mp4&qs=0&rc={_token(40)}&l={_token(30)}"
+            f"&btag=e00090000&expire=9999999999&policy=2&signature={_token(32)}&tk=tt_chain_token&vid={video_id}")
+
+def make_api_response(video_id):
+    """Build a synthetic 'item_detail' response for one video."""
+    author = {
+        'id': _token(19), 'uniqueId': f"user_{_token(8)}", 'nickname': _token(12), 'signature': _token(80),
+        'avatarLarger': _cdn_url(video_id), 'avatarMedium': _cdn_url(video_id), 'avatarThumb': _cdn_url(video_id),
+        'secUid': _token(76), 'verified': False, 'privateAccount': False, 'followingVisibility': 1,
+    }
+    bitrate_info = [
+        {
+            'Bitrate': bitrate, 'CodecType': codec, 'GearName': f"{codec}_{bitrate}", 'QualityType': 2,
+            'MVMAF': json.dumps({'v2.0': {'srv1': {'v1080': 95.1, 'v960': 96.2, 'v864': 97.3, 'v720': 98.4}}}),
+            'PlayAddr': {
+                'DataSize': bitrate * 4, 'FileCs': f"c:0-{_token(20)}", 'FileHash': _token(32),
+                'Height': 1024, 'Width': 576, 'Uri': f"v12044gd0000{_token(20)}",
+                'UrlKey': f"v12044gd0000{_token(20)}_{codec}_{bitrate}", 'UrlList': [_cdn_url(video_id) for _ in range(3)],
+            },
+        }
+        for bitrate, codec in [(2_400_000, 'h264'), (1_600_000, 'h264'), (1_200_000, 'h265_hvc1'), (800_000, 'h265_hvc1')]
+    ]
+    video = {
+        'id': video_id, 'height': 1024, 'width': 576, 'duration': 15, 'ratio': '540p', 'format': 'mp4',
+        'cover': _cdn_url(video_id), 'originCover': _cdn_url(video_id), 'dynamicCover': _cdn_url(video_id),
+        'playAddr': _cdn_url(video_id), 'downloadAddr': _cdn_url(video_id), 'bitrate': 1_200_000,
+        'bitrateInfo': bitrate_info, 'encodedType': 'normal', 'videoQuality': 'normal', 'codecType': 'h264',
+        'subtitleInfos': [
+            {'LanguageCodeName': lang, 'Url': _cdn_url(video_id), 'UrlExpire': 9999999999, 'Format': 'webvtt'}
+            for lang in ('eng-US', 'spa-ES', 'por-PT', 'deu-DE')
+        ],
+        'zoomCover': {size: _cdn_url(video_id) for size in ('240', '480', '720', '960')},
+    }
+    return {
+        'extra': {'fatal_item_ids': [], 'logid': _token(32), 'now': 1700000000000},
+        'log_pb': {'impr_id': _token(32)},
+        'shareMeta': {'desc': _token(120), 'title': _token(40)},
+        'statusCode': 0, 'status_code': 0, 'status_msg': '',
+        'itemInfo': {
+            'itemStruct': {
+                'id': video_id, 'desc': ' '.join(_token(8) for _ in range(20)), 'createTime': 1700000000,
+                'author': author, 'authorStats': {'diggCount': 1, 'followerCount': 2, 'heartCount': 3, 'videoCount': 4},
+                'music': {
+                    'id': _token(19), 'title': _token(30), 'authorName': _token(12), 'original': False,
+                    'playUrl': _cdn_url(video_id), 'coverLarge': _cdn_url(video_id),
+                    'coverMedium': _cdn_url(video_id), 'coverThumb': _cdn_url(video_id), 'duration': 15,
+                },
+                'challenges': [
+                    {'id': _token(10), 'title': _token(10), 'desc': _token(60), 'coverLarger': _cdn_url(video_id)}
+                    for _ in range(4)
+                ],
+                'stats': {'collectCount': 1, 'commentCount': 2, 'diggCount': 3, 'playCount': 4, 'shareCount': 5},
+                'textExtra': [{'hashtagName': _token(10), 'start': 0, 'end': 10, 'type': 1} for _ in range(4)],
+                'video': video,
+                'contents': [{'desc': _token(120), 'textExtra': []}],
+                'suggestedWords': [_token(12) for _ in range(10)],
+            },
+        },
+    }
+
+
+def encode(item):
+    return json.dumps(item, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'r', encoding='utf-8') as f:
+            captured = json.load(f)
+        responses = [captured] * ITEMS
+    else:
+        random.seed(42)
+        responses = [make_api_response(f"7{n:018d}") for n in range(ITEMS)]
+    items = [
+        {'type': 'video', 'itemId': f"7{n:018d}", 'url': f"https://www.tiktok.com/@user/video/7{n:018d}", 'apiResponse': r}
+        for n, r in enumerate(responses)
+    ]
+
+    # Old path: one uncompressed request per item, the full response is stored.
+    full_bytes = sum(len(encode(item)) for item in items)
+
+    # New path: gzip NDJSON batches, slimmed items are stored.
+    wire_bytes = 0
+    stored_bytes = 0
+    requests = 0
+    for start in range(0, len(items), BATCH_SIZE):
+        body = gzip.compress(b'\n'.join(encode(item) for item in items[start:start + BATCH_SIZE]))
+        wire_bytes += len(body)
+        requests += 1
+        for item in decode_batch(body, 'application/x-ndjson', 'gzip'):
+            stored_bytes += len(encode(slim_item(item)))
+
+    print(f"{'':>24} | {'per-item POST':>14} | {'gzip batches':>14} | {'ratio':>7}")
+    print("-" * 70)
+    print(f"{'requests per item':>24} | {1:>14.3f} | {requests / ITEMS:>14.3f} | {ITEMS / requests:>6.1f}x")
+    print(f"{'bytes sent per item':>24} | {full_bytes / ITEMS:>14.0f} | {wire_bytes / ITEMS:>14.0f} | {full_bytes / wire_bytes:>6.1f}x")
+    print(f"{'bytes stored per item':>24} | {full_bytes / ITEMS:>14.0f} | {stored_bytes / ITEMS:>14.0f} | {full_bytes / stored_bytes:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
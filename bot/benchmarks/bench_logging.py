@@ -0,0 +1,120 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+"""
+Micro-benchmark for the cost of logging on the calling thread.
+
+Compares the previous setup (f-strings and a synchronous StreamHandler)
+with the queue-based setup from 'log_config.py' (lazy %-style arguments,
+a background listener, payload truncation and sampling). Log output goes
+to a temporary file, so the numbers do not depend on the terminal.
+
+Usage (from the 'bot' directory):
+    python benchmarks/bench_logging.py
+"""
+
+import os
+import sys
+import time
+import logging
+import tempfile
+
+# Make the bot modules importable when running from the 'benchmarks' directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import log_config
+from fake_tiktok_cdn import FakeTikTokCdn
+
+ITERATIONS = 20_000
+
+
+def per_call_us(func, iterations=ITERATIONS):
+    """Return the average time of 'func()' in microseconds."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def scenarios(item):
+    logger = logging.getLogger('bot')
+    collector_logger = logging.getLogger('collector')
+    return {
+        'f-string': [
+            ("short message", lambda: logger.info(f"Successfully sent video from URL: {item['url']}")),
+            ("message with item", lambda: logger.warning(f"Unknown or missing item type: {item['type']}. Item: {item}")),
+            ("duplicate skip", lambda: collector_logger.info(f"Duplicate item ID detected in index, skipping: {item['itemId']}")),
+            ("disabled debug", lambda: logger.debug(f"Item {item['itemId']} took {0.5:.2f}s: {item}")),
+        ],
+        'lazy': [
+            ("short message", lambda: logger.info("Successfully sent video from URL: %s", item['url'])),
+            ("message with item", lambda: logger.warning("Unknown or missing item type: %s. Item: %s", item['type'], item)),
+            ("duplicate skip", lambda: collector_logger.info("Duplicate item ID detected in index, skipping: %s", item['itemId'])),
+            ("disabled debug", lambda: logger.debug("Item %s took %.2fs: %s", item['itemId'], 0.5, item)),
+        ],
+    }
+
+
+class SlowStream:
+    """A stream that takes 'delay' seconds per write, like a busy terminal or a full pipe."""
+
+    def __init__(self, stream, delay):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text):
+        time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.stream.close()
+
+
+def measure(item, log_dir, sink, write_delay, iterations):
+    """Per-call cost of every scenario before and after, with log output going to 'sink'."""
+    original_stderr = sys.stderr
+    results = {}
+    try:
+        for mode in ('f-string', 'lazy'):
+            stream = open(os.path.join(log_dir, f"{sink}_{mode}.log"), 'w', encoding='utf-8')
+            sys.stderr = SlowStream(stream, write_delay) if write_delay else stream
+            if mode == 'f-string':
+                # Previous setup: a synchronous StreamHandler formats and writes on the calling thread.
+                root_logger = logging.getLogger()
+                root_logger.handlers.clear()
+                handler = logging.StreamHandler(sys.stderr)
+                handler.setFormatter(logging.Formatter(log_config.TEXT_FORMAT))
+                root_logger.addHandler(handler)
+                root_logger.setLevel(logging.INFO)
+            else:
+                # New setup: lazy arguments on a bounded queue, written by the listener thread.
+                log_config.setup_logging()
+            for name, func in scenarios(item)[mode]:
+                results.setdefault(name, []).append(per_call_us(func, iterations))
+            log_config._stop_listener()
+            sys.stderr.close()
+    finally:
+        sys.stderr = original_stderr
+    return results
+
+
+def main():
+    item = FakeTikTokCdn(port=0).collected_item('7000000000000000000', 'photo_video')
+    log_dir = tempfile.mkdtemp(prefix="tt2tg_bench_logging_")
+    runs = [
+        ("fast file", 0, ITERATIONS),
+        ("slow sink (1 ms per write)", 0.001, 1000),
+    ]
+    for sink, write_delay, iterations in runs:
+        results = measure(item, log_dir, sink.split()[0], write_delay, iterations)
+        print(f"\n{sink}:")
+        print(f"{'call':>18} | {'before (us)':>11} | {'after (us)':>10}")
+        print("-" * 46)
+        for name, (before, after) in results.items():
+            print(f"{name:>18} | {before:>11.2f} | {after:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+"""
+Throughput benchmark for the adaptive rate limiter.
+
+Sends text messages to a local fake Bot API that enforces a per-chat limit
+and answers with 429 responses, once through the RateLimiter and once with
+the old fixed delay between messages, and compares messages per minute.
+
+Usage (from the 'bot' directory):
+    python benchmarks/bench_rate_limiter.py [--messages 60] [--limit 20] [--window 10] [--fixed-delay 10]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Make the bot modules importable when running from the 'benchmarks' directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import telebot
+from fake_bot_api import FakeBotApi
+from rate_limiter import RateLimiter
+
+CHAT_ID = -1000000000001
+
+
+def run_limited(bot, args):
+    # Start above the server's limit so the limiter has to find the safe rate itself.
+    limiter = RateLimiter(
+        chat_rate=args.limit / args.window * 2,
+        min_rate=args.limit / args.window / 10,
+        global_rate=30,
+        max_retries=10,
+    )
+    start = time.perf_counter()
+    for n in range(args.messages):
+        limiter.call(CHAT_ID, bot.send_message, CHAT_ID, f"message {n}")
+    return time.perf_counter() - start, limiter.throttled_count, limiter.backoff_seconds
+
+
+def run_fixed(bot, args):
+    start = time.perf_counter()
+    for n in range(args.messages):
+        bot.send_message(CHAT_ID, f"message {n}")
+        time.sleep(args.fixed_delay)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=60, help="Messages to send per run.")
+    parser.add_argument('--limit', type=int, default=20, help="Fake server limit: messages per window per chat.")
+    parser.add_argument('--window', type=float, default=10.0, help="Fake server window in seconds.")
+    parser.add_argument('--fixed-delay', type=float, default=None,
+                        help="Delay for the fixed-delay baseline (default: window / limit). Use 0 to skip it.")
+    args = parser.parse_args()
+    if args.fixed_delay is None:
+        args.fixed_delay = args.window / args.limit
+
+    server = FakeBotApi(chat_limit=args.limit, window=args.window).start()
+    telebot.apihelper.API_URL = server.api_url
+    bot = telebot.TeleBot("123456:BENCHMARK")
+    try:
+        elapsed, throttled, backoff = run_limited(bot, args)
+        print(f"Rate limiter: {args.messages} messages in {elapsed:.1f}s "
+              f"({args.messages / elapsed * 60:.1f}/min), {throttled} x 429, {backoff:.1f}s in backoff")
+
+        if args.fixed_delay:
+            time.sleep(args.window)  # Let the server window drain between runs.
+            elapsed = run_fixed(bot, args)
+            print(f"Fixed delay ({args.fixed_delay}s): {args.messages} messages in {elapsed:.1f}s "
+                  f"({args.messages / elapsed * 60:.1f}/min)")
+        print(f"Server: {dict(server.counts)}")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+"""
+Benchmark for the disk footprint of the download spool.
+
+Sends a backlog of videos (the 'videos' workload of bench_suite.py) through
+/send with a deep prefetch window, each run in a fresh process:
+
+    unbounded   no spool budget; prefetching is only limited by the window
+    budget      DOWNLOAD_SPOOL_MAX_BYTES set to a few videos
+    streaming   DOWNLOAD_STREAMING: videos go from the CDN straight into the upload
+
+and reports the peak disk use of the data directory (sampled every 50 ms),
+the peak space reserved in the spool, and the dispatch time. A last check
+leaves files in the spool as a crashed run would and shows that they are
+removed at startup.
+
+Usage (from the 'bot' directory):
+    python benchmarks/bench_spool.py [--videos 200] [--video-mb 2] [--budget-videos 4] [--window 12]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+# Make the bot modules importable when running from the 'benchmarks' directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import run_workload
+from fake_bot_api import FakeBotApi
+from fake_tiktok_cdn import FakeTikTokCdn
+
+
+def run(settings, count):
+    """Send 'count' videos in a fresh process. Returns the bench_suite result."""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=run_workload, args=('videos', count, settings, results))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"Run failed with exit code {process.exitcode}.")
+    return results.get()
+
+def check_stale_cleanup(files=20, size=1024 * 1024):
+    """Leave downloads behind like a crashed run, then start a spool over them. Returns (left, removed, remaining)."""
+    from download_spool import DownloadSpool
+    with tempfile.TemporaryDirectory(prefix="tt2tg_bench_spool_") as root:
+        spool = DownloadSpool(root, stale_age=3600)
+        old = time.time() - 2 * 3600
+        for n in range(files):
+            path = spool.path(f"video_{n}.mp4")
+            with open(path, 'wb') as f:
+                f.write(b'\0' * size)
+            # Half of the files are old enough to be stale, the others may belong to another process.
+            if n % 2 == 0:
+                os.utime(path, (old, old))
+        removed = spool.clean_stale()
+        return files, removed, len(os.listdir(root))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--videos', type=int, default=200, help="Number of videos in the backlog.")
+    parser.add_argument('--video-mb', type=float, default=2.0, help="Size of each synthetic video (MB).")
+    parser.add_argument('--budget-videos', type=int, default=4, help="Spool budget of the 'budget' run, in videos.")
+    parser.add_argument('--window', type=int, default=12, help="Prefetch window (SEND_PREFETCH_WINDOW).")
+    parser.add_argument('--api-bandwidth', type=float, default=40e6, help="Fake Bot API upload bandwidth (bytes/s).")
+    parser.add_argument('--cdn-bandwidth', type=float, default=80e6, help="Fake CDN bandwidth (bytes/s).")
+    args = parser.parse_args()
+
+    video_bytes = int(args.video_mb * 1024 * 1024)
+    api = FakeBotApi(chat_limit=1000, window=1.0, retry_after=1, latency=0.01, bandwidth=args.api_bandwidth).start()
+    cdn = FakeTikTokCdn(video_bytes=video_bytes, latency=0.01, bandwidth=args.cdn_bandwidth).start()
+    base = {
+        'api_url': api.api_url, 'cdn_url': cdn.base_url, 'chat_rate': 60000,
+        'clients': 4, 'collector_threads': 8, 'scheduler': 'fifo',
+    }
+    # The old prefetch limit is lifted, so only the spool bounds the disk.
+    prefetch = {'SEND_PREFETCH_WINDOW': args.window, 'SEND_PREFETCH_MAX_BYTES': None}
+    runs = [
+        ('unbounded', dict(prefetch, DOWNLOAD_SPOOL_MAX_BYTES=None)),
+        ('budget', dict(prefetch, DOWNLOAD_SPOOL_MAX_BYTES=args.budget_videos * video_bytes)),
+        ('streaming', dict(prefetch, DOWNLOAD_STREAMING=True)),
+    ]
+    results = []
+    try:
+        for name, overrides in runs:
+            print(f"Sending {args.videos} videos ({name})...", flush=True)
+            results.append((name, run(dict(base, config=overrides), args.videos)))
+    finally:
+        api.stop()
+        cdn.stop()
+
+    print(f"\n{'run':>10} | {'peak disk MB':>12} | {'peak reserved MB':>16} | {'dispatch s':>10} | {'sent':>9}")
+    print("-" * 70)
+    for name, result in results:
+        dispatch = result['dispatch']
+        print(f"{name:>10} | {result['peak_disk_mb']:>12.1f} | {result['peak_spool_reserved_mb']:>16.1f} | "
+              f"{dispatch['seconds']:>10.1f} | {dispatch['delivered']:>4}/{dispatch['processed']:<4}")
+    print(f"(budget: {args.budget_videos * video_bytes / 1024 / 1024:.1f} MB, "
+          f"prefetch window: {args.window} videos of {args.video_mb} MB)")
+
+    files, removed, remaining = check_stale_cleanup()
+    print(f"\nStale cleanup: {files} files left by a crash, {removed} older than the stale age removed, {remaining} kept.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+"""
+Benchmark for the cold start of 'main.py runserver'.
+
+Runs the real application from a temporary copy of the bot directory,
+with a queue journal of already collected items, against the fake Bot
+API. From the moment the process is launched, the harness keeps posting
+new items to '/send_item' and reports:
+
+    - the time until the collector port accepts connections,
+    - the time until the first item is accepted (HTTP 200),
+
+for a first start (only the journal exists) and a restart (the journal,
+its ID sidecar and the de-duplication index left by the first start).
+Pass '--bot-dir' with another checkout, e.g. a 'git worktree' of an older
+commit, to compare against it.
+
+Usage (from the 'bot' directory):
+    python benchmarks/bench_startup.py [--items 20000] [--runs 3] [--bot-dir PATH]
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+import subprocess
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+# Make the bot modules importable when running from the 'benchmarks' directory.
+sys.path.insert(0, BOT_DIR)
+
+import requests
+from config import QUEUE_FILE_NAME
+from ingest import slim_item
+from fake_bot_api import FakeBotApi
+from fake_tiktok_cdn import FakeTikTokCdn
+from bench_supervisor import _free_port, _percentile
+from bench_suite import CHAT_ID
+
+
+def prepare_bot_dir(source_dir, api_url, port):
+    """Copy the bot from 'source_dir' into a temporary directory with a config pointing at the fake Bot API."""
+    work_dir = tempfile.mkdtemp(prefix="tt2tg_bench_startup_")
+    for path in glob.glob(os.path.join(source_dir, '*.py')):
+        shutil.copy(path, work_dir)
+    with open(os.path.join(work_dir, 'config.py'), 'a', encoding='utf-8') as f:
+        f.write(f"""
+# --- Benchmark Overrides ---
+TELEGRAM_BOT_TOKEN = '123456:BENCHMARK'
+TELEGRAM_API_URL = {api_url!r}
+TARGET_CHAT_ID = {CHAT_ID}
+AUTO_DISPATCH = False
+COLLECTOR_PORT = {port}
+""")
+    return work_dir
+
+def write_journal(path, count):
+    """Write a queue journal of 'count' collected items, as the collector stores them."""
+    cdn = FakeTikTokCdn(port=0)
+    kinds = ['video', 'video', 'photo_video']
+    with open(path, 'w', encoding='utf-8') as f:
+        for number in range(count):
+            item = slim_item(cdn.collected_item(str(7_100_000_000_000_000_000 + number), kinds[number % len(kinds)]))
+            f.write(json.dumps(item, ensure_ascii=False) + '\n')
+
+
+def measure_start(work_dir, port, run):
+    """Launch the application and post items until one is accepted. Returns (port open, first accepted) in ms."""
+    base_url = f"http://127.0.0.1:{port}"
+    log = open(os.path.join(work_dir, 'bench.log'), 'a')
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'main.py', 'runserver'], cwd=work_dir, stdout=log, stderr=subprocess.STDOUT)
+    port_open = accepted = None
+    try:
+        number = 0
+        while accepted is None:
+            if process.poll() is not None or time.perf_counter() - start > 120:
+                raise RuntimeError(f"The collector did not accept an item, see '{log.name}'.")
+            if port_open is None:
+                try:
+                    socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                    port_open = time.perf_counter() - start
+                except OSError:
+                    time.sleep(0.005)
+                    continue
+            item = {'type': 'message', 'itemId': f"startup_{run}_{number}", 'author': 'bench_user', 'text': 'startup'}
+            number += 1
+            try:
+                if requests.post(f"{base_url}/send_item", json=item, timeout=60).status_code == 200:
+                    accepted = time.perf_counter() - start
+            except requests.RequestException:
+                time.sleep(0.005)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        log.close()
+    return port_open * 1000, accepted * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=20000, help="Items in the queue journal.")
+    parser.add_argument('--runs', type=int, default=3, help="Starts per case; the median is reported.")
+    parser.add_argument('--bot-dir', default=BOT_DIR, help="Bot directory to benchmark (default: this checkout).")
+    args = parser.parse_args()
+
+    api = FakeBotApi().start()
+    port = _free_port()
+    journal_dir = tempfile.mkdtemp(prefix="tt2tg_bench_journal_")
+    journal_path = os.path.join(journal_dir, QUEUE_FILE_NAME)
+    print(f"Writing a journal of {args.items} items...", flush=True)
+    write_journal(journal_path, args.items)
+    journal_mb = os.path.getsize(journal_path) / 1024 / 1024
+
+    results = {'first start': [], 'restart': []}
+    try:
+        for run in range(args.runs):
+            work_dir = prepare_bot_dir(os.path.abspath(args.bot_dir), api.api_url, port)
+            shutil.copy(journal_path, work_dir)
+            try:
+                for case in results:
+                    print(f"Run {run + 1}/{args.runs}: {case}...", flush=True)
+                    results[case].append(measure_start(work_dir, port, f"{run}_{case.replace(' ', '_')}"))
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+    finally:
+        api.stop()
+        shutil.rmtree(journal_dir, ignore_errors=True)
+
+    print(f"\nStartup of '{os.path.abspath(args.bot_dir)}' with {args.items} queued items ({journal_mb:.1f} MB journal):")
+    print(f"{'case':>12} | {'port open (ms)':>14} | {'first item accepted (ms)':>24}")
+    print("-" * 56)
+    for case, timings in results.items():
+        print(f"{case:>12} | {_percentile([t[0] for t in timings], 0.5):>14.0f} | "
+              f"{_percentile([t[1] for t in timings], 0.5):>24.0f}")
+    print(f"\nMachine: {os.cpu_count()} CPUs.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,384 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+"""
+Offline end-to-end benchmark suite.
+
+Starts a fake Telegram Bot API (fake_bot_api.py) and a fake TikTok API/CDN
+(fake_tiktok_cdn.py), then runs reproducible workloads through the real
+collector and bot code:
+
+    texts    1000 text messages
+    videos   200 videos
+    albums   50 albums of 10 images
+    mixed    200 items: 150 text messages with a video after every 3rd and an album after every 19th
+
+Each workload runs in a fresh process with its own temporary data
+directory. Like the browser extension, the harness fetches 'item_detail'
+responses from the fake CDN and posts them to the collector in gzip NDJSON
+batches. It then sends everything through the dispatcher used by /send.
+It reports ingest items/sec and requests/sec, dispatch items/min, the time
+until items of each type are delivered, and peak RSS and disk use. Results are written to a JSON file so regressions can be
+tracked over time.
+
+Usage (from the 'bot' directory):
+    python benchmarks/bench_suite.py [--workloads texts,videos,albums,mixed] [--scale 1.0]
+                                     [--scheduler lanes|fifo] [--output results.json]
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+import platform
+import tempfile
+import threading
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+# Make the bot modules importable when running from the 'benchmarks' directory.
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+from fake_bot_api import FakeBotApi
+from fake_tiktok_cdn import FakeTikTokCdn
+
+CHAT_ID = -1000000000001
+
+# name -> (item type, number of items)
+WORKLOADS = {
+    'texts': ('message', 1000),
+    'videos': ('video', 200),
+    'albums': ('photo_video', 50),
+    'mixed': ('mixed', 200),
+}
+
+# Items per '/send_items' request, as in 'extension/background.js'.
+INGEST_BATCH_SIZE = 25
+
+
+# --- Resource Sampling ---
+
+def _rss_bytes():
+    """Current resident set size of this process."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    # Peak RSS; kilobytes on Linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _disk_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # Temporary files may disappear while walking.
+    return total
+
+
+class ResourceSampler:
+    """Samples the peak RSS of this process and the peak disk use of a directory in the background."""
+
+    def __init__(self, data_dir, interval=0.05):
+        self.data_dir = data_dir
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_disk = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ResourceSampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def sample(self):
+        self.peak_rss = max(self.peak_rss, _rss_bytes())
+        self.peak_disk = max(self.peak_disk, _disk_bytes(self.data_dir))
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+
+# --- Workload Process ---
+
+def configure_bot(settings, data_dir):
+    """Point the bot and collector at the fake servers and the temporary data directory."""
+    import config
+    config.TELEGRAM_BOT_TOKEN = '123456:BENCHMARK'
+    config.TELEGRAM_API_URL = settings['api_url']
+    config.TARGET_CHAT_ID = CHAT_ID
+    config.ROUTES = settings.get('routes', config.ROUTES)
+    config.RATE_LIMIT_CHAT_PER_MINUTE = settings['chat_rate']
+    config.RATE_LIMIT_GLOBAL_PER_SECOND = max(config.RATE_LIMIT_GLOBAL_PER_SECOND, settings['chat_rate'] / 60)
+    config.SEND_SCHEDULER = settings.get('scheduler', config.SEND_SCHEDULER)
+    # File names are joined with the bot directory, so absolute paths move them into 'data_dir'.
+    config.QUEUE_FILE_NAME = os.path.join(data_dir, 'urls_to_send.ndjson')
+    config.JSON_FILE_NAME = os.path.join(data_dir, 'urls_to_send.json')
+    config.DD_INDEX_FILE_NAME = os.path.join(data_dir, 'dedup_index.ndjson')
+    config.ACK_FILE_NAME = os.path.join(data_dir, 'sent_acks.ndjson')
+    config.FILE_ID_CACHE_FILE_NAME = os.path.join(data_dir, 'file_id_cache.ndjson')
+    config.ARCHIVE_DIR_NAME = os.path.join(data_dir, 'sent_archive')
+    config.DOWNLOAD_SPOOL_DIR_NAME = os.path.join(data_dir, 'download_spool')
+    # Further settings of the run, by config name.
+    for name, value in settings.get('config', {}).items():
+        setattr(config, name, value)
+
+
+def _mixed_kind(n):
+    """Item type of the n-th item of the 'mixed' workload."""
+    if n % 20 == 19:
+        return 'photo_video'
+    return 'video' if n % 4 == 3 else 'message'
+
+def fetch_payloads(kind, count, settings, prefix):
+    """Build the items the extension would send, fetching 'item_detail' from the fake CDN like it does."""
+    import requests
+
+    def fetch(n):
+        item_kind = _mixed_kind(n) if kind == 'mixed' else kind
+        if item_kind == 'message':
+            return {'type': 'message', 'itemId': f"msg_{prefix}_{n}", 'author': 'bench_user', 'text': f"Benchmark message {n}"}
+        item_id = f"7{prefix}{n:012d}"
+        response = session.get(f"{settings['cdn_url']}/api/im/item_detail/", params={'itemId': item_id, 'kind': item_kind})
+        return {
+            'type': item_kind,
+            'itemId': item_id,
+            'url': f"https://www.tiktok.com/@bench_user/video/{item_id}",
+            'apiResponse': response.json(),
+        }
+
+    with requests.Session() as session:
+        return [fetch(n) for n in range(count)]
+
+def _delivery_times(payloads, acked_at, start):
+    """Median and maximum seconds from the start of the dispatch until items of each type were acknowledged."""
+    by_type = {}
+    for payload in payloads:
+        if payload['itemId'] in acked_at:
+            by_type.setdefault(payload['type'], []).append(acked_at[payload['itemId']] - start)
+    summary = {}
+    for item_type, times in by_type.items():
+        times.sort()
+        summary[item_type] = {'p50_seconds': round(times[len(times) // 2], 3), 'max_seconds': round(times[-1], 3)}
+    return summary
+
+
+def _ingest(url, payloads, clients):
+    """Post payloads to '/send_items' in gzip NDJSON batches. Returns (seconds, requests, retries)."""
+    import requests
+    batches = [payloads[start:start + INGEST_BATCH_SIZE] for start in range(0, len(payloads), INGEST_BATCH_SIZE)]
+    bodies = [gzip.compress(b'\n'.join(json.dumps(item).encode('utf-8') for item in batch)) for batch in batches]
+    headers = {'Content-Type': 'application/x-ndjson', 'Content-Encoding': 'gzip'}
+    local = threading.local()
+    retries = 0
+    lock = threading.Lock()
+
+    def post(body):
+        nonlocal retries
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        while True:
+            response = local.session.post(url, data=body, headers=headers, timeout=120)
+            if response.status_code not in (429, 503):
+                response.raise_for_status()
+                return
+            # Back off like the extension does.
+            with lock:
+                retries += 1
+            time.sleep(float(response.headers.get('Retry-After', 1)))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(post, bodies))
+    return time.perf_counter() - start, len(bodies), retries
+
+
+def run_workload(name, count, settings, results):
+    """Run one workload in this (fresh) process and put its results on the 'results' queue."""
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+    for logger_name in ('waitress', 'waitress.queue'):
+        logging.getLogger(logger_name).setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory(prefix=f"tt2tg_bench_{name}_") as data_dir:
+        configure_bot(settings, data_dir)
+        import bot
+        import collector
+        from waitress.server import create_server
+
+        kind = WORKLOADS[name][0]
+        payloads = fetch_payloads(kind, count, settings, prefix=f"{os.getpid() % 1000:03d}")
+
+        sampler = ResourceSampler(data_dir).start()
+        baseline_rss = _rss_bytes()
+        collector.load_existing_items()
+        collector.INGEST_WRITER.start()
+        server = create_server(collector.app, host='127.0.0.1', port=0, threads=settings['collector_threads'])
+        threading.Thread(target=server.run, name="Collector", daemon=True).start()
+
+        ingest_seconds, ingest_requests, ingest_retries = _ingest(
+            f"http://127.0.0.1:{server.effective_port}/send_items", payloads, settings['clients']
+        )
+
+        bot.DELIVERY_LOG.load()
+        # Record when every item is acknowledged, to see how long each type waited.
+        acked_at = {}
+        ack = bot.DELIVERY_LOG.ack
+
+        def timed_ack(item_ids, deliveries):
+            now = time.perf_counter()
+            acked_at.update((item_id, now) for item_id in item_ids)
+            return ack(item_ids, deliveries)
+
+        bot.DELIVERY_LOG.ack = timed_ack
+        start = time.perf_counter()
+        processed, delivered = bot.DISPATCHER.drain(force=True)
+        dispatch_seconds = time.perf_counter() - start
+
+        sampler.stop()
+        server.close()
+
+        results.put({
+            'workload': name,
+            'item_type': kind,
+            'items': count,
+            'ingest': {
+                'seconds': round(ingest_seconds, 3),
+                'items_per_second': round(count / ingest_seconds, 1),
+                'requests': ingest_requests,
+                'requests_per_second': round(ingest_requests / ingest_seconds, 1),
+                'retries': ingest_retries,
+            },
+            'dispatch': {
+                'seconds': round(dispatch_seconds, 3),
+                'processed': processed,
+                'delivered': delivered,
+                'items_per_minute': round(processed / dispatch_seconds * 60, 1) if dispatch_seconds else None,
+                'throttled': bot.LIMITER.throttled_count,
+                'backoff_seconds': round(bot.LIMITER.backoff_seconds, 3),
+                'time_to_delivery': _delivery_times(payloads, acked_at, start),
+            },
+            'peak_rss_mb': round(sampler.peak_rss / 1024 / 1024, 1),
+            'peak_rss_growth_mb': round(max(0, sampler.peak_rss - baseline_rss) / 1024 / 1024, 1),
+            'peak_disk_mb': round(sampler.peak_disk / 1024 / 1024, 1),
+            'peak_spool_reserved_mb': round(bot.DOWNLOAD_SPOOL.peak / 1024 / 1024, 1),
+        })
+
+
+# --- Harness ---
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workloads', default=','.join(WORKLOADS), help="Comma-separated workloads to run.")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply the number of items in every workload.")
+    parser.add_argument('--output', default=None, help="JSON results file (default: benchmarks/results/<timestamp>.json).")
+    parser.add_argument('--seed', type=int, default=1, help="Seed for the injected 429 responses.")
+    parser.add_argument('--scheduler', choices=['lanes', 'fifo'], default='lanes', help="Send scheduler (SEND_SCHEDULER).")
+    parser.add_argument('--clients', type=int, default=4, help="Concurrent ingest clients.")
+    parser.add_argument('--collector-threads', type=int, default=8)
+    parser.add_argument('--chat-rate', type=float, default=1200,
+                        help="Rate limiter messages/minute per chat. Telegram's real limit is about 20.")
+    parser.add_argument('--api-latency', type=float, default=0.02, help="Fake Bot API latency per request (s).")
+    parser.add_argument('--api-bandwidth', type=float, default=50e6, help="Fake Bot API upload bandwidth (bytes/s).")
+    parser.add_argument('--api-limit', type=int, default=30, help="Fake Bot API limit: requests per second per chat.")
+    parser.add_argument('--throttle-rate', type=float, default=0.01, help="Fraction of sends answered with 429.")
+    parser.add_argument('--cdn-latency', type=float, default=0.01, help="Fake CDN latency per request (s).")
+    parser.add_argument('--cdn-bandwidth', type=float, default=None, help="Fake CDN bandwidth (bytes/s).")
+    parser.add_argument('--video-mb', type=float, default=2.0, help="Size of each synthetic video (MB).")
+    parser.add_argument('--image-kb', type=float, default=200.0, help="Size of each synthetic image (KB).")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.workloads.split(',') if name.strip()]
+    unknown = [name for name in names if name not in WORKLOADS]
+    if unknown:
+        parser.error(f"Unknown workloads: {', '.join(unknown)}. Choose from {', '.join(WORKLOADS)}.")
+
+    api = FakeBotApi(
+        chat_limit=args.api_limit, window=1.0, retry_after=1, latency=args.api_latency,
+        bandwidth=args.api_bandwidth, throttle_rate=args.throttle_rate, seed=args.seed,
+    ).start()
+    cdn = FakeTikTokCdn(
+        video_bytes=int(args.video_mb * 1024 * 1024), image_bytes=int(args.image_kb * 1024),
+        latency=args.cdn_latency, bandwidth=args.cdn_bandwidth,
+    ).start()
+    settings = {
+        'api_url': api.api_url,
+        'cdn_url': cdn.base_url,
+        'chat_rate': args.chat_rate,
+        'clients': args.clients,
+        'collector_threads': args.collector_threads,
+        'scheduler': args.scheduler,
+    }
+
+    # A fresh interpreter per workload keeps module state and memory measurements independent.
+    context = multiprocessing.get_context('spawn')
+    workloads = []
+    try:
+        for name in names:
+            count = max(1, int(WORKLOADS[name][1] * args.scale))
+            print(f"Running '{name}' ({count} items)...", flush=True)
+            results = context.Queue()
+            process = context.Process(target=run_workload, args=(name, count, settings, results))
+            process.start()
+            process.join()
+            if process.exitcode != 0:
+                raise RuntimeError(f"Workload '{name}' failed with exit code {process.exitcode}.")
+            workloads.append(results.get())
+    finally:
+        api.stop()
+        cdn.stop()
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'settings': {key: value for key, value in vars(args).items() if key != 'output'},
+        'fake_bot_api': dict(api.counts),
+        'fake_cdn': dict(cdn.counts),
+        'workloads': workloads,
+    }
+    output = args.output or os.path.join(
+        BENCHMARKS_DIR, 'results', f"bench_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'workload':>9} | {'items':>6} | {'ingest/s':>9} | {'req/s':>7} | {'sent/min':>9} | "
+          f"{'429s':>5} | {'RSS MB':>7} | {'disk MB':>8}")
+    print("-" * 84)
+    for result in workloads:
+        print(f"{result['workload']:>9} | {result['items']:>6} | {result['ingest']['items_per_second']:>9.0f} | "
+              f"{result['ingest']['requests_per_second']:>7.1f} | {result['dispatch']['items_per_minute']:>9.0f} | "
+              f"{result['dispatch']['throttled']:>5} | {result['peak_rss_mb']:>7.1f} | {result['peak_disk_mb']:>8.1f}")
+    for result in workloads:
+        delivery = ', '.join(
+            f"{item_type} p50 {times['p50_seconds']:.1f}s / max {times['max_seconds']:.1f}s"
+            for item_type, times in sorted(result['dispatch']['time_to_delivery'].items())
+        )
+        print(f"Time to delivery ({result['workload']}): {delivery}")
+    print(f"\nResults written to '{output}'.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+"""
+End-to-end comparison of the single-process mode and supervisor mode.
+
+Runs the real 'main.py runserver' (with and without '--workers N') from a
+temporary copy of the bot directory, against the fake Bot API and the fake
+TikTok CDN, with auto-dispatch enabled. While the bot downloads and sends
+a batch of videos, the harness keeps posting single items to the collector
+and measures their latency. It reports:
+
+    - collector latency (p50/p99) while the bot is busy,
+    - time until every video was delivered,
+    - in supervisor mode: whether all videos still arrive after a media
+      worker is killed, and how long a graceful SIGTERM shutdown takes.
+
+Usage (from the 'bot' directory):
+    python benchmarks/bench_supervisor.py [--workers 0,2,4] [--videos 40] [--video-mb 8]
+"""
+
+import os
+import sys
+import glob
+import time
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+import subprocess
+import threading
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+# Make the bot modules importable when running from the 'benchmarks' directory.
+sys.path.insert(0, BOT_DIR)
+
+import requests
+from fake_bot_api import FakeBotApi
+from fake_tiktok_cdn import FakeTikTokCdn
+from bench_suite import CHAT_ID, fetch_payloads
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float('nan')
+
+
+def prepare_bot_dir(api_url, port):
+    """Copy the bot into a temporary directory with a config pointing at the fake servers."""
+    work_dir = tempfile.mkdtemp(prefix="tt2tg_bench_supervisor_")
+    for path in glob.glob(os.path.join(BOT_DIR, '*.py')):
+        shutil.copy(path, work_dir)
+    with open(os.path.join(work_dir, 'config.py'), 'a', encoding='utf-8') as f:
+        f.write(f"""
+# --- Benchmark Overrides ---
+TELEGRAM_BOT_TOKEN = '123456:BENCHMARK'
+TELEGRAM_API_URL = {api_url!r}
+TARGET_CHAT_ID = {CHAT_ID}
+RATE_LIMIT_CHAT_PER_MINUTE = 6000
+RATE_LIMIT_GLOBAL_PER_SECOND = 100
+AUTO_DISPATCH = True
+AUTO_DISPATCH_POLL_INTERVAL = 0.5
+COLLECTOR_PORT = {port}
+SUPERVISOR_RESTART_DELAY = 0.5
+""")
+    return work_dir
+
+
+def run_mode(workers, args, api, cdn, payloads):
+    port = _free_port()
+    work_dir = prepare_bot_dir(api.api_url, port)
+    command = [sys.executable, 'main.py', 'runserver'] + (['--workers', str(workers)] if workers else [])
+    log_path = os.path.join(work_dir, 'bench.log')
+    log = open(log_path, 'w')
+    process = subprocess.Popen(command, cwd=work_dir, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    result = {'workers': workers}
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if requests.get(f"{base_url}/metrics", timeout=1).ok:
+                    break
+            except requests.RequestException:
+                pass
+            if time.monotonic() > deadline or process.poll() is not None:
+                raise RuntimeError(f"The collector did not start, see '{log_path}'.")
+            time.sleep(0.1)
+
+        sent_before = api.counts['sendVideo']
+        start = time.monotonic()
+        requests.post(f"{base_url}/send_items", json=payloads, timeout=60).raise_for_status()
+
+        # Probe the collector with single items while the bot is busy with the videos.
+        latencies = []
+        stop_probing = threading.Event()
+
+        def probe():
+            with requests.Session() as session:
+                number = 0
+                while not stop_probing.is_set():
+                    item = {'type': 'message', 'itemId': f"probe_{workers}_{number}", 'author': 'probe', 'text': 'probe'}
+                    probe_start = time.perf_counter()
+                    session.post(f"{base_url}/send_item", json=item, timeout=30)
+                    latencies.append(time.perf_counter() - probe_start)
+                    number += 1
+                    time.sleep(0.05)
+
+        prober = threading.Thread(target=probe, daemon=True)
+        prober.start()
+
+        killed = False
+        while api.counts['sendVideo'] - sent_before < len(payloads):
+            if time.monotonic() - start > args.timeout:
+                raise RuntimeError(f"Only {api.counts['sendVideo'] - sent_before}/{len(payloads)} videos arrived.")
+            if workers and args.kill_worker and not killed and api.counts['sendVideo'] - sent_before >= len(payloads) // 3:
+                # Crash a media worker in the middle of the run; the supervisor restarts it.
+                worker_pid = _worker_pid(log_path)
+                if worker_pid:
+                    os.kill(worker_pid, signal.SIGKILL)
+                    killed = True
+            time.sleep(0.05)
+        result['delivery_seconds'] = time.monotonic() - start
+        result['worker_killed'] = killed
+        stop_probing.set()
+        prober.join()
+        result['ingest_p50_ms'] = _percentile(latencies, 0.5) * 1000
+        result['ingest_p99_ms'] = _percentile(latencies, 0.99) * 1000
+    finally:
+        shutdown_start = time.monotonic()
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        result['shutdown_seconds'] = time.monotonic() - shutdown_start
+        log.close()
+
+    claimed_dir = os.path.join(work_dir, 'media_jobs', 'claimed')
+    result['claimed_after_shutdown'] = len(os.listdir(claimed_dir)) if os.path.isdir(claimed_dir) else 0
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return result
+
+def _worker_pid(log_path):
+    """PID of media-worker-1, from the supervisor's log."""
+    pid = None
+    with open(log_path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            if "Started media-worker-1 (pid " in line:
+                pid = int(line.rsplit("(pid ", 1)[1].split(")")[0])
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='0,2,4', help="Comma-separated worker counts; 0 is the single-process mode.")
+    parser.add_argument('--videos', type=int, default=40, help="Videos to send in every mode.")
+    parser.add_argument('--video-mb', type=float, default=8.0, help="Size of each synthetic video (MB).")
+    parser.add_argument('--api-bandwidth', type=float, default=200e6, help="Fake Bot API upload bandwidth (bytes/s).")
+    parser.add_argument('--cdn-bandwidth', type=float, default=50e6, help="Fake CDN bandwidth (bytes/s).")
+    parser.add_argument('--no-kill', dest='kill_worker', action='store_false', help="Do not kill a media worker.")
+    parser.add_argument('--timeout', type=float, default=600, help="Seconds to wait for all videos.")
+    args = parser.parse_args()
+
+    api = FakeBotApi(chat_limit=1000, window=1.0, latency=0.02, bandwidth=args.api_bandwidth).start()
+    cdn = FakeTikTokCdn(video_bytes=int(args.video_mb * 1024 * 1024), latency=0.01, bandwidth=args.cdn_bandwidth).start()
+    results = []
+    try:
+        for number, workers in enumerate(int(value) for value in args.workers.split(',')):
+            # Different item IDs per run, so no run hits the file_id cache of another.
+            payloads = fetch_payloads('video', args.videos, {'cdn_url': cdn.base_url}, prefix=f"{number + 1}{workers:02d}")
+            print(f"Running with {workers or 'no'} media workers...", flush=True)
+            results.append(run_mode(workers, args, api, cdn, payloads))
+    finally:
+        api.stop()
+        cdn.stop()
+
+    print(f"\n{'workers':>7} | {'ingest p50 (ms)':>15} | {'ingest p99 (ms)':>15} | {'delivery (s)':>12} | "
+          f"{'worker killed':>13} | {'shutdown (s)':>12} | {'jobs left':>9}")
+    print("-" * 104)
+    for result in results:
+        print(f"{result['workers']:>7} | {result['ingest_p50_ms']:>15.1f} | {result['ingest_p99_ms']:>15.1f} | "
+              f"{result['delivery_seconds']:>12.1f} | {str(result['worker_killed']):>13} | "
+              f"{result['shutdown_seconds']:>12.1f} | {result['claimed_after_shutdown']:>9}")
+    print(f"\nMachine: {os.cpu_count()} CPUs.")
+
+
+if __name__ == '__main__':
+    main()
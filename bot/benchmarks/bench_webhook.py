@@ -0,0 +1,134 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+"""
+End-to-end comparison of webhook and long polling mode.
+
+Runs the bot in a separate process against the fake Bot API, once with
+long polling and once with a webhook on the collector server. The fake
+server posts '/start' commands and waits for the bot's reply. The
+benchmark reports the command round-trip latency and the CPU the bot
+process uses while idle.
+
+Usage (from the 'bot' directory):
+    python benchmarks/bench_webhook.py [--commands 50] [--idle 10]
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+# Make the bot modules importable when running from the 'benchmarks' directory.
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+from fake_bot_api import FakeBotApi
+from bench_suite import configure_bot
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _cpu_seconds(pid):
+    """User and system CPU time of a process, read from /proc (Linux only)."""
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def run_bot(mode, api_url, port):
+    """Run the bot (and, in webhook mode, the collector server) until the process is terminated."""
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+    for logger_name in ('waitress', 'waitress.queue'):
+        logging.getLogger(logger_name).setLevel(logging.ERROR)
+
+    data_dir = tempfile.mkdtemp(prefix="tt2tg_bench_webhook_")
+    configure_bot({'api_url': api_url, 'chat_rate': 1200}, data_dir)
+    import config
+    config.WEBHOOK_URL = f"http://127.0.0.1:{port}{config.WEBHOOK_PATH}"
+    import bot
+    import collector
+    from waitress.server import create_server
+    from webhook import create_webhook_blueprint
+
+    # The collector runs in both modes, as it does in 'main.py runserver'.
+    if mode == 'webhook':
+        collector.app.register_blueprint(create_webhook_blueprint(bot.bot, bot.WEBHOOK_SECRET))
+    server = create_server(collector.app, host='127.0.0.1', port=port, threads=8)
+    threading.Thread(target=server.run, name="Collector", daemon=True).start()
+
+    bot.main(mode)
+    # In webhook mode main() returns once the webhook is registered.
+    threading.Event().wait()
+
+
+def measure(mode, args):
+    api = FakeBotApi(chat_limit=1000, window=1.0).start()
+    port = _free_port()
+    process = multiprocessing.get_context('spawn').Process(target=run_bot, args=(mode, api.api_url, port), daemon=True)
+    process.start()
+    try:
+        # Wait until the bot is ready to receive updates.
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if (mode == 'webhook' and api.webhook_url) or (mode == 'polling' and api.counts['getUpdates']):
+                break
+            time.sleep(0.05)
+        else:
+            raise RuntimeError(f"The bot did not start in {mode} mode.")
+        time.sleep(0.5)
+
+        latencies = []
+        for n in range(args.commands):
+            # A new chat for every command keeps the per-chat rate limit out of the measurement.
+            chat_id = 100000 + n
+            start = time.monotonic()
+            api.post_command(chat_id, '/start')
+            replied_at = api.wait_for_message(chat_id, start)
+            if replied_at is None:
+                raise RuntimeError(f"No reply to command {n} in {mode} mode.")
+            latencies.append(replied_at - start)
+
+        # Idle CPU: no commands arrive, but the polling loop keeps running.
+        cpu_before = _cpu_seconds(process.pid)
+        polls_before = api.counts['getUpdates']
+        time.sleep(args.idle)
+        idle_cpu = (_cpu_seconds(process.pid) - cpu_before) / args.idle * 100
+        idle_requests = api.counts['getUpdates'] - polls_before
+    finally:
+        process.terminate()
+        process.join()
+        api.stop()
+
+    latencies.sort()
+    return {
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        'idle_cpu_percent': idle_cpu,
+        'idle_requests': idle_requests,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--commands', type=int, default=50, help="Commands to send in each mode.")
+    parser.add_argument('--idle', type=float, default=10.0, help="Seconds to measure idle CPU for.")
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} | {'p50 (ms)':>9} | {'p99 (ms)':>9} | {'idle CPU %':>10} | {'idle API calls':>14}")
+    print("-" * 62)
+    for mode in ('polling', 'webhook'):
+        result = measure(mode, args)
+        print(f"{mode:>8} | {result['p50_ms']:>9.1f} | {result['p99_ms']:>9.1f} | "
+              f"{result['idle_cpu_percent']:>10.2f} | {result['idle_requests']:>14}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+"""
+A local stand-in for the Telegram Bot API, used by the benchmarks.
+
+It answers 'sendMessage', 'sendVideo', 'sendMediaGroup' and 'copyMessage' with minimal but
+valid responses, and enforces a per-chat sliding-window limit the same way
+Telegram does: requests over the limit get HTTP 429 with 'retry_after'.
+Request latency, upload bandwidth and randomly injected 429 responses can
+be configured to model slower or stricter servers.
+
+It can also deliver updates to the bot: post_update() hands an update to a
+pending 'getUpdates' long poll, or POSTs it to the webhook registered with
+'setWebhook' (including the 'X-Telegram-Bot-Api-Secret-Token' header).
+
+Point telebot at it with:
+    telebot.apihelper.API_URL = server.api_url
+"""
+
+import json
+import time
+import random
+import threading
+import urllib.request
+from collections import defaultdict, deque
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def parse_params(handler, body):
+    """Extract request parameters from the query string, a urlencoded form or a multipart body."""
+    params = {key: values[0] for key, values in parse_qs(urlparse(handler.path).query).items()}
+    content_type = handler.headers.get('Content-Type', '')
+    if content_type.startswith('application/x-www-form-urlencoded'):
+        params.update({key: values[0] for key, values in parse_qs(body.decode('utf-8')).items()})
+    elif content_type.startswith('application/json'):
+        params.update(json.loads(body or b'{}'))
+    elif content_type.startswith('multipart/form-data'):
+        message = BytesParser(policy=HTTP).parsebytes(
+            b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body
+        )
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if part.get_filename() is None:
+                params[name] = part.get_content()
+            else:
+                params[name] = part.get_payload(decode=True)
+    return params
+
+
+class FakeBotApi:
+    """
+    A threaded fake Bot API server.
+
+    'chat_limit' requests per 'window' seconds are accepted for each chat;
+    further requests inside the window are rejected with a 429 response.
+    Every request is delayed by 'latency' seconds, request bodies are read
+    at 'bandwidth' bytes per second if it is set, and a 'throttle_rate'
+    fraction of the send requests is rejected with a 429 at random.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, chat_limit=20, window=60.0, retry_after=None,
+                 latency=0.0, bandwidth=None, throttle_rate=0.0, seed=None):
+        self.chat_limit = chat_limit
+        self.window = window
+        self.retry_after = retry_after
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.throttle_rate = throttle_rate
+        self._random = random.Random(seed)
+        self.counts = defaultdict(int)  # method name / '429' / 'bytes' -> number of requests or bytes
+        self._history = defaultdict(deque)  # chat_id -> timestamps of accepted requests
+        self._lock = threading.Lock()
+        self._message_id = 0
+        # Update delivery.
+        self.webhook_url = None
+        self.webhook_secret = None
+        self._updates = []  # Updates waiting for 'getUpdates'.
+        self._update_id = 0
+        self._updates_changed = threading.Condition()
+        # Sent messages as (monotonic time, chat_id, text), for tests that wait for a reply.
+        self.sent_messages = []
+        self._message_sent = threading.Condition()
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def api_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/bot{{0}}/{{1}}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="FakeBotApi", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # --- Rate Limiting ---
+
+    def _check_limit(self, chat_id):
+        """Record a request for 'chat_id'. Returns the retry_after value if it must be rejected."""
+        now = time.monotonic()
+        with self._lock:
+            history = self._history[chat_id]
+            while history and history[0] <= now - self.window:
+                history.popleft()
+            if self.throttle_rate and self._random.random() < self.throttle_rate:
+                self.counts['429'] += 1
+                return self.retry_after if self.retry_after is not None else 1
+            if len(history) >= self.chat_limit:
+                self.counts['429'] += 1
+                if self.retry_after is not None:
+                    return self.retry_after
+                return max(1, int(history[0] + self.window - now + 1))
+            history.append(now)
+            return None
+
+    # --- Responses ---
+
+    def _next_message(self, chat_id, **fields):
+        with self._lock:
+            self._message_id += 1
+            message_id = self._message_id
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id), 'type': 'supergroup'},
+        }
+        message.update(fields)
+        return message
+
+    def handle(self, method, params):
+        """Return (status, response_json) for a Bot API call."""
+        chat_id = params.get('chat_id', 0)
+        with self._lock:
+            self.counts[method] += 1
+
+        if method in ('sendMessage', 'sendVideo', 'sendMediaGroup', 'copyMessage'):
+            retry_after = self._check_limit(chat_id)
+            if retry_after is not None:
+                return 429, {
+                    'ok': False,
+                    'error_code': 429,
+                    'description': f"Too Many Requests: retry after {retry_after}",
+                    'parameters': {'retry_after': retry_after},
+                }
+
+        if method == 'sendMessage':
+            text = params.get('text', '')
+            with self._message_sent:
+                self.sent_messages.append((time.monotonic(), int(chat_id), text))
+                self._message_sent.notify_all()
+            return 200, {'ok': True, 'result': self._next_message(chat_id, text=text)}
+        if method == 'sendVideo':
+            file_id = f"video_{self._message_id + 1}"
+            video = {'file_id': file_id, 'file_unique_id': file_id, 'width': 720, 'height': 1280, 'duration': 10}
+            return 200, {'ok': True, 'result': self._next_message(chat_id, video=video)}
+        if method == 'sendMediaGroup':
+            media = json.loads(params.get('media', '[]'))
+            messages = []
+            for _ in media:
+                file_id = f"photo_{self._message_id + 1}"
+                photo = [{'file_id': file_id, 'file_unique_id': file_id, 'width': 1080, 'height': 1440}]
+                messages.append(self._next_message(chat_id, photo=photo))
+            return 200, {'ok': True, 'result': messages}
+        if method == 'copyMessage':
+            # Telegram only returns the ID of the copy.
+            with self._lock:
+                self._message_id += 1
+                return 200, {'ok': True, 'result': {'message_id': self._message_id}}
+        if method == 'getUpdates':
+            offset = int(params.get('offset') or 0)
+            timeout = float(params.get('timeout') or 0)
+            return 200, {'ok': True, 'result': self._wait_for_updates(offset, timeout)}
+        if method == 'setWebhook':
+            with self._updates_changed:
+                self.webhook_url = params.get('url') or None
+                self.webhook_secret = params.get('secret_token')
+            return 200, {'ok': True, 'result': True, 'description': 'Webhook was set'}
+        if method == 'deleteWebhook':
+            with self._updates_changed:
+                self.webhook_url = self.webhook_secret = None
+            return 200, {'ok': True, 'result': True, 'description': 'Webhook was deleted'}
+        if method == 'getMe':
+            return 200, {'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot'}}
+        return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found: method not found'}
+
+    # --- Updates ---
+
+    def _wait_for_updates(self, offset, timeout):
+        """Answer a 'getUpdates' long poll: confirm updates before 'offset' and wait for new ones."""
+        deadline = time.monotonic() + timeout
+        with self._updates_changed:
+            self._updates = [update for update in self._updates if update['update_id'] >= offset]
+            while not self._updates and time.monotonic() < deadline:
+                self._updates_changed.wait(deadline - time.monotonic())
+            return list(self._updates)
+
+    def post_update(self, update):
+        """Deliver an update to the bot, through the webhook if one is set, otherwise via 'getUpdates'."""
+        with self._updates_changed:
+            self._update_id += 1
+            update = dict(update, update_id=self._update_id)
+            webhook_url, secret = self.webhook_url, self.webhook_secret
+            if webhook_url is None:
+                self._updates.append(update)
+                self._updates_changed.notify_all()
+                return update
+        request = urllib.request.Request(
+            webhook_url, data=json.dumps(update).encode('utf-8'), method='POST',
+            headers={'Content-Type': 'application/json', **({'X-Telegram-Bot-Api-Secret-Token': secret} if secret else {})},
+        )
+        with urllib.request.urlopen(request, timeout=10) as response:
+            response.read()
+        return update
+
+    def post_command(self, chat_id, command):
+        """Deliver a text command such as '/start' from a private chat."""
+        return self.post_update({'message': {
+            'message_id': int(time.time() * 1000) % 2**31,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private', 'first_name': 'Bench'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Bench'},
+            'text': command,
+            'entities': [{'offset': 0, 'length': len(command.split()[0]), 'type': 'bot_command'}],
+        }})
+
+    def wait_for_message(self, chat_id, after, timeout=10):
+        """Wait for a message to 'chat_id' sent after monotonic time 'after'. Returns its send time or None."""
+        deadline = time.monotonic() + timeout
+        with self._message_sent:
+            while True:
+                for sent_at, sent_chat_id, _ in reversed(self.sent_messages):
+                    if sent_chat_id == chat_id and sent_at >= after:
+                        return sent_at
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._message_sent.wait(remaining)
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _serve(self):
+                if api.latency:
+                    time.sleep(api.latency)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                if api.bandwidth and body:
+                    # Model a slow uplink: the upload takes as long as the bandwidth allows.
+                    time.sleep(len(body) / api.bandwidth)
+                with api._lock:
+                    api.counts['bytes'] += len(body)
+                method = urlparse(self.path).path.rsplit('/', 1)[-1]
+                status, response = api.handle(method, parse_params(self, body))
+                payload = json.dumps(response).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = _serve
+            do_POST = _serve
+
+            def log_message(self, format, *args):
+                pass  # Keep benchmark output readable.
+
+        return Handler
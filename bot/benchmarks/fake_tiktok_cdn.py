@@ -0,0 +1,145 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+"""
+A local stand-in for TikTok's API and media CDN, used by the benchmarks.
+
+It serves synthetic videos and images, and 'item_detail' responses whose
+media URLs point back at this server, so the bot's direct download path
+can run without network access:
+
+    /video/<itemId>.mp4                      A synthetic video of 'video_bytes' bytes.
+    /image/<itemId>/<n>.jpg                  A synthetic image of 'image_bytes' bytes.
+    /api/im/item_detail/?itemId=<id>&kind=   An 'item_detail' response ('video' or 'photo_video').
+
+Media bodies are deterministic for a given item ID, so runs are reproducible.
+"""
+
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CHUNK_SIZE = 64 * 1024
+
+
+def synthetic_bytes(seed, size):
+    """Return 'size' bytes derived from 'seed'. Different seeds give different content hashes."""
+    block = hashlib.sha256(seed.encode('utf-8')).digest() * (CHUNK_SIZE // 32)
+    return (block * (size // len(block) + 1))[:size]
+
+
+class FakeTikTokCdn:
+    """
+    A threaded fake TikTok server.
+
+    'latency' seconds are added before every response, and media bodies are
+    streamed at 'bandwidth' bytes per second if it is set.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, video_bytes=2 * 1024 * 1024, image_bytes=200 * 1024,
+                 images_per_album=10, latency=0.0, bandwidth=None):
+        self.video_bytes = video_bytes
+        self.image_bytes = image_bytes
+        self.images_per_album = images_per_album
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.counts = {'video': 0, 'image': 0, 'item_detail': 0, 'bytes': 0}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="FakeTikTokCdn", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # --- Synthetic Data ---
+
+    def api_response(self, item_id, kind='video'):
+        """Build an 'item_detail' response for an item, with media URLs on this server."""
+        item_struct = {'id': item_id, 'author': {'uniqueId': 'bench_user'}, 'desc': f"Benchmark item {item_id}"}
+        if kind == 'photo_video':
+            item_struct['imagePost'] = {'images': [
+                {'displayImage': {'url_list': [f"{self.base_url}/image/{item_id}/{n}.jpg"]}}
+                for n in range(self.images_per_album)
+            ]}
+        else:
+            video_url = f"{self.base_url}/video/{item_id}.mp4"
+            item_struct['video'] = {
+                'bitrateInfo': [{
+                    'Bitrate': 1_200_000,
+                    'CodecType': 'h264',
+                    'PlayAddr': {'DataSize': self.video_bytes, 'UrlList': [video_url]},
+                }],
+                'playAddr': video_url,
+            }
+        return {'statusCode': 0, 'itemInfo': {'itemStruct': item_struct}}
+
+    def collected_item(self, item_id, kind='video'):
+        """Build an item as the browser extension sends it to the collector."""
+        return {
+            'type': kind,
+            'itemId': item_id,
+            'url': f"https://www.tiktok.com/@bench_user/video/{item_id}",
+            'apiResponse': self.api_response(item_id, kind),
+        }
+
+    # --- HTTP Handling ---
+
+    def _count(self, key, size=0):
+        with self._lock:
+            self.counts[key] += 1
+            self.counts['bytes'] += size
+
+    def _make_handler(self):
+        cdn = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                step = CHUNK_SIZE
+                for start in range(0, len(body), step):
+                    self.wfile.write(body[start:start + step])
+                    if cdn.bandwidth:
+                        time.sleep(step / cdn.bandwidth)
+
+            def do_GET(self):
+                if cdn.latency:
+                    time.sleep(cdn.latency)
+                parsed = urlparse(self.path)
+                parts = parsed.path.strip('/').split('/')
+                if parts[0] == 'video' and len(parts) == 2:
+                    body = synthetic_bytes(parts[1], cdn.video_bytes)
+                    cdn._count('video', len(body))
+                    self._send(200, body, 'video/mp4')
+                elif parts[0] == 'image' and len(parts) == 3:
+                    body = synthetic_bytes(f"{parts[1]}/{parts[2]}", cdn.image_bytes)
+                    cdn._count('image', len(body))
+                    self._send(200, body, 'image/jpeg')
+                elif parsed.path.startswith('/api/im/item_detail'):
+                    query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+                    body = json.dumps(cdn.api_response(query.get('itemId', '0'), query.get('kind', 'video'))).encode()
+                    cdn._count('item_detail')
+                    self._send(200, body, 'application/json')
+                else:
+                    self._send(404, b'Not Found', 'text/plain')
+
+            def log_message(self, format, *args):
+                pass  # Keep benchmark output readable.
+
+        return Handler
@@ -1,15 +1,37 @@
 # Copyright NGGT.LightKeeper. All Rights Reserved.
 
 import telebot
-import json
 import os
-import logging
 import time
-from datetime import datetime
-from config import TELEGRAM_BOT_TOKEN, TARGET_CHAT_ID, ASE_DELAY_TIME, JSON_FILE_NAME, ARCHIVE_DIR_NAME
-import yt_dlp
+import secrets
+import logging
+import itertools
+import threading
 import requests
-import shutil
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    TELEGRAM_BOT_TOKEN, TELEGRAM_API_URL, TARGET_CHAT_ID, AUTO_DISPATCH_POLL_INTERVAL, FANOUT_WORKERS,
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_SECRET_TOKEN,
+    SEND_PREFETCH_WINDOW, SEND_PREFETCH_MAX_BYTES, DIRECT_DOWNLOAD, DOWNLOAD_STREAMING, TELEGRAM_MAX_UPLOAD_BYTES,
+    SEND_SCHEDULER, SEND_LANES, SEND_MAX_WORKERS, SEND_LANE_LOOKAHEAD,
+)
+from media import (
+    CHUNK_SIZE, DirectDownloadError, download_video_direct, download_album, expected_video_size, open_video_direct,
+)
+from ytdlp_pool import YTDLP_POOL
+from download_spool import DOWNLOAD_SPOOL
+from stream_upload import StreamUnavailable, send_video_stream
+from queue_store import ITEM_QUEUE, LEGACY_JSON_FILE_PATH, item_id_of
+from dispatcher import DELIVERY_LOG, Dispatcher
+from archive_store import ARCHIVE_STORE
+from pipeline import PreparedItem, SendPipeline, prepare_timed
+from scheduler import Lane, LaneScheduler
+from file_id_cache import FILE_ID_CACHE, item_key, content_key, hash_file, hash_parts
+from rate_limiter import LIMITER
+from routing import ROUTER
+import metrics
+from message_batching import TELEGRAM_MESSAGE_LIMIT, coalesce_messages, is_valid_message, pack_messages
 
 # --- Basic Setup ---
 # Logger is configured in 'main.py' via 'log_config.py'.
@@ -18,14 +40,22 @@ logger = logging.getLogger(__name__)
 # --- Globals & Constants ---
 # Initialize the Telegram bot instance.
 bot = telebot.TeleBot(TELEGRAM_BOT_TOKEN)
+if TELEGRAM_API_URL:
+    # Send all Bot API requests to another server, e.g. a self-hosted or fake one.
+    telebot.apihelper.API_URL = TELEGRAM_API_URL
+
+# Secret token Telegram must send with webhook updates. A random one is used if none is configured.
+WEBHOOK_SECRET = WEBHOOK_SECRET_TOKEN or secrets.token_urlsafe(32)
+
+# Client for the media worker processes in supervisor mode ('runserver --workers N').
+# When None, media is downloaded in this process.
+MEDIA_WORKERS = None
 
-# --- Path Definitions ---
-# Use the script's directory as a base to ensure paths are correct.
-BOT_DIR = os.path.dirname(__file__)
-# JSON file where the collector script stores incoming URLs.
-JSON_FILE_PATH = os.path.join(BOT_DIR, JSON_FILE_NAME)
-# Directory to move processed JSON files to, preventing re-sends.
-ARCHIVE_DIR = os.path.join(BOT_DIR, ARCHIVE_DIR_NAME)
+# Maximum number of photos Telegram accepts in a single media group.
+MEDIA_GROUP_LIMIT = 10
+
+# Sends an uploaded item to its other chats in parallel; every chat has its own rate limit.
+FANOUT_POOL = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="FanOut")
 
 
 # --- Telegram Bot Logic ---
@@ -37,7 +67,8 @@ def get_chat_id(message):
     Replies with the current chat's ID and instructions on how to set it in the config.
     """
     chat_id = message.chat.id
-    bot.reply_to(
+    LIMITER.call(
+        chat_id, bot.reply_to,
         message,
         "Welcome! To configure this bot, you need to set your chat ID in the configuration file.\n\n"
         f"Your Chat ID is: `{chat_id}`\n\n"
@@ -45,229 +76,654 @@ def get_chat_id(message):
         parse_mode='Markdown'
     )
 
+@bot.message_handler(commands=['forget'])
+def forget_cached_media(message):
+    """
+    Command handler for /forget <itemId> [<itemId> ...].
+    Removes cached file_ids, so the items are downloaded and uploaded again next time.
+    """
+    item_ids = message.text.split()[1:]
+    if not item_ids:
+        LIMITER.call(message.chat.id, bot.reply_to, message, "Usage: /forget <itemId> [<itemId> ...]")
+        return
+
+    keys = [item_key(item_id) for item_id in item_ids]
+    # The same file_ids are also cached under the content hash of the media; those entries go too.
+    file_ids = [
+        file_id for key in keys for kind in ('video', 'photo_video')
+        for file_id in FILE_ID_CACHE.get(key, kind) or ()
+    ]
+    removed = FILE_ID_CACHE.invalidate(file_ids=file_ids, keys=keys)
+    LIMITER.call(message.chat.id, bot.reply_to, message, f"Removed {removed} cached entries.")
+
 # --- Item Type Handlers ---
+# Media items are handled in two stages: a download function that runs ahead
+# in the send pipeline, and a handler that uploads the prepared result.
+
+def streams_videos():
+    """True if videos are streamed into their upload instead of being downloaded to the spool first."""
+    return DOWNLOAD_STREAMING and MEDIA_WORKERS is None
+
+def expected_download_bytes(item):
+    """Spool space to reserve before an item is prepared: the expected size of its video file, if one is written."""
+    if not isinstance(item, dict) or item.get('type') != 'video' or streams_videos():
+        return 0
+    if FILE_ID_CACHE.get(item_key(item.get('itemId')), 'video'):
+        return 0
+    return expected_video_size(item.get('apiResponse')) or TELEGRAM_MAX_UPLOAD_BYTES
+
+def reserve_download(item, blocking=True):
+    """Reserve spool space for the download of an item. Returns None if it is not free and 'blocking' is False."""
+    return DOWNLOAD_SPOOL.reserve(expected_download_bytes(item), blocking=blocking)
+
+def download_video_item(item, use_cache=True, stream=False):
+    """
+    Downloads a video item to a file in the download spool.
 
-def handle_video_item(item, chat_id):
-    """Handles downloading and sending a video item."""
+    Nothing is downloaded if the video was uploaded before and its file_id
+    is cached, or if 'stream' is set; the video is then streamed into its
+    upload by handle_video_item(). Otherwise the video is fetched straight
+    from the URLs in the captured API response when possible. yt-dlp is
+    only used when those URLs are missing, expired or rejected by the CDN.
+    """
     url = item.get('url')
     if not url:
-        logger.error(f"Video item is missing 'url'. Item: {item}")
+        raise ValueError("Video item is missing 'url'.")
+
+    if use_cache:
+        file_ids = FILE_ID_CACHE.get(item_key(item.get('itemId')), 'video')
+        if file_ids:
+            return PreparedItem(file_ids=file_ids)
+    if stream:
+        return PreparedItem(streamed=True)
+
+    api_response = item.get('apiResponse')
+    if DIRECT_DOWNLOAD and api_response:
+        video_path = DOWNLOAD_SPOOL.path(f"video_{item.get('itemId')}.mp4")
+        try:
+            size = download_video_direct(api_response, video_path)
+            metrics.DOWNLOAD_BYTES.inc(size, source='direct')
+            logger.info("Downloaded video directly from the captured URLs (%s bytes): %s", size, url)
+            return PreparedItem(paths=[video_path], content_hash=hash_file(video_path))
+        except DirectDownloadError as e:
+            logger.info("Direct download failed for %s, falling back to yt-dlp: %s", url, e)
+            if os.path.exists(video_path):
+                os.remove(video_path)
+
+    # The pool reuses YoutubeDL instances and only fetches formats under the upload limit.
+    video_path = YTDLP_POOL.download(url)
+    return PreparedItem(paths=[video_path], content_hash=hash_file(video_path))
+
+def send_cached_media(item, chat_id, prepared, kind, send, download):
+    """
+    Sends media by its cached file_ids using 'send(file_ids)'.
+
+    If Telegram no longer accepts the file_ids, they are removed from the
+    cache and the media is downloaded with 'download(item, use_cache=False)'
+    so the caller can upload it again. Returns True if the cached send worked.
+    """
+    if not prepared.file_ids and prepared.content_hash:
+        # Identical media may have been uploaded before under another item ID.
+        prepared.file_ids = FILE_ID_CACHE.get(content_key(prepared.content_hash), kind)
+    if not prepared.file_ids:
         return False
 
-    video_path = None
     try:
-        ydl_opts = {
-            'outtmpl': os.path.join(BOT_DIR, 'temp_video_%(id)s.%(ext)s'),
-            'format': 'best[ext=mp4]/best'
-        }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(url, download=True)
-            video_path = ydl.prepare_filename(info_dict)
-
-        with open(video_path, 'rb') as video:
-            bot.send_video(chat_id, video, timeout=120)
-
-        logger.info(f"Successfully sent video from URL: {url}")
+        send(prepared.file_ids)
+        logger.info("Sent %s item %s by cached file_id, nothing was uploaded.", kind, item.get('itemId'))
         return True
-    except Exception as e:
-        logger.error(f"Failed to process and send video for {url}: {e}", exc_info=True)
-        bot.send_message(chat_id, f"Could not process video from URL:\n{url}\nError: {e}")
+    except telebot.apihelper.ApiTelegramException as e:
+        if e.error_code != 400:
+            raise
+        logger.warning("Cached file_id for item %s was rejected, uploading again: %s", item.get('itemId'), e)
+        FILE_ID_CACHE.invalidate(file_ids=prepared.file_ids)
+        prepared.file_ids = None
+        if not prepared.paths and not prepared.payload:
+            download_again(item, prepared, download)
         return False
+
+def download_again(item, prepared, download):
+    """
+    Downloads an item that has to be uploaded after all, e.g. because its cached
+    file_id was rejected or it could not be streamed, using 'download(item, use_cache=False)'.
+    """
+    # The caller may hold up the items that would free spool space, so this never waits for it.
+    if prepared.reservation is not None:
+        prepared.reservation.release()
+    prepared.reservation = DOWNLOAD_SPOOL.reserve(
+        expected_video_size(item.get('apiResponse')) or TELEGRAM_MAX_UPLOAD_BYTES if item.get('type') == 'video' else 0,
+        force=True,
+    )
+    fresh = download(item, use_cache=False)
+    prepared.paths, prepared.payload, prepared.content_hash = fresh.paths, fresh.payload, fresh.content_hash
+    prepared.streamed = False
+    prepared.reservation.resize(prepared.disk_size)
+
+@contextmanager
+def open_video_stream(item):
+    """
+    Opens a video item for streaming into its upload. Yields (chunks, size, source).
+
+    Like download_video_item(), the captured URLs are tried first and
+    yt-dlp second. Raises StreamUnavailable if the video can only be sent
+    after downloading it, e.g. because yt-dlp has to merge its format.
+    """
+    api_response = item.get('apiResponse')
+    if DIRECT_DOWNLOAD and api_response:
+        try:
+            response, size = open_video_direct(api_response)
+        except DirectDownloadError as e:
+            logger.info("Cannot stream %s from the captured URLs, trying yt-dlp: %s", item.get('url'), e)
+        else:
+            with response:
+                # The raw stream is used so the bytes are sent exactly as the CDN announced them.
+                yield response.raw.stream(CHUNK_SIZE, decode_content=False), size, 'direct_stream'
+            return
+
+    stream = YTDLP_POOL.open_stream(item['url'])
+    if stream is None:
+        raise StreamUnavailable("yt-dlp selected a format that cannot be streamed.")
+    response, size = stream
+    try:
+        yield iter(lambda: response.read(CHUNK_SIZE), b''), size, 'ytdlp_stream'
     finally:
-        if video_path and os.path.exists(video_path):
-            os.remove(video_path)
+        response.close()
+
+def upload_video_stream(item, chat_id):
+    """Streams a video item into a Telegram upload. Returns the sent message and the video's SHA-256."""
+    with open_video_stream(item) as (chunks, size, source):
+        sent, content_hash = send_video_stream(
+            TELEGRAM_BOT_TOKEN, chat_id, chunks, size, f"{item.get('itemId') or 'video'}.mp4", timeout=120
+        )
+    metrics.DOWNLOAD_BYTES.inc(size, source=source)
+    return sent, content_hash
+
+def handle_video_item(item, chat_id, prepared):
+    """Handles sending a downloaded or cached video item."""
+    url = item.get('url')
+    try:
+        if prepared.error:
+            raise prepared.error
+
+        def send_by_file_id(file_ids):
+            return LIMITER.call(chat_id, bot.send_video, chat_id, file_ids[0], timeout=120)
+
+        if send_cached_media(item, chat_id, prepared, 'video', send_by_file_id, download_video_item):
+            return True
 
-def handle_photo_video_item(item, chat_id):
+        sent = None
+        if prepared.streamed:
+            try:
+                # The stream is opened again on every attempt, so retries after a 429 start from the beginning.
+                sent, prepared.content_hash = LIMITER.call(chat_id, upload_video_stream, item, chat_id)
+                logger.info("Streamed video into its upload without writing it to disk: %s", url)
+            except (StreamUnavailable, requests.RequestException) as e:
+                logger.info("Could not stream %s, downloading it first: %s", url, e)
+                download_again(item, prepared, download_video_item)
+
+        def upload():
+            # The file is reopened on every attempt, so retries after a 429 upload it from the start.
+            with open(prepared.paths[0], 'rb') as video:
+                return bot.send_video(chat_id, video, timeout=120)
+
+        if sent is None:
+            sent = LIMITER.call(chat_id, upload)
+        media = sent.video or sent.animation or sent.document
+        if media:
+            # Further chats receive the video by this file_id.
+            prepared.file_ids = [media.file_id]
+            FILE_ID_CACHE.put(
+                [item_key(item.get('itemId')), content_key(prepared.content_hash)], 'video', prepared.file_ids
+            )
+
+        logger.info("Successfully sent video from URL: %s", url)
+        return True
+    except Exception as e:
+        logger.error("Failed to process and send video for %s: %s", url, e, exc_info=True)
+        LIMITER.call(chat_id, bot.send_message, chat_id, f"Could not process video from URL:\n{url}\nError: {e}")
+        return False
+
+def download_photo_video_item(item, use_cache=True):
     """
-    Handles a 'photo_video' item by downloading its images and sending them as a media group.
+    Downloads the images of a 'photo_video' item into memory.
+    Nothing is downloaded if the album's file_ids are cached.
     """
     item_id = item.get('itemId')
     api_response = item.get('apiResponse')
 
     if not all([item_id, api_response]):
-        logger.error(f"Photo_video item {item_id} is missing 'itemId' or 'apiResponse'.")
-        return False
+        raise ValueError(f"Photo_video item {item_id} is missing 'itemId' or 'apiResponse'.")
+
+    if use_cache:
+        file_ids = FILE_ID_CACHE.get(item_key(item_id), 'photo_video')
+        if file_ids:
+            return PreparedItem(file_ids=file_ids)
+
+    # Extract image URLs from the API response
+    images = api_response.get('itemInfo', {}).get('itemStruct', {}).get('imagePost', {}).get('images', [])
+    image_urls = [img.get('displayImage', {}).get('url_list', [None])[0] for img in images]
+    image_urls = [url for url in image_urls if url] # Filter out any None URLs
+    if not image_urls:
+        return PreparedItem(payload=[])
+
+    # Images are fetched in parallel and kept in memory, so nothing touches the disk.
+    downloaded, peak_bytes = download_album(image_urls)
+    # Continue to try sending the successfully downloaded images
+    photos = [image for image in downloaded if image]
+    metrics.DOWNLOAD_BYTES.inc(sum(len(photo) for photo in photos), source='album')
+    logger.info("Downloaded %s/%s images for item %s (peak memory: %.1f MB).", len(photos), len(image_urls), item_id, peak_bytes / 1024 / 1024)
+    return PreparedItem(payload=photos, content_hash=hash_parts(photos) if photos else None)
+
+def send_photo_groups(chat_id, photos):
+    """
+    Sends photos (bytes or file_ids) as media groups of up to MEDIA_GROUP_LIMIT.
+    Returns the file_ids Telegram assigned to the photos.
+    """
+    file_ids = []
+    for start in range(0, len(photos), MEDIA_GROUP_LIMIT):
+        # Image bytes go straight into the multipart upload.
+        media_group = [telebot.types.InputMediaPhoto(photo) for photo in photos[start:start + MEDIA_GROUP_LIMIT]]
+        # Every photo in a media group counts as a separate message towards Telegram's limits.
+        sent = LIMITER.call(chat_id, bot.send_media_group, chat_id, media_group, timeout=120, cost=len(media_group))
+        # The last size of each photo is the original resolution.
+        file_ids.extend(message.photo[-1].file_id for message in sent if message.photo)
+    return file_ids
+
+def handle_photo_video_item(item, chat_id, prepared):
+    """
+    Handles a 'photo_video' item by sending its downloaded or cached images as media groups.
+    Albums larger than Telegram's limit are split into several groups.
+    """
+    item_id = item.get('itemId')
 
-    temp_dir = None
     try:
-        # Extract image URLs from the API response
-        images = api_response.get('itemInfo', {}).get('itemStruct', {}).get('imagePost', {}).get('images', [])
-        image_urls = [img.get('displayImage', {}).get('url_list', [None])[0] for img in images]
-        image_urls = [url for url in image_urls if url] # Filter out any None URLs
-
-        if not image_urls:
-            logger.warning(f"No image URLs found for item {item_id}.")
-            bot.send_message(chat_id, f"Could not find images for post: {item.get('url')}")
-            return False
+        if prepared.error:
+            raise prepared.error
 
-        # Create a unique temporary directory for this item's images
-        temp_dir = os.path.join(BOT_DIR, f'temp_images_{item_id}')
-        if not os.path.exists(temp_dir):
-            os.makedirs(temp_dir)
+        def send_by_file_ids(file_ids):
+            return send_photo_groups(chat_id, file_ids)
 
-        media_group = []
-        downloaded_paths = []
+        if send_cached_media(item, chat_id, prepared, 'photo_video', send_by_file_ids, download_photo_video_item):
+            return True
 
-        # Download each image
-        for i, url in enumerate(image_urls):
-            try:
-                response = requests.get(url, stream=True)
-                response.raise_for_status()
-
-                # Use a generic filename, as the extension is often missing in the URL
-                file_path = os.path.join(temp_dir, f'image_{i}.jpg')
-                with open(file_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-
-                downloaded_paths.append(file_path)
-            except requests.RequestException as e:
-                logger.error(f"Failed to download image {i+1} for item {item_id} from {url}: {e}")
-                # Continue to try sending the successfully downloaded images
-                continue
-
-        if not downloaded_paths:
-            logger.error(f"Failed to download any images for item {item_id}.")
+        photos = prepared.payload
+        if not photos:
+            logger.warning("No images were downloaded for item %s.", item_id)
+            LIMITER.call(chat_id, bot.send_message, chat_id, f"Could not find images for post: {item.get('url')}")
             return False
 
-        # Prepare media group for sending
-        for path in downloaded_paths:
-            with open(path, 'rb') as photo_file:
-                # For the first photo, we read it directly. For subsequent ones, we attach them.
-                # This seems to be a reliable way to handle media groups with local files.
-                media_group.append(telebot.types.InputMediaPhoto(photo_file.read()))
+        file_ids = send_photo_groups(chat_id, photos)
+        if len(file_ids) == len(photos):
+            prepared.file_ids = file_ids
+            FILE_ID_CACHE.put([item_key(item_id), content_key(prepared.content_hash)], 'photo_video', file_ids)
 
-        if media_group:
-            bot.send_media_group(chat_id, media_group, timeout=120)
-            logger.info(f"Successfully sent {len(media_group)} photos for item {item_id}.")
-            return True
-        else:
-            logger.warning(f"Media group was empty for item {item_id}, nothing to send.")
-            return False
+        logger.info("Successfully sent %s photos for item %s.", len(photos), item_id)
+        return True
 
     except Exception as e:
-        logger.error(f"An unexpected error occurred while handling photo_video item {item_id}: {e}", exc_info=True)
-        bot.send_message(chat_id, f"An error occurred while processing a photo post: {item.get('url')}")
+        logger.error("An unexpected error occurred while handling photo_video item %s: %s", item_id, e, exc_info=True)
+        LIMITER.call(chat_id, bot.send_message, chat_id, f"An error occurred while processing a photo post: {item.get('url')}")
         return False
-    finally:
-        # Clean up the temporary directory and its contents
-        if temp_dir and os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-            logger.info(f"Cleaned up temporary directory: {temp_dir}")
-
-def handle_message_item(item, chat_id):
-    """Handles formatting and sending a text message item."""
-    author = item.get('author')
-    text = item.get('text')
-    item_id = item.get('itemId')
 
-    if not all([author, text, item_id]):
-        logger.error(f"Message item is missing required fields. Item ID: {item_id}")
-        return False
+def handle_message_batch(batch, chat_id, sent_parts=None, copy_from=None):
+    """
+    Handles a batch of consecutive text message items.
+
+    The messages are merged into as few Telegram messages as the length
+    limit allows, each line formatted as **Author:** Text. The message_id
+    of every part sent is stored in the 'sent_parts' dict, by part number.
+    Parts that were already sent to another chat are copied from there
+    with copyMessage if 'copy_from' is (chat_id, sent_parts) of that chat.
+    Returns the IDs of the message items that were delivered.
+    """
+    items = []
+    for item in batch['items']:
+        if is_valid_message(item):
+            items.append(item)
+        else:
+            logger.error("Message item is missing required fields. Item ID: %s", item.get('itemId'))
 
+    delivered = []
+    failed = set()
+    for part, (markdown, plain, item_ids, completed_ids) in enumerate(pack_messages(items)):
+        try:
+            if copy_from and part in copy_from[1]:
+                LIMITER.call(chat_id, bot.copy_message, chat_id, copy_from[0], copy_from[1][part])
+                metrics.FANOUT_SENDS.inc(method='copy')
+            else:
+                # MarkdownV2 lets every special character be escaped, so any author or text is safe.
+                sent = LIMITER.call(chat_id, bot.send_message, chat_id, markdown, parse_mode='MarkdownV2')
+                if sent_parts is not None:
+                    sent_parts[part] = sent.message_id
+            # An item split across several messages counts only if every part was sent.
+            delivered.extend(item_id for item_id in completed_ids if item_id not in failed)
+        except Exception as e:
+            failed.update(item_ids)
+            logger.error("Failed to send message items %s: %s", item_ids, e, exc_info=True)
+            # Optionally, send a plain text version if formatting fails
+            try:
+                LIMITER.call(chat_id, bot.send_message, chat_id, f"Failed to send formatted messages:\n{plain}"[:TELEGRAM_MESSAGE_LIMIT])
+            except Exception as fallback_e:
+                logger.error("Failed to send fallback message for items %s: %s", item_ids, fallback_e)
+
+    logger.info("Successfully sent %s/%s message items.", len(delivered), len(batch['items']))
+    return delivered
+
+# --- Send Pipeline Stages ---
+
+def normalize_item(item):
+    """Converts legacy string-based URLs into video items for backward compatibility."""
+    if isinstance(item, str):
+        return {'type': 'video', 'url': item}
+    return item
+
+def prepare_item(item):
+    """Prepare stage of the send pipeline: downloads the media an item needs."""
+    item_type = item.get('type') if isinstance(item, dict) else None
+    if MEDIA_WORKERS is not None and item_type in ('video', 'photo_video'):
+        # Supervisor mode: media is downloaded by the worker processes, unless it was uploaded before.
+        file_ids = FILE_ID_CACHE.get(item_key(item.get('itemId')), item_type)
+        if file_ids:
+            return PreparedItem(file_ids=file_ids)
+        return MEDIA_WORKERS.prepare(item)
+    if item_type == 'video':
+        return download_video_item(item, stream=streams_videos())
+    if item_type == 'photo_video':
+        return download_photo_video_item(item)
+    # Messages and unknown items have nothing to download.
+    return PreparedItem()
+
+def deliver_item(item, prepared, chat_ids):
+    """
+    Deliver stage of the send pipeline: sends a prepared item to every chat in 'chat_ids'.
+    Returns {chat_id: IDs of the queue items delivered there} and the item's timing span.
+    """
+    item_type = item.get('type') if isinstance(item, dict) else None
+    name = f"batch of {len(item['items'])} messages" if item_type == 'message_batch' else item_id_of(item)
+    # The span breaks the item's time down into download, upload and rate limiter sleep.
+    with metrics.span(name, item_type or 'unknown') as span:
+        for phase, seconds in prepared.timings.items():
+            span.add(phase, seconds)
+        deliveries = deliver_to_chats(item, item_type, prepared, chat_ids)
+    return deliveries, span
+
+def deliver_to_chats(item, item_type, prepared, chat_ids):
+    """
+    Sends a prepared item to several chats, uploading it only once.
+
+    The item is uploaded to the first chat that accepts it. The other chats
+    then receive it in parallel by file_id (media) or copyMessage (text).
+    If no file_id is known, e.g. for unknown items, every chat is sent to
+    in turn. Returns {chat_id: delivered IDs}.
+    """
+    deliveries = {}
+    remaining = list(chat_ids)
+    sent_parts = {}
+    source_chat = None
+    while remaining:
+        chat_id = remaining.pop(0)
+        deliveries[chat_id] = _deliver(item, item_type, prepared, chat_id, sent_parts)
+        if deliveries[chat_id]:
+            source_chat = chat_id
+            break
+    if not remaining:
+        return deliveries
+
+    if item_type == 'message_batch' or (item_type in ('video', 'photo_video') and prepared.file_ids):
+        span = metrics.current_span()
+
+        def forward(chat_id):
+            with metrics.attach(span):
+                return forward_item(item, item_type, prepared, chat_id, (source_chat, sent_parts))
+
+        futures = {chat_id: FANOUT_POOL.submit(forward, chat_id) for chat_id in remaining}
+        deliveries.update((chat_id, future.result()) for chat_id, future in futures.items())
+    else:
+        for chat_id in remaining:
+            deliveries[chat_id] = _deliver(item, item_type, prepared, chat_id)
+    return deliveries
+
+def forward_item(item, item_type, prepared, chat_id, copy_from):
+    """
+    Sends an item that was already delivered to another chat, without uploading it again.
+    Returns the IDs of the queue items that were delivered.
+    """
+    if item_type == 'message_batch':
+        return handle_message_batch(item, chat_id, copy_from=copy_from)
     try:
-        # Format the message as requested: **Author:** Text
-        # Using 'MarkdownV2' parse mode requires escaping special characters.
-        # However, for simple bolding, the default mode or 'Markdown' is safer.
-        # Let's stick to a simple format that's less prone to parsing errors.
-        formatted_message = f"*{author}:* {text}"
-
-        bot.send_message(chat_id, formatted_message, parse_mode='Markdown')
-        logger.info(f"Successfully sent message item: {item_id}")
-        return True
+        if item_type == 'video':
+            LIMITER.call(chat_id, bot.send_video, chat_id, prepared.file_ids[0], timeout=120)
+        else:
+            send_photo_groups(chat_id, prepared.file_ids)
+        metrics.FANOUT_SENDS.inc(method='file_id')
+        return [item_id_of(item)]
+    except Exception as e:
+        logger.error("Failed to send %s item %s to chat %s by file_id: %s", item_type, item.get('itemId'), chat_id, e, exc_info=True)
+        return []
+
+def _deliver(item, item_type, prepared, chat_id, sent_parts=None):
+    """Send a prepared item with the handler for its type."""
+    if item_type == 'message_batch':
+        return handle_message_batch(item, chat_id, sent_parts)
+
+    if item_type == 'video':
+        success = handle_video_item(item, chat_id, prepared)
+    elif item_type == 'photo_video':
+        success = handle_photo_video_item(item, chat_id, prepared)
+    else:
+        logger.warning("Unknown or missing item type: %s. Item: %s", item_type, item)
+        LIMITER.call(chat_id, bot.send_message, chat_id, f"Unknown item type: {item_type}. Skipping.")
+        success = False
+    return [item_id_of(item)] if success else []
+
+def queued_item_ids(item):
+    """IDs of the queue items a (possibly merged) item was made from."""
+    if item.get('type') == 'message_batch':
+        return [item_id_of(message_item) for message_item in item['items']]
+    return [item_id_of(item)]
+
+def lane_of(item):
+    """Send lane of an item. Unknown items only cause a short notice, so they go with the messages."""
+    item_type = item.get('type')
+    return item_type if item_type in ('photo_video', 'video') else 'message'
+
+def conversation_keys(item):
+    """TikTok conversations of a message batch; their messages must stay in order."""
+    return {message_item.get('author') for message_item in item.get('items', [])}
+
+def chats_of(item):
+    """Chats that receive an item, logging items no route matches."""
+    chat_ids = ROUTER.chats_for(item)
+    if not chat_ids:
+        logger.warning("No route matches item %s, it is not sent.", item_id_of(item))
+    return chat_ids
+
+def failed_result(item, error):
+    """
+    Result of an item whose send raised 'error': the item is recorded as failed in all
+    of its chats, so the other items of the run are still sent and acknowledged.
+    """
+    item_type = item.get('type') if isinstance(item, dict) else None
+    name = f"batch of {len(item['items'])} messages" if item_type == 'message_batch' else item_id_of(item)
+    logger.error("Failed to send item %s: %s", name, error, exc_info=error)
+    return queued_item_ids(item), {chat_id: set() for chat_id in chats_of(item)}, metrics.Span(name, item_type or 'unknown')
+
+def send_item(item, queue_wait=0.0):
+    """Download a single item and send it to its chats. Returns (item_ids, deliveries, span)."""
+    try:
+        # Every item is delivered by the thread that downloads it, so waiting for spool space is safe here.
+        start = time.perf_counter()
+        reservation = reserve_download(item)
+        spool_wait = time.perf_counter() - start
+        prepared = prepare_timed(prepare_item, item, reservation)
+        prepared.timings['queue_wait'] = queue_wait
+        if spool_wait > 0.001:
+            prepared.timings['spool_wait'] = spool_wait
+        try:
+            deliveries, span = deliver_item(item, prepared, chats_of(item))
+        finally:
+            prepared.cleanup()
     except Exception as e:
-        logger.error(f"Failed to send message item {item_id}: {e}", exc_info=True)
-        # Optionally, send a plain text version if formatting fails
+        return failed_result(item, e)
+    return queued_item_ids(item), deliveries, span
+
+def send_in_order(items, should_stop):
+    """Send items strictly in queue order, downloading the next items while the current one is uploaded."""
+    pipeline = SendPipeline(
+        prepare_item, window=SEND_PREFETCH_WINDOW, max_bytes=SEND_PREFETCH_MAX_BYTES, reserve=reserve_download,
+    )
+    if should_stop is not None:
+        items = itertools.takewhile(lambda _: not should_stop(), items)
+    for item, prepared in pipeline.run(items):
+        # Sends are paced by the rate limiter, so there is no fixed pause between items.
         try:
-            bot.send_message(chat_id, f"Failed to send formatted message from {author}:\n{text}")
-        except Exception as fallback_e:
-            logger.error(f"Failed to send fallback message for item {item_id}: {fallback_e}")
-        return False
+            deliveries, span = deliver_item(item, prepared, chats_of(item))
+        except Exception as e:
+            yield failed_result(item, e)
+            continue
+        yield queued_item_ids(item), deliveries, span
+
+def process_items(items, should_stop=None):
+    """
+    Sends queued items to their chats, yielding (item_ids, deliveries) after each one,
+    where 'deliveries' maps every chat the item went to to the IDs delivered there.
+
+    Runs of consecutive text messages for the same chats are merged into as
+    few Telegram messages as possible. With the "lanes" scheduler, messages,
+    photo posts and videos are sent side by side, so a text message is not
+    held up by a large video; otherwise items are sent strictly in queue
+    order. Once 'should_stop()' returns True, no new items are started.
+    """
+    items = coalesce_messages((normalize_item(item) for item in items), key=ROUTER.chats_for)
+    scheduler = None
+    if SEND_SCHEDULER == 'lanes':
+        lanes = [Lane(name, **settings) for name, settings in SEND_LANES.items()]
+        scheduler = LaneScheduler(
+            lanes, lane_of, send_item,
+            max_workers=SEND_MAX_WORKERS, lookahead=SEND_LANE_LOOKAHEAD, order_keys=conversation_keys,
+        )
+        results = scheduler.run(items, should_stop)
+    else:
+        results = send_in_order(items, should_stop)
+
+    totals = {}
+    started = time.perf_counter()
+    try:
+        for item_ids, deliveries, span in results:
+            for phase, seconds in span.phases.items():
+                totals[phase] = totals.get(phase, 0.0) + seconds
+            yield item_ids, deliveries
+    finally:
+        if totals:
+            # Items are downloaded and sent concurrently, so the phases add up to more than the total time.
+            breakdown = ', '.join(f"{phase} {seconds:.1f}s" for phase, seconds in sorted(totals.items()))
+            logger.info("Send took %.1fs: %s.", time.perf_counter() - started, breakdown)
+        if scheduler and scheduler.wait_summary():
+            logger.info("Lane queue wait: %s.", scheduler.wait_summary())
+
+# The dispatcher checkpoints every item as soon as it is sent, for both /send and auto-dispatch.
+DISPATCHER = Dispatcher(ITEM_QUEUE, DELIVERY_LOG, process_items, ARCHIVE_STORE, file_ids_of=FILE_ID_CACHE.file_ids_of)
 
 @bot.message_handler(commands=['send'])
 def send_collected_items(message):
     """
     Command handler for /send.
-    Reads items from the JSON file, processes them based on their type,
-    sends the content to the target chat, and archives the JSON file.
+    Streams the pending items from the queue journal, processes them based on
+    their type, sends the content to their chats, and archives them.
     """
-    # Check if the target chat ID is configured.
-    if not TARGET_CHAT_ID:
-        bot.reply_to(
+    # Check if a target chat ID or a route is configured.
+    if not ROUTER.all_chats():
+        LIMITER.call(
+            message.chat.id, bot.reply_to,
             message,
             "Error: Target chat ID is not configured.\n"
             "Please run the /start command in the target chat, get the ID, "
             "and set it in the `bot/config.py` file."
         )
-        logger.warning("Send command aborted: TARGET_CHAT_ID is not set in config.py.")
+        logger.warning("Send command aborted: neither TARGET_CHAT_ID nor ROUTES is set in config.py.")
         return
 
-    if not os.path.exists(JSON_FILE_PATH):
-        bot.reply_to(message, "No items in the queue to send.")
+    # Pick up a legacy JSON list queue if the collector has not migrated it yet.
+    ITEM_QUEUE.migrate_legacy(LEGACY_JSON_FILE_PATH)
+
+    if not ITEM_QUEUE.exists():
+        LIMITER.call(message.chat.id, bot.reply_to, message, "No items in the queue to send.")
         return
 
     try:
-        with open(JSON_FILE_PATH, 'r', encoding='utf-8') as f:
-            items = json.load(f)
-
-        if not isinstance(items, list) or not items:
-            bot.reply_to(message, "The item queue is empty or invalid.")
+        # Items already sent by the auto-dispatcher or an interrupted run are skipped.
+        # The count comes from the journal's ID sidecar, so the items are only parsed by the drain.
+        total_count = DISPATCHER.pending_count()
+        if not total_count:
+            LIMITER.call(message.chat.id, bot.reply_to, message, "No items in the queue to send.")
             return
 
-        bot.reply_to(message, f"Starting to send {len(items)} items. This may take a while...")
+        LIMITER.call(message.chat.id, bot.reply_to, message, f"Starting to send {total_count} items. This may take a while...")
 
-        sent_count = 0
-        total_count = len(items)
         # Process items in reverse chronological order (newest first).
-        for item in reversed(items):
-            item_type = item.get('type')
-            success = False
-
-            if item_type == 'video':
-                success = handle_video_item(item, TARGET_CHAT_ID)
-            elif item_type == 'photo_video':
-                success = handle_photo_video_item(item, TARGET_CHAT_ID)
-            elif item_type == 'message':
-                success = handle_message_item(item, TARGET_CHAT_ID)
-            else:
-                # Handle legacy string-based URLs for backward compatibility
-                if isinstance(item, str):
-                    legacy_item = {'type': 'video', 'url': item}
-                    success = handle_video_item(legacy_item, TARGET_CHAT_ID)
-                else:
-                    logger.warning(f"Unknown or missing item type: {item_type}. Item: {item}")
-                    bot.send_message(TARGET_CHAT_ID, f"Unknown item type: {item_type}. Skipping.")
-
-            if success:
-                sent_count += 1
-
-            # Pause between sends to avoid hitting Telegram's rate limits.
-            time.sleep(ASE_DELAY_TIME)
-
-        logger.info(f"Successfully sent {sent_count} out of {total_count} items.")
-        bot.send_message(TARGET_CHAT_ID, f"Finished sending. Processed {sent_count}/{total_count} items.")
-
-        # --- Archive Processed File ---
-        if not os.path.exists(ARCHIVE_DIR):
-            os.makedirs(ARCHIVE_DIR)
-        
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        archive_file_path = os.path.join(ARCHIVE_DIR, f"sent_links_{timestamp}.json")
-        os.rename(JSON_FILE_PATH, archive_file_path)
-        logger.info(f"Archived processed file to '{archive_file_path}'.")
-
-    except json.JSONDecodeError:
-        bot.reply_to(message, "Error: Could not read the item file. It might be corrupted.")
-        logger.error(f"Failed to decode {JSON_FILE_PATH}")
+        # The journal is streamed backwards, so the queue is never loaded into memory at once.
+        # Every item is acknowledged as soon as it is sent, so a restart never sends it twice.
+        processed_count, sent_count = DISPATCHER.drain(force=True)
+
+        logger.info("Successfully sent %s out of %s items.", sent_count, processed_count)
+        report_chat_id = TARGET_CHAT_ID or message.chat.id
+        LIMITER.call(report_chat_id, bot.send_message, report_chat_id, f"Finished sending. Processed {sent_count}/{processed_count} items.")
+
     except Exception as e:
-        logger.error(f"An unexpected error occurred during the send process: {e}", exc_info=True)
-        bot.reply_to(message, f"An unexpected error occurred: {e}")
+        logger.error("An unexpected error occurred during the send process: %s", e, exc_info=True)
+        LIMITER.call(message.chat.id, bot.reply_to, message, f"An unexpected error occurred: {e}")
+
+@bot.message_handler(commands=['pause'])
+def pause_dispatch(message):
+    """Command handler for /pause. Stops auto-dispatch after the item being sent."""
+    DISPATCHER.paused.set()
+    LIMITER.call(message.chat.id, bot.reply_to, message, "Auto-dispatch paused. New items stay queued until /resume.")
+
+@bot.message_handler(commands=['resume'])
+def resume_dispatch(message):
+    """Command handler for /resume. Lets auto-dispatch send queued items again."""
+    DISPATCHER.paused.clear()
+    LIMITER.call(message.chat.id, bot.reply_to, message, "Auto-dispatch resumed.")
 
 # --- Main Execution ---
 
-def main():
-    """Start the bot's polling loop."""
-    logger.info("Telegram bot is starting...")
+def run_auto_dispatch():
+    """Send new items to their chats as soon as the collector queues them."""
+    if not ROUTER.all_chats():
+        logger.warning("Auto-dispatch is disabled: neither TARGET_CHAT_ID nor ROUTES is set in config.py.")
+        return
+    DELIVERY_LOG.load()
+    DISPATCHER.run_forever(AUTO_DISPATCH_POLL_INTERVAL)
+
+def main(mode=BOT_MODE):
+    """
+    Start receiving commands from Telegram.
+
+    In 'polling' mode this runs the long polling loop and never returns. In
+    'webhook' mode it registers WEBHOOK_URL with Telegram and returns; the
+    updates then arrive on the collector server (see 'webhook.py').
+    """
+    logger.info("Telegram bot is starting (%s mode)...", mode)
+    # Remove videos a crashed run downloaded but never uploaded.
+    DOWNLOAD_SPOOL.clean_stale()
+    FILE_ID_CACHE.load()
+    # Skip items a previous run sent before it could archive them.
+    DELIVERY_LOG.load()
+    # Move the snapshot files written by older versions into the archive, one file at a time.
+    if ARCHIVE_STORE.snapshot_paths():
+        threading.Thread(
+            target=ARCHIVE_STORE.migrate_snapshots, args=(FILE_ID_CACHE.file_ids_of,), name="ArchiveMigration", daemon=True
+        ).start()
+
+    if mode == 'webhook':
+        if not WEBHOOK_URL:
+            raise ValueError("Webhook mode needs WEBHOOK_URL to be set in config.py.")
+        bot.set_webhook(url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET)
+        logger.info("Webhook registered at %s.", WEBHOOK_URL)
+        return
+
+    # Telegram refuses getUpdates while a webhook from an earlier run is still set.
+    bot.remove_webhook()
     # Start listening for messages from Telegram. non_stop=True ensures it runs continuously.
     bot.polling(non_stop=True)
 
@@ -1,13 +1,20 @@
 # Copyright NGGT.LightKeeper. All Rights Reserved.
 
-import os
-import json
+import time
 import logging
 import threading
-from collections import deque
-from flask import Flask, request, jsonify
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from config import DD_CACHE_LEN, JSON_FILE_NAME
+from config import (
+    COLLECTOR_HOST, COLLECTOR_PORT, COLLECTOR_SERVER, COLLECTOR_THREADS,
+    INGEST_RETRY_AFTER, INGEST_WRITE_TIMEOUT, INGEST_STARTUP_RETRY_DELAY,
+)
+from archive_store import ARCHIVE_DIR
+from dedup_index import DEDUP_INDEX, iter_archived_item_ids
+from queue_store import ITEM_QUEUE, LEGACY_JSON_FILE_PATH
+from ingest import IngestQueueFull, IngestWriter, decode_batch, slim_item
+import metrics
 
 # --- Basic Setup ---
 # The logger is configured in 'main.py' to ensure a consistent format.
@@ -15,115 +22,227 @@ logger = logging.getLogger(__name__)
 
 # --- Globals & Constants ---
 app = Flask(__name__)
-CORS(app)  # Enable Cross-Origin Resource Sharing for all routes.
+# Enable Cross-Origin Resource Sharing for all routes, and let the extension read 'Retry-After'.
+CORS(app, expose_headers=['Retry-After'])
 
-# Define the absolute path for the JSON file that stores collected URLs.
-JSON_FILE_PATH = os.path.join(os.path.dirname(__file__), JSON_FILE_NAME)
 
-# A lock to prevent race conditions when multiple requests try to write to the file simultaneously.
-FILE_LOCK = threading.Lock()
+def load_existing_items():
+    """
+    Load the persistent de-duplication index at startup.
 
-# Use a deque as a memory-efficient, fixed-size cache to quickly check for recent item IDs.
-# This avoids repeatedly reading the JSON file for de-duplication.
-RECENTLY_PROCESSED_IDS = deque(maxlen=DD_CACHE_LEN)
+    The index survives restarts and still remembers items that were already
+    archived. If no index file exists yet, it is seeded once from the archived
+    queue files. Item IDs in the live queue journal are always added, so the
+    index covers items collected while it was missing or out of date.
+    A legacy JSON list queue, if present, is migrated into the journal first.
+    """
+    ITEM_QUEUE.migrate_legacy(LEGACY_JSON_FILE_PATH)
 
+    if not DEDUP_INDEX.load():
+        logger.info("'%s' not found. Seeding the index from '%s'.", DEDUP_INDEX.path, ARCHIVE_DIR)
+        added = DEDUP_INDEX.add_many(iter_archived_item_ids(ARCHIVE_DIR))
+        logger.info("Seeded the index with %s archived item IDs.", len(added))
 
-def load_existing_items():
+    if not ITEM_QUEUE.exists():
+        logger.info("'%s' not found. Starting with an empty queue.", ITEM_QUEUE.path)
+        return
+
+    # The IDs come from the journal's ID sidecar, so the queued items are not parsed.
+    queued_ids = ITEM_QUEUE.item_ids()
+    added = DEDUP_INDEX.add_many((item_id for item_id in queued_ids if isinstance(item_id, str)), refresh=False)
+    logger.info("Added %s item IDs from '%s' to the index (%s total).", len(added), ITEM_QUEUE.path, len(DEDUP_INDEX))
+
+
+def store_batches(batches):
     """
-    Load item IDs from the JSON file into the de-duplication cache at startup.
-    This pre-fills the cache to prevent adding duplicates that already exist on disk.
+    De-duplicate received items by their 'itemId' and append the new ones to the queue journal.
+
+    Runs on the ingest writer thread only. The new items of all batches are
+    written with a single journal write. Returns a dict with the number of
+    saved, duplicate and invalid items for every batch.
     """
-    with FILE_LOCK:
-        if not os.path.exists(JSON_FILE_PATH):
-            logger.info(f"'{JSON_FILE_PATH}' not found. Starting with an empty cache.")
-            return
-        try:
-            with open(JSON_FILE_PATH, 'r', encoding='utf-8') as f:
-                items = json.load(f)
-                if not isinstance(items, list):
-                    logger.warning(f"'{JSON_FILE_PATH}' does not contain a JSON list. Starting fresh.")
-                    return
-
-                count = 0
-                for item in items:
-                    # Check if the item is a dictionary and has the required 'itemId'
-                    item_id = item.get('itemId') if isinstance(item, dict) else None
-                    if item_id:
-                        if item_id not in RECENTLY_PROCESSED_IDS:
-                            RECENTLY_PROCESSED_IDS.append(item_id)
-                            count += 1
-                    else:
-                        # Handle old format (plain URL strings) for backward compatibility
-                        if isinstance(item, str) and item not in RECENTLY_PROCESSED_IDS:
-                            RECENTLY_PROCESSED_IDS.append(item)
-                            count += 1
-
-                logger.info(f"Loaded {count} unique item IDs from '{JSON_FILE_PATH}' into the cache.")
-        except (json.JSONDecodeError, IOError) as e:
-            logger.error(f"Could not read or parse '{JSON_FILE_PATH}': {e}")
+    new_items = []
+    results = []
+    for items in batches:
+        result = {"saved": 0, "duplicates": 0, "invalid": 0}
+        for data in items:
+            if not isinstance(data, dict) or 'type' not in data or 'itemId' not in data:
+                logger.warning("Skipping invalid item: 'type' and 'itemId' keys are required.")
+                result["invalid"] += 1
+                continue
+
+            # --- De-duplication Check ---
+            # The check and the insert are a single atomic O(1) operation.
+            if not DEDUP_INDEX.add(data['itemId']):
+                logger.info("Duplicate item ID detected in index, skipping: %s", data['itemId'])
+                result["duplicates"] += 1
+                continue
+            new_items.append(data)
+            result["saved"] += 1
+        results.append(result)
+        metrics.INGEST_ITEMS.inc(result["saved"], result='saved')
+        metrics.INGEST_ITEMS.inc(result["duplicates"], result='duplicate')
+        metrics.INGEST_ITEMS.inc(result["invalid"], result='invalid')
+
+    # --- Append-Only Write ---
+    # Only the new items are written, so the cost does not grow with the queue size.
+    try:
+        ITEM_QUEUE.extend(new_items)
+    except Exception:
+        # Forget the IDs so the extension can retry the items.
+        for data in new_items:
+            DEDUP_INDEX.discard(data['itemId'])
+        raise
+
+    for data in new_items:
+        logger.info("Successfully saved new item (%s, ID: %s).", data.get('type'), data['itemId'])
+    return results
+
+# All journal writes go through one writer thread; request handlers only queue their items.
+INGEST_WRITER = IngestWriter(store_batches)
+metrics.QUEUE_DEPTH.set_function(lambda: len(INGEST_WRITER), queue='ingest')
+metrics.QUEUE_DEPTH.set_function(ITEM_QUEUE.size, queue='journal_bytes')
+# Set while the existing items could not be loaded, so nothing would write received items.
+INGEST_UNAVAILABLE = threading.Event()
+
+
+def busy_response():
+    """A 503 response asking the client to retry after INGEST_RETRY_AFTER seconds."""
+    metrics.INGEST_REJECTED.inc()
+    response = jsonify({"status": "busy", "message": "The server is busy, retry later."})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(INGEST_RETRY_AFTER)
+    return response
+
+
+def submit_items(items):
+    """
+    Hand received items to the ingest writer and wait until they are stored.
+    Returns a (result, None) tuple, or (None, response) with a 503 response if the items could not be queued in time.
+    """
+    if INGEST_UNAVAILABLE.is_set():
+        logger.warning("The de-duplication index is not loaded, asking the client to retry in %ss.", INGEST_RETRY_AFTER)
+        return None, busy_response()
+    try:
+        # Slimming only needs the CPU, so it runs on the request thread.
+        future = INGEST_WRITER.submit([slim_item(data) if isinstance(data, dict) else data for data in items])
+        return future.result(timeout=INGEST_WRITE_TIMEOUT), None
+    except (IngestQueueFull, FutureTimeoutError) as e:
+        logger.warning("Ingest queue is busy, asking the client to retry in %ss: %s", INGEST_RETRY_AFTER, e)
+        return None, busy_response()
 
 
 @app.route('/send_item', methods=['POST'])
+@metrics.INGEST_LATENCY.time(endpoint='send_item')
 def receive_item():
     """
     API endpoint to receive a data item, de-duplicate it by its 'itemId',
-    and save it to the JSON file. This is called by the browser extension.
+    and append it to the queue journal.
     """
     try:
         data = request.get_json()
         if not data or 'type' not in data or 'itemId' not in data:
             raise ValueError("Invalid JSON: 'type' and 'itemId' keys are required.")
 
-        item_id = data['itemId']
-
-        # --- De-duplication Check ---
-        if item_id in RECENTLY_PROCESSED_IDS:
-            logger.info(f"Duplicate item ID detected in cache, skipping: {item_id}")
+        result, busy_response = submit_items([data])
+        if busy_response:
+            return busy_response
+        if not result["saved"]:
             return jsonify({"status": "success", "message": "Duplicate item, skipped."})
+        return jsonify({"status": "success", "message": "Item processed."})
 
-        RECENTLY_PROCESSED_IDS.append(item_id)
-
-        # --- Thread-Safe File Writing ---
-        with FILE_LOCK:
-            all_items = []
-            if os.path.exists(JSON_FILE_PATH):
-                try:
-                    with open(JSON_FILE_PATH, 'r', encoding='utf-8') as f:
-                        all_items = json.load(f)
-                        # Ensure we are working with a list
-                        if not isinstance(all_items, list):
-                            logger.warning(f"'{JSON_FILE_PATH}' was not a list. Re-initializing.")
-                            all_items = []
-                except (json.JSONDecodeError, IOError):
-                    logger.warning(f"'{JSON_FILE_PATH}' was corrupted or empty. Starting fresh.")
-                    all_items = []
-
-            # Final check on the list read from the file to handle race conditions.
-            # We create a set of existing IDs for a fast lookup.
-            existing_ids = {
-                item.get('itemId') for item in all_items if isinstance(item, dict)
-            }
-            if item_id not in existing_ids:
-                all_items.append(data)
-                with open(JSON_FILE_PATH, 'w', encoding='utf-8') as f:
-                    json.dump(all_items, f, indent=4)
-                logger.info(f"Successfully saved new item ({data.get('type')}, ID: {item_id}). Total items: {len(all_items)}")
-            else:
-                logger.info(f"Duplicate item ID detected in file, skipping: {item_id}")
+    except Exception as e:
+        logger.error("An error occurred in /send_item: %s", e, exc_info=True)
+        return jsonify({"status": "error", "message": str(e)}), 400
 
-        return jsonify({"status": "success", "message": "Item processed."})
+
+@app.route('/send_items', methods=['POST'])
+@metrics.INGEST_LATENCY.time(endpoint='send_items')
+def receive_items():
+    """
+    API endpoint to receive a batch of data items. This is called by the browser extension.
+
+    The body is NDJSON ('application/x-ndjson') or a JSON array, optionally
+    gzip-compressed ('Content-Encoding: gzip'). Answers 503 with a
+    'Retry-After' header while the ingest queue is full.
+    """
+    try:
+        items = decode_batch(
+            request.get_data(cache=False),
+            content_type=request.content_type,
+            content_encoding=request.headers.get('Content-Encoding'),
+        )
+        result, busy_response = submit_items(items)
+        if busy_response:
+            return busy_response
+        logger.info("Received a batch of %s items: %s saved, %s duplicates, %s invalid.", len(items), result['saved'], result['duplicates'], result['invalid'])
+        return jsonify({"status": "success", **result})
 
     except Exception as e:
-        logger.error(f"An error occurred in /send_url: {e}", exc_info=True)
+        logger.error("An error occurred in /send_items: %s", e, exc_info=True)
         return jsonify({"status": "error", "message": str(e)}), 400
 
 
-def main():
-    """Main function to start the Flask server for item collection."""
-    load_existing_items()  # Pre-fill the cache with existing item IDs.
-    logger.info("Starting Flask server for item collection on http://127.0.0.1:5000")
+@app.route('/metrics', methods=['GET'])
+def export_metrics():
+    """API endpoint that exposes the collector and bot metrics in the Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+def serve(server=COLLECTOR_SERVER, host=COLLECTOR_HOST, port=COLLECTOR_PORT):
+    """
+    Serve the collector app with the selected server.
+    'waitress' is a multi-threaded production WSGI server; 'flask' is Flask's development server.
+    """
+    if server == 'waitress':
+        try:
+            from waitress import serve as waitress_serve
+        except ImportError:
+            logger.warning("waitress is not installed, falling back to the Flask development server.")
+        else:
+            logger.info("Starting waitress server for item collection on http://%s:%s (%s threads)", host, port, COLLECTOR_THREADS)
+            waitress_serve(app, host=host, port=port, threads=COLLECTOR_THREADS)
+            return
+    elif server != 'flask':
+        raise ValueError(f"Unknown collector server: {server!r}. Use 'waitress' or 'flask'.")
+
+    logger.info("Starting Flask server for item collection on http://%s:%s", host, port)
+    app.run(host=host, port=port, threaded=True)
+
+
+def start_ingest(retry_delay=INGEST_STARTUP_RETRY_DELAY):
+    """
+    Load the de-duplication index and the queued item IDs, then start writing received items.
+    If loading fails, requests are answered with 503 right away until a later attempt succeeds.
+    """
+    while True:
+        try:
+            load_existing_items()
+            break
+        except Exception:
+            # Without the index, duplicates cannot be detected, so no items are accepted.
+            INGEST_UNAVAILABLE.set()
+            logger.critical(
+                "Could not load the de-duplication index, retrying in %ss. Items are not accepted meanwhile.",
+                retry_delay, exc_info=True,
+            )
+            time.sleep(retry_delay)
+    INGEST_WRITER.start()
+    INGEST_UNAVAILABLE.clear()
+    logger.info("The collector is accepting items.")
+
+
+def main(server=COLLECTOR_SERVER):
+    """
+    Main function to start the server for item collection.
+
+    The server starts listening right away while the existing items are
+    loaded in the background. Items received in the meantime wait in the
+    ingest queue and are written once the index is ready.
+    """
+    threading.Thread(target=start_ingest, name="CollectorStartup", daemon=True).start()
     # The server runs indefinitely, listening for requests from the extension.
-    app.run(host='127.0.0.1', port=5000)
+    serve(server)
 
 
 if __name__ == '__main__':
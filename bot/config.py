@@ -13,16 +13,316 @@ TELEGRAM_BOT_TOKEN = "TELEGRAM_BOT_TOKEN"
 # TARGET_CHAT_ID = -1001234567890
 TARGET_CHAT_ID = None
 
+# --- Routing ---
+# Rules for sending items to several chats. Every rule sends the items it matches to all of
+# its 'chats'. A rule may only match some item 'types' ("message", "video", "photo_video") and
+# some TikTok 'authors' (user names without '@'); a rule without conditions matches every item.
+# An item goes to the chats of every matching rule, and to TARGET_CHAT_ID if no rule matches.
+# Each item is still downloaded and uploaded only once: the first chat receives the upload,
+# and the other chats receive it by file_id (media) or copyMessage (text).
+# Example:
+# ROUTES = [
+#     {'chats': [-1001234567890, -1009876543210]},
+#     {'types': ['video', 'photo_video'], 'authors': ['some_user'], 'chats': [-1001111111111]},
+# ]
+ROUTES = []
+
+# Number of chats an item is sent to in parallel once it was uploaded to its first chat.
+FANOUT_WORKERS = 4
+
+# Bot API server URL template: "{0}" is replaced with the token and "{1}" with the method name.
+# Leave as None to use Telegram's servers. Set it to use a self-hosted Bot API server,
+# or a stand-in server such as the one in 'benchmarks/fake_bot_api.py'.
+# Example:
+# TELEGRAM_API_URL = "http://127.0.0.1:8081/bot{0}/{1}"
+TELEGRAM_API_URL = None
+
+# --- Telegram Updates ---
+# How the bot receives commands: "polling" (long polling, the default) or "webhook".
+# In webhook mode Telegram posts updates to the collector server, so no polling loop runs.
+# Can be overridden with 'main.py runserver --bot-mode'.
+BOT_MODE = "polling"
+
+# Public HTTPS URL that Telegram sends updates to in webhook mode. It must reach the collector's
+# WEBHOOK_PATH, e.g. through a reverse proxy or a tunnel to http://127.0.0.1:5000.
+# Example:
+# WEBHOOK_URL = "https://bot.example.com/telegram/webhook"
+WEBHOOK_URL = None
+
+# Route on the collector server that receives the updates.
+WEBHOOK_PATH = "/telegram/webhook"
+
+# Secret token Telegram sends with every update, so forged requests are rejected.
+# Leave as None to generate a new random token on every start.
+WEBHOOK_SECRET_TOKEN = None
+
+# Port of the webhook server in supervisor mode ('runserver --workers N'), where the bot
+# runs in its own process. Forward WEBHOOK_PATH to this port instead of the collector's.
+WEBHOOK_PORT = 5001
+
+
+# --- Telegram Rate Limits ---
+# All messages go through an adaptive rate limiter instead of a fixed delay.
+# The rate starts at the maximum, is halved whenever Telegram answers with
+# Error 429 (Too Many Requests), and slowly climbs back up afterwards.
+
+# Maximum messages per minute to a single chat (Telegram allows about 20 for groups).
+RATE_LIMIT_CHAT_PER_MINUTE = 20
+
+# Lowest rate (messages per minute) the limiter will slow down to.
+RATE_LIMIT_MIN_PER_MINUTE = 2
+
+# Maximum messages per second across all chats (Telegram allows about 30).
+RATE_LIMIT_GLOBAL_PER_SECOND = 30
+
+# How many times a message is retried after Error 429 before giving up.
+RATE_LIMIT_MAX_RETRIES = 5
+
+# Consecutive successful sends before the limiter tries a higher rate again.
+RATE_LIMIT_PROBE_AFTER = 10
+
+# --- Media Downloads ---
+# Download videos straight from the URLs captured by the extension.
+# yt-dlp is only used when those URLs have expired or are rejected.
+DIRECT_DOWNLOAD = True
+
+# Codecs Telegram clients can play inline, in order of preference.
+PLAYABLE_CODECS = ('h264',)
+
+# Maximum file size (in bytes) the Telegram Bot API accepts for uploads.
+TELEGRAM_MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+
+# Directory where downloaded videos wait to be uploaded. Relative paths are inside the 'bot'
+# directory. An absolute path on a tmpfs (e.g. "/dev/shm/tt2tg_spool") keeps them off the disk.
+DOWNLOAD_SPOOL_DIR_NAME = "download_spool"
+
+# Maximum size (in bytes) of the videos in the spool. Downloads wait until space is free.
+# A video's size is taken from its captured API response, or TELEGRAM_MAX_UPLOAD_BYTES if unknown.
+DOWNLOAD_SPOOL_MAX_BYTES = 500 * 1024 * 1024
+
+# Files in the spool older than this (in seconds) were left behind by a crash and are
+# removed at startup. Must be longer than a download and upload take (see MEDIA_JOB_TIMEOUT).
+DOWNLOAD_SPOOL_STALE_AGE = 3600
+
+# Stream videos from the CDN (or the format yt-dlp selected) straight into the Telegram
+# upload, without writing them to the spool. Only used for single-file formats of known
+# size and when media workers are not used; other videos are still downloaded first.
+DOWNLOAD_STREAMING = False
+
+# Number of pooled HTTP connections kept open for media downloads.
+HTTP_POOL_SIZE = 10
+
+# Number of album images downloaded in parallel for a photo post.
+ALBUM_DOWNLOAD_WORKERS = 4
+
+# Maximum size (in bytes) of a single album image (Telegram accepts photos up to 10 MB).
+ALBUM_MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+# Maximum memory (in bytes) an album's images may use while waiting to be uploaded.
+ALBUM_MAX_BYTES = 100 * 1024 * 1024
+
+# Number of reusable yt-dlp instances (and parallel yt-dlp downloads).
+YTDLP_POOL_SIZE = 2
+
+# Downloads after which a yt-dlp instance is replaced with a fresh one.
+YTDLP_MAX_JOBS = 50
+
+# Idle time (in seconds) after which a yt-dlp instance is replaced before reuse.
+YTDLP_IDLE_TIMEOUT = 600
+
+# --- Sending ---
+# Number of items downloaded ahead while the current item is being uploaded by /send.
+# Delivery order is not affected. Set to 1 to download one item at a time.
+SEND_PREFETCH_WINDOW = 3
+
+# Maximum size (in bytes) of downloaded media waiting to be uploaded.
+# Prefetching pauses while this limit is reached.
+SEND_PREFETCH_MAX_BYTES = 200 * 1024 * 1024
+
+# How queued items are scheduled for sending:
+# "lanes" - Text messages, photo posts and videos are sent in separate lanes, so a
+#           text message never waits behind a large video.
+# "fifo"  - Items are sent strictly one after another in queue order (with prefetching).
+SEND_SCHEDULER = "lanes"
+
+# Send lanes for the "lanes" scheduler. 'concurrency' is the number of items of a lane sent
+# at the same time. When several lanes have items waiting, free workers are shared in
+# proportion to 'weight'. In an 'ordered' lane, messages from the same TikTok conversation
+# are always delivered in queue order.
+SEND_LANES = {
+    'message': {'concurrency': 1, 'weight': 4, 'ordered': True},
+    'photo_video': {'concurrency': 1, 'weight': 2, 'ordered': False},
+    'video': {'concurrency': 2, 'weight': 1, 'ordered': False},
+}
+
+# Maximum number of items sent at the same time across all lanes. With fewer workers than the
+# lanes' combined concurrency, busy media lanes can hold up text messages until a worker is free.
+SEND_MAX_WORKERS = 4
+
+# Number of queued items read ahead to sort them into lanes.
+SEND_LANE_LOOKAHEAD = 500
+
+# --- De-duplication and Caches ---
+# De-duplication index length (maximum number of remembered item IDs).
+# The least recently seen IDs are evicted first once the limit is reached.
+DD_CACHE_LEN = 100000
 
-# Delay time (in seconds) between messages to fix Error 429 (Too Many Requests) from Telegram API
-# Recommended value 5-15 seconds
-ASE_DELAY_TIME = 10
+# De-duplication index time-to-live (in seconds). Older IDs are forgotten.
+# Set to None to keep IDs until they are evicted by DD_CACHE_LEN.
+DD_CACHE_TTL = None
 
-# De-duplication cache length
-DD_CACHE_LEN = 10000
+# De-duplication index file name (persists the index between restarts)
+DD_INDEX_FILE_NAME = "dedup_index.ndjson"
 
-# Collected data JSON file name
+# Telegram file_id cache length (maximum number of remembered uploads).
+# Media that was uploaded before is re-sent by file_id, without downloading or uploading it.
+FILE_ID_CACHE_LEN = 50000
+
+# Telegram file_id cache time-to-live (in seconds). Set to None to keep entries until evicted.
+FILE_ID_CACHE_TTL = None
+
+# Telegram file_id cache file name
+FILE_ID_CACHE_FILE_NAME = "file_id_cache.ndjson"
+
+# --- Automatic Dispatch ---
+# Send new items automatically as soon as they are collected, without waiting for /send.
+# /send still works as a manual trigger, and /pause and /resume control the automatic sending.
+AUTO_DISPATCH = False
+
+# How often (in seconds) the automatic dispatcher checks the queue for new items.
+AUTO_DISPATCH_POLL_INTERVAL = 2
+
+# Delivery acknowledgement journal file name.
+# Every sent item is recorded here, so a restart resumes where the previous run stopped.
+ACK_FILE_NAME = "sent_acks.ndjson"
+
+# --- Logging ---
+# Minimum level of log messages to write ("DEBUG", "INFO", "WARNING", "ERROR").
+LOG_LEVEL = "INFO"
+
+# Log output format:
+# "text" - One human-readable line per message.
+# "json" - One JSON object per line, for log collectors.
+LOG_FORMAT = "text"
+
+# Also write logs to this file, rotated once it reaches LOG_FILE_MAX_BYTES. None logs to the console only.
+LOG_FILE_NAME = None
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+# Number of rotated log files to keep.
+LOG_FILE_BACKUP_COUNT = 5
+
+# Log messages are written by a background thread. If this many are waiting, new ones
+# are dropped (and counted) instead of slowing down the collector or the bot.
+LOG_QUEUE_SIZE = 10000
+
+# Maximum length of a value in a log message, e.g. an item with its full API response.
+LOG_MAX_VALUE_LENGTH = 500
+
+# Repeated messages, such as skipped duplicates, are sampled: per logger, at most this many
+# messages with the same text template are written per LOG_SAMPLING_INTERVAL seconds.
+# Warnings and errors are never sampled.
+LOG_SAMPLING = {'collector': 10}
+LOG_SAMPLING_INTERVAL = 60
+
+# --- Collector Server ---
+# Address the collector listens on for items from the browser extension.
+COLLECTOR_HOST = "127.0.0.1"
+COLLECTOR_PORT = 5000
+
+# Server that runs the collector: "waitress" (multi-threaded production WSGI server)
+# or "flask" (Flask's development server). Can be overridden with 'main.py runserver --server'.
+# Falls back to "flask" if waitress is not installed.
+COLLECTOR_SERVER = "waitress"
+
+# Number of threads waitress uses to handle requests.
+COLLECTOR_THREADS = 8
+
+# Maximum number of received items waiting to be written to the queue journal.
+# When it is reached, the collector answers 503 with a 'Retry-After' header and the extension backs off.
+INGEST_QUEUE_MAX_ITEMS = 1000
+
+# Seconds the extension is asked to wait before retrying when the ingest queue is full.
+INGEST_RETRY_AFTER = 2
+
+# Maximum seconds a request waits for its items to be written before it is answered with 503.
+INGEST_WRITE_TIMEOUT = 30
+
+# Seconds between attempts to load the de-duplication index when it failed at startup.
+# Until it is loaded, the collector answers 503 right away instead of queueing items.
+INGEST_STARTUP_RETRY_DELAY = 30
+
+# Reduce captured TikTok API responses to the fields the bot uses before they are queued.
+# This keeps the queue journal and the archives roughly ten times smaller.
+SLIM_API_RESPONSES = True
+
+# Maximum size (in bytes) of a decoded '/send_items' batch, also after decompression.
+INGEST_MAX_BATCH_BYTES = 32 * 1024 * 1024
+
+# Legacy collected data JSON file name.
+# If this file exists, its items are migrated into the queue journal on startup.
 JSON_FILE_NAME = "urls_to_send.json"
 
-# Directory to move processed JSON files to, preventing re-sends.
+# Collected data queue journal file name (one JSON item per line)
+QUEUE_FILE_NAME = "urls_to_send.ndjson"
+
+# Flush the queue journal to disk (fsync) before acknowledging an item.
+# Concurrent writes share a single fsync, so the cost stays low under load.
+QUEUE_FSYNC = True
+
+# Directory to move processed items to, preventing re-sends.
 ARCHIVE_DIR_NAME = "sent_archive"
+
+# Index of the archive (SQLite), inside the archive directory.
+# It maps every item ID to when it was sent, its status, its file_ids and its place in the archive.
+ARCHIVE_INDEX_FILE_NAME = "archive_index.sqlite3"
+
+# Archived items are stored in gzip-compressed NDJSON segments. A new segment is started
+# once the current one reaches this size (in bytes, compressed).
+ARCHIVE_SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+# Items per compressed block inside a segment. A lookup only decompresses the block of its item.
+ARCHIVE_BLOCK_ITEMS = 256
+
+# Days to keep archived items. Older segments are deleted, but their items stay in the index,
+# so it still answers when an item was sent. None keeps everything.
+ARCHIVE_RETENTION_DAYS = None
+
+# Segments in which less than this share of the items is still current (e.g. because the
+# items were archived again later) are rewritten to free the space.
+ARCHIVE_COMPACT_MIN_LIVE_RATIO = 0.5
+
+# Seconds between retention and compaction runs. They run after archiving, and first after a start.
+ARCHIVE_MAINTENANCE_INTERVAL = 24 * 60 * 60
+
+# Keep the 'sent_links_*' snapshot files of older versions once they were migrated into the
+# archive, renamed with a '.migrated' suffix. By default they are deleted.
+ARCHIVE_KEEP_MIGRATED_SNAPSHOTS = False
+
+# --- Supervisor Mode ---
+# Used by 'python main.py runserver --workers N', which runs the collector, the bot and
+# N media download workers in separate processes.
+
+# Directory of the job spool the bot uses to hand downloads to the media workers.
+MEDIA_SPOOL_DIR_NAME = "media_jobs"
+
+# Seconds between checks for new jobs (workers) and finished downloads (bot).
+MEDIA_WORKER_POLL_INTERVAL = 0.2
+
+# Seconds the bot waits for a media worker to download an item before giving up on it.
+MEDIA_JOB_TIMEOUT = 900
+
+# Delay before a crashed process is restarted. It doubles after every crash up to the
+# maximum, and is reset once the process has been running for SUPERVISOR_STABLE_SECONDS.
+SUPERVISOR_RESTART_DELAY = 1
+SUPERVISOR_RESTART_DELAY_MAX = 60
+SUPERVISOR_STABLE_SECONDS = 60
+
+# Seconds a process may take to shut down after SIGTERM before it is killed.
+SUPERVISOR_SHUTDOWN_TIMEOUT = 15
+
+# Directory (relative to 'bot/') where the bot and media worker processes write their metrics,
+# so the collector can include them in '/metrics'.
+METRICS_SNAPSHOT_DIR_NAME = "metrics_snapshots"
+
+# Seconds between metrics snapshots of every process.
+METRICS_SNAPSHOT_INTERVAL = 5
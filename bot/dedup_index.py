@@ -0,0 +1,191 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import os
+import json
+import time
+import logging
+import itertools
+import threading
+from collections import OrderedDict
+from config import DD_CACHE_LEN, DD_CACHE_TTL, DD_INDEX_FILE_NAME
+from archive_store import ArchiveStore, iter_snapshot_items
+
+# --- Basic Setup ---
+# The logger is configured in 'main.py' to ensure a consistent format.
+logger = logging.getLogger(__name__)
+
+# --- Path Definitions ---
+BOT_DIR = os.path.dirname(__file__)
+# Append-only log that persists the de-duplication index between restarts.
+DD_INDEX_FILE_PATH = os.path.join(BOT_DIR, DD_INDEX_FILE_NAME)
+
+# Number of index log lines parsed at once when the index is loaded.
+LOAD_BLOCK_LINES = 4096
+
+
+class DedupIndex:
+    """
+    A persistent de-duplication index of item IDs.
+
+    Membership checks are O(1) hash lookups. Entries are kept in an ordered
+    dict by last-seen time, so the least recently seen ID is evicted first
+    once 'max_entries' is reached, and IDs older than 'ttl' seconds (if set)
+    are treated as unseen. Every new or seen-again ID is appended to a log
+    file as '[timestamp, id]', so the order survives restarts, and the log
+    is compacted when it grows to twice the size of the live index.
+    Discarded IDs are logged as tombstones.
+    """
+
+    def __init__(self, path, max_entries, ttl=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # item_id -> last seen timestamp
+        self._lock = threading.Lock()
+        self._file = None
+        self._log_lines = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    # --- Internal Helpers ---
+
+    def _is_expired(self, timestamp, now):
+        return self.ttl is not None and timestamp < now - self.ttl
+
+    def _evict(self, now):
+        """Drop expired entries and trim the index to its maximum size."""
+        while self._entries:
+            oldest_id, oldest_ts = next(iter(self._entries.items()))
+            if len(self._entries) > self.max_entries or self._is_expired(oldest_ts, now):
+                self._entries.popitem(last=False)
+            else:
+                break
+
+    def _remember(self, item_id, timestamp):
+        self._entries[item_id] = timestamp
+        self._entries.move_to_end(item_id)
+
+    def _log(self, lines):
+        """Append log lines to the index file. Must be called with the lock held."""
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(''.join(lines))
+        self._file.flush()
+        self._log_lines += len(lines)
+        if self._log_lines > 2 * max(len(self._entries), 1024):
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the log so it only contains live entries. Must be called with the lock held."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for item_id, timestamp in self._entries.items():
+                f.write(json.dumps([timestamp, item_id], ensure_ascii=False) + '\n')
+        os.replace(temp_path, self.path)
+        self._log_lines = len(self._entries)
+
+    # --- Public API ---
+
+    def load(self):
+        """Load the index from disk. Returns True if an index file was found."""
+        with self._lock:
+            if not os.path.exists(self.path):
+                return False
+            now = time.time()
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for entries in _iter_entry_blocks(f):
+                    self._log_lines += len(entries)
+                    for entry in entries:
+                        if len(entry) > 2:
+                            # A tombstone written by discard().
+                            self._entries.pop(entry[1], None)
+                        else:
+                            self._remember(entry[1], entry[0])
+            self._evict(now)
+            logger.info("Loaded %s item IDs from de-duplication index '%s'.", len(self._entries), self.path)
+            return True
+
+    def __contains__(self, item_id):
+        with self._lock:
+            timestamp = self._entries.get(item_id)
+            return timestamp is not None and not self._is_expired(timestamp, time.time())
+
+    def add(self, item_id):
+        """
+        Atomically check and record an item ID.
+        Returns True if the ID was new, or False if it is a duplicate.
+        """
+        return bool(self.add_many([item_id]))
+
+    def add_many(self, item_ids, refresh=True):
+        """
+        Record several item IDs at once. Returns the list of IDs that were new.
+        With 'refresh=False', IDs that are already known are left as they are, e.g. when
+        the IDs are restored at startup rather than seen again.
+        """
+        now = time.time()
+        added = []
+        seen = []
+        with self._lock:
+            for item_id in item_ids:
+                timestamp = self._entries.get(item_id)
+                is_new = timestamp is None or self._is_expired(timestamp, now)
+                if not is_new and not refresh:
+                    continue
+                # A seen-again ID is refreshed too, so frequently seen IDs stay in the index.
+                self._remember(item_id, now)
+                (added if is_new else seen).append(item_id)
+            if added or seen:
+                self._evict(now)
+                self._log([json.dumps([now, item_id], ensure_ascii=False) + '\n' for item_id in added + seen])
+        return added
+
+    def discard(self, item_id):
+        """Forget an item ID, e.g. when storing its item failed."""
+        with self._lock:
+            if self._entries.pop(item_id, None) is not None:
+                self._log([json.dumps([time.time(), item_id, False], ensure_ascii=False) + '\n'])
+
+
+def _iter_entry_blocks(f, block_lines=LOAD_BLOCK_LINES):
+    """
+    Parse the index log in blocks of lines. A block is parsed as one JSON array, which
+    is much faster than parsing every line on its own; only a block with a damaged line
+    is parsed line by line, skipping the damaged ones.
+    """
+    while True:
+        lines = [line for line in itertools.islice(f, block_lines) if line.strip()]
+        if not lines:
+            return
+        try:
+            yield json.loads('[' + ','.join(lines) + ']')
+        except ValueError:
+            entries = []
+            for line in lines:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+            yield entries
+
+
+def iter_archived_item_ids(archive_dir):
+    """Yield item IDs from the archive index and from snapshot files that were not migrated yet."""
+    store = ArchiveStore(archive_dir)
+    yield from store.iter_item_ids()
+    for path in store.snapshot_paths():
+        try:
+            for item in iter_snapshot_items(path):
+                item_id = item.get('itemId') if isinstance(item, dict) else item
+                if isinstance(item_id, str):
+                    yield item_id
+        except (ValueError, IOError) as e:
+            logger.warning("Could not read archive '%s' while seeding the index: %s", path, e)
+
+
+# --- Shared Instance ---
+DEDUP_INDEX = DedupIndex(DD_INDEX_FILE_PATH, max_entries=DD_CACHE_LEN, ttl=DD_CACHE_TTL)
@@ -0,0 +1,229 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import os
+import time
+import logging
+import sqlite3
+import threading
+from config import ACK_FILE_NAME, QUEUE_FSYNC
+from queue_store import ItemQueue, item_id_of
+
+# --- Basic Setup ---
+# The logger is configured in 'main.py' to ensure a consistent format.
+logger = logging.getLogger(__name__)
+
+# --- Path Definitions ---
+BOT_DIR = os.path.dirname(__file__)
+# Journal of per-item delivery acknowledgements for the items in the queue.
+ACK_FILE_PATH = os.path.join(BOT_DIR, ACK_FILE_NAME)
+
+
+class DeliveryLog:
+    """
+    Durable per-item acknowledgements.
+
+    Each processed item is recorded as
+    '{"itemId": ..., "status": ..., "at": ..., "chats": {chat_id: "sent" | "failed"}}'
+    in an append-only journal as soon as it has been handled, so a restart
+    resumes exactly after the last acknowledged item. The status is "sent"
+    if the item reached all of its chats, "partial" if it reached some,
+    "failed" if it reached none and "unrouted" if it had no chat. Failed
+    items are acknowledged as well, so they are archived rather than
+    retried forever.
+    """
+
+    def __init__(self, path, fsync=True):
+        # Acknowledgements are only ever read in full, so the journal keeps no ID sidecar.
+        self.journal = ItemQueue(path, fsync=fsync, record_ids=False)
+        self._done = {}  # item_id -> (status, acknowledged at, {chat_id: status} or None)
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._done)
+
+    def load(self):
+        """Load the acknowledgements left by a previous run. Only the first call reads the journal."""
+        with self._lock:
+            if self._loaded:
+                return
+            self._done.update(
+                # Records written before routing existed have no 'chats'.
+                (entry.get('itemId'), (entry.get('status'), entry.get('at'), entry.get('chats')))
+                for entry in self.journal.iter_items() if isinstance(entry, dict)
+            )
+            self._loaded = True
+        if self._done:
+            logger.info("Resuming delivery: %s queued items were already processed.", len(self._done))
+
+    def is_done(self, item):
+        return item_id_of(item) in self._done
+
+    def is_done_id(self, item_id):
+        return item_id in self._done
+
+    def outcome(self, item):
+        """Return the (status, acknowledged_at, chats) of a processed item, or (None, None, None)."""
+        return self._done.get(item_id_of(item), (None, None, None))
+
+    def ack(self, item_ids, deliveries):
+        """
+        Record the outcome of every item in 'item_ids', where 'deliveries' maps
+        each chat the items were sent to to the IDs delivered there.
+        Returns the number of items that reached all of their chats.
+        """
+        now = time.time()
+        delivered = {chat_id: set(ids) for chat_id, ids in deliveries.items()}
+        outcomes = {}
+        for item_id in item_ids:
+            # JSON object keys are strings, so the chat IDs are stored as strings in memory too.
+            chats = {str(chat_id): 'sent' if item_id in ids else 'failed' for chat_id, ids in delivered.items()}
+            sent = sum(1 for status in chats.values() if status == 'sent')
+            if not chats:
+                status = 'unrouted'
+            elif sent == len(chats):
+                status = 'sent'
+            else:
+                status = 'partial' if sent else 'failed'
+            outcomes[item_id] = (status, now, chats)
+        self.journal.extend(
+            {'itemId': item_id, 'status': status, 'at': at, 'chats': chats}
+            for item_id, (status, at, chats) in outcomes.items()
+        )
+        self._done.update(outcomes)
+        return sum(1 for status, _, _ in outcomes.values() if status == 'sent')
+
+    def reset(self):
+        """Forget all acknowledgements once their items have been archived."""
+        self.journal.clear()
+        self._done.clear()
+
+
+class Dispatcher:
+    """
+    Sends queued items and checkpoints every item as it is delivered.
+
+    'process(items, should_stop)' must yield (item_ids, deliveries) pairs as
+    items are handled, where 'deliveries' maps each chat an item was sent to
+    to the IDs delivered there; each pair is acknowledged immediately. Once
+    'should_stop()' returns True, 'process' must not start new items, but
+    still yields the items it already started. Only one drain runs
+    at a time, so the background loop and a manual /send never deliver the
+    same item twice. After a drain, acknowledged items are moved from the
+    queue journal into the archive, while items collected in the meantime
+    stay queued. 'file_ids_of(item)' may return the Telegram file_ids of a
+    sent item, which are recorded in the archive index.
+    """
+
+    def __init__(self, queue, delivery_log, process, archive_store, file_ids_of=None):
+        self.queue = queue
+        self.delivery_log = delivery_log
+        self.process = process
+        self.archive_store = archive_store
+        self.file_ids_of = file_ids_of
+        self.paused = threading.Event()
+        self._drain_lock = threading.Lock()
+        self._stop = threading.Event()
+        # Number of items left in the journal after the last archive.
+        self._kept = None
+
+    def pending_items(self, reverse=True):
+        """Stream the queued items that have not been processed yet."""
+        return (item for item in self.queue.iter_items(reverse=reverse) if not self.delivery_log.is_done(item))
+
+    def pending_count(self):
+        """Count the queued items that have not been processed yet, from the queue's item IDs alone."""
+        return sum(1 for item_id in self.queue.item_ids() if not self.delivery_log.is_done_id(item_id))
+
+    def drain(self, reverse=True, force=False):
+        """
+        Send every pending item. Returns a tuple of (processed_count, delivered_count),
+        where only items that reached all of their chats count as delivered.
+
+        Items are sent newest first by default, matching the order of /send.
+        Unless 'force' is set, the drain stops early when dispatching is paused.
+        It always stops early after stop() is called.
+        """
+        processed = delivered = 0
+
+        def should_stop():
+            return self._stop.is_set() or (self.paused.is_set() and not force)
+
+        with self._drain_lock:
+            try:
+                for item_ids, deliveries in self.process(self.pending_items(reverse), should_stop):
+                    delivered += self.delivery_log.ack(item_ids, deliveries)
+                    processed += len(item_ids)
+                if should_stop():
+                    logger.info("Dispatching paused or stopped, the remaining items stay queued.")
+            finally:
+                # Also archive items acknowledged by a previous run that stopped before archiving.
+                if len(self.delivery_log):
+                    self.archive()
+        return processed, delivered
+
+    def _describe(self, item):
+        """Index entry of an archived item: (status, sent_at, file_ids, chats)."""
+        status, at, chats = self.delivery_log.outcome(item)
+        file_ids = self.file_ids_of(item) if self.file_ids_of and status in ('sent', 'partial') else None
+        return status, at if at is not None else time.time(), file_ids, chats
+
+    def archive(self):
+        """
+        Move acknowledged items from the queue journal into the archive.
+        Returns the number of items still queued.
+        """
+        with self.archive_store.batch(self._describe) as batch:
+            archived, kept = self.queue.compact(self.delivery_log.is_done, batch)
+        # The acknowledgements are only needed while their items are still in the journal.
+        self.delivery_log.reset()
+        if archived:
+            logger.info("Archived %s processed items to '%s' (%s still queued).", archived, self.archive_store.root, kept)
+        self._kept = kept
+        try:
+            self.archive_store.maintain_if_due()
+        except (OSError, ValueError, sqlite3.Error) as e:
+            logger.error("Archive maintenance failed: %s", e)
+        return kept
+
+    def run_forever(self, poll_interval):
+        """
+        Watch the queue and drain it as items arrive, until stop() is called.
+        The journal size is checked every 'poll_interval' seconds, which costs a single stat call.
+        """
+        logger.info("Auto-dispatch started (polling every %ss).", poll_interval)
+        # Journal size after the last drain. None forces a drain, e.g. at startup
+        # to resume anything left over from the previous run.
+        last_size = None
+        while not self._stop.is_set():
+            if self.paused.is_set():
+                last_size = None
+            else:
+                size = self.queue.size()
+                if size and size != last_size:
+                    self._kept = None
+                    try:
+                        processed, delivered = self.drain()
+                        if processed:
+                            logger.info("Auto-dispatch delivered %s/%s items.", delivered, processed)
+                    except Exception as e:
+                        logger.error("Auto-dispatch failed, retrying in %ss: %s", poll_interval, e, exc_info=True)
+                    # An empty journal means everything was sent; any later append changes its size.
+                    # Items that arrived during the drain are still queued, so check again.
+                    last_size = 0 if self._kept == 0 else None
+            self._stop.wait(poll_interval)
+
+    def stop(self):
+        """Stop the background loop and any running drain, after the items already being sent."""
+        self._stop.set()
+
+    def wait_idle(self, timeout):
+        """Wait until no drain is running. Returns False if one is still running after 'timeout' seconds."""
+        if self._drain_lock.acquire(timeout=timeout):
+            self._drain_lock.release()
+            return True
+        return False
+
+
+# --- Shared Instance ---
+DELIVERY_LOG = DeliveryLog(ACK_FILE_PATH, fsync=QUEUE_FSYNC)
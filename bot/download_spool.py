@@ -0,0 +1,141 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import os
+import glob
+import time
+import logging
+import threading
+import metrics
+from config import DOWNLOAD_SPOOL_DIR_NAME, DOWNLOAD_SPOOL_MAX_BYTES, DOWNLOAD_SPOOL_STALE_AGE
+
+# --- Basic Setup ---
+# The logger is configured in 'main.py' to ensure a consistent format.
+logger = logging.getLogger(__name__)
+
+# --- Path Definitions ---
+BOT_DIR = os.path.dirname(__file__)
+# Downloaded videos waiting to be uploaded.
+DOWNLOAD_SPOOL_DIR = os.path.join(BOT_DIR, DOWNLOAD_SPOOL_DIR_NAME)
+# Older versions downloaded videos into the 'bot' directory itself.
+LEGACY_TEMP_PATTERN = os.path.join(BOT_DIR, 'temp_video_*')
+
+
+class Reservation:
+    """Space reserved in a DownloadSpool for one download."""
+
+    def __init__(self, spool, size):
+        self.spool = spool
+        self.size = size
+
+    def resize(self, size):
+        """Change the reserved size, e.g. to the actual size of the finished download. Never waits."""
+        self.spool._resize(self, max(0, size))
+
+    def release(self):
+        """Give the space back once the download's files were deleted. Can be called more than once."""
+        self.resize(0)
+
+
+class DownloadSpool:
+    """
+    The directory where downloaded videos wait to be uploaded, with a byte budget.
+
+    A download reserves its expected size with reserve() before it writes
+    to the spool and releases it once its files are deleted, so the videos
+    waiting in the spool never take up much more than 'max_bytes'. A video
+    larger than the whole budget is still downloaded, but only while
+    nothing else is reserved. Files older than 'stale_age' seconds were
+    left behind by a crash and are removed by clean_stale().
+    """
+
+    def __init__(self, root, max_bytes=None, stale_age=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.stale_age = stale_age
+        self.reserved = 0
+        self.peak = 0
+        self._changed = threading.Condition()
+
+    def path(self, name):
+        """Path of a new file in the spool."""
+        os.makedirs(self.root, exist_ok=True)
+        return os.path.join(self.root, name)
+
+    def reserve(self, size, blocking=True, force=False):
+        """
+        Reserve 'size' bytes and return the Reservation.
+
+        Waits until enough of the budget is free. With 'blocking' set to
+        False, None is returned instead of waiting. With 'force', the space
+        is reserved at once even if that exceeds the budget; this is for
+        downloads whose caller cannot wait, e.g. because it holds up the
+        items that would free the space.
+        """
+        size = max(0, size)
+        if self.max_bytes:
+            size = min(size, self.max_bytes)
+        with self._changed:
+            while size and not force and self.max_bytes and self.reserved and self.reserved + size > self.max_bytes:
+                if not blocking:
+                    return None
+                self._changed.wait()
+            self.reserved += size
+            self.peak = max(self.peak, self.reserved)
+        return Reservation(self, size)
+
+    def _resize(self, reservation, size):
+        with self._changed:
+            self.reserved += size - reservation.size
+            self.peak = max(self.peak, self.reserved)
+            reservation.size = size
+            self._changed.notify_all()
+
+    def usage(self):
+        """Bytes of the files currently in the spool."""
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return 0
+        total = 0
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(self.root, name))
+            except OSError:
+                continue  # Deleted by its upload in the meantime.
+        return total
+
+    def clean_stale(self, max_age=None):
+        """
+        Remove files a crashed run left in the spool, and videos older versions left in the 'bot' directory.
+        Only files older than 'max_age' seconds (default 'stale_age') are removed, so the downloads
+        of other processes are kept. Returns the number of removed files.
+        """
+        max_age = self.stale_age if max_age is None else max_age
+        try:
+            paths = [os.path.join(self.root, name) for name in os.listdir(self.root)]
+        except FileNotFoundError:
+            paths = []
+        paths.extend(glob.glob(LEGACY_TEMP_PATTERN))
+
+        cutoff = time.time() - (max_age or 0)
+        removed = freed = 0
+        for path in paths:
+            try:
+                if not os.path.isfile(path) or os.path.getmtime(path) > cutoff:
+                    continue
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError as e:
+                logger.warning("Could not remove stale download '%s': %s", path, e)
+                continue
+            removed += 1
+            freed += size
+        if removed:
+            logger.info("Removed %s stale downloads (%s bytes) left over by a previous run.", removed, freed)
+        return removed
+
+
+# --- Shared Instance ---
+DOWNLOAD_SPOOL = DownloadSpool(DOWNLOAD_SPOOL_DIR, max_bytes=DOWNLOAD_SPOOL_MAX_BYTES, stale_age=DOWNLOAD_SPOOL_STALE_AGE)
+metrics.SPOOL_BYTES.set_function(lambda: DOWNLOAD_SPOOL.reserved, state='reserved')
+metrics.SPOOL_BYTES.set_function(lambda: DOWNLOAD_SPOOL.max_bytes or 0, state='budget')
@@ -0,0 +1,181 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from config import FILE_ID_CACHE_FILE_NAME, FILE_ID_CACHE_LEN, FILE_ID_CACHE_TTL
+
+# --- Basic Setup ---
+# The logger is configured in 'main.py' to ensure a consistent format.
+logger = logging.getLogger(__name__)
+
+# --- Path Definitions ---
+BOT_DIR = os.path.dirname(__file__)
+# Append-only log that persists the cache between restarts.
+FILE_ID_CACHE_FILE_PATH = os.path.join(BOT_DIR, FILE_ID_CACHE_FILE_NAME)
+
+
+def item_key(item_id):
+    """
+    Cache key for a TikTok item ID, or None if the ID is unknown. Legacy URL items
+    have no ID; they must not share one key, or one item would be sent as another.
+    """
+    return f"item:{item_id}" if item_id else None
+
+def content_key(content_hash):
+    """Cache key for a media content hash, or None if the hash is unknown."""
+    return f"sha256:{content_hash}" if content_hash else None
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def hash_parts(parts):
+    """Return the SHA-256 hex digest of several byte strings, e.g. the images of an album."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(hashlib.sha256(part).digest())
+    return digest.hexdigest()
+
+
+class FileIdCache:
+    """
+    A persistent cache of Telegram file_ids for media that was already uploaded.
+
+    Entries are stored under a TikTok item key and a content hash key, so a
+    repeated item is sent without downloading it, and identical media under
+    a different item ID is sent without uploading it again. The least
+    recently used entries are evicted once 'max_entries' is reached, and
+    entries older than 'ttl' seconds (if set) are ignored. Changes are
+    appended to a log file that is compacted as it grows.
+    """
+
+    def __init__(self, path, max_entries, ttl=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (timestamp, kind, file_ids)
+        self._lock = threading.Lock()
+        self._file = None
+        self._log_lines = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    # --- Internal Helpers ---
+
+    def _is_expired(self, timestamp, now):
+        return self.ttl is not None and timestamp < now - self.ttl
+
+    def _evict(self, now):
+        while self._entries:
+            timestamp = next(iter(self._entries.values()))[0]
+            if len(self._entries) > self.max_entries or self._is_expired(timestamp, now):
+                self._entries.popitem(last=False)
+            else:
+                break
+
+    def _log(self, records):
+        """Append records to the log file. Must be called with the lock held."""
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records))
+        self._file.flush()
+        self._log_lines += len(records)
+        if self._log_lines > 2 * max(len(self._entries), 1024):
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the log so it only contains live entries. Must be called with the lock held."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for key, (timestamp, kind, file_ids) in self._entries.items():
+                f.write(json.dumps([timestamp, key, kind, file_ids], ensure_ascii=False) + '\n')
+        os.replace(temp_path, self.path)
+        self._log_lines = len(self._entries)
+
+    # --- Public API ---
+
+    def load(self):
+        """Load the cache from disk. Returns True if a cache file was found."""
+        with self._lock:
+            if not os.path.exists(self.path):
+                return False
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        timestamp, key, kind, file_ids = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._log_lines += 1
+                    if file_ids is None:
+                        # A tombstone written by invalidate().
+                        self._entries.pop(key, None)
+                    else:
+                        self._entries[key] = (timestamp, kind, file_ids)
+                        self._entries.move_to_end(key)
+            self._evict(time.time())
+            logger.info("Loaded %s entries from file_id cache '%s'.", len(self._entries), self.path)
+            return True
+
+    def get(self, key, kind):
+        """Return the cached file_ids for 'key' if they exist for media of the given kind."""
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] != kind or self._is_expired(entry[0], time.time()):
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def file_ids_of(self, item):
+        """Return the cached file_ids of a queued item, or None."""
+        if not isinstance(item, dict) or item.get('type') not in ('video', 'photo_video'):
+            return None
+        return self.get(item_key(item.get('itemId')), item['type'])
+
+    def put(self, keys, kind, file_ids):
+        """Store 'file_ids' under every key in 'keys'."""
+        now = time.time()
+        keys = [key for key in keys if key]
+        with self._lock:
+            for key in keys:
+                self._entries[key] = (now, kind, file_ids)
+                self._entries.move_to_end(key)
+            self._evict(now)
+            self._log([[now, key, kind, file_ids] for key in keys])
+
+    def invalidate(self, file_ids=None, keys=()):
+        """
+        Remove entries by key, or every entry that refers to one of 'file_ids'.
+        Returns the number of removed entries.
+        """
+        with self._lock:
+            stale = set(key for key in keys if key in self._entries)
+            if file_ids:
+                file_ids = set(file_ids)
+                stale.update(
+                    key for key, (_, _, cached_ids) in self._entries.items()
+                    if file_ids.intersection(cached_ids)
+                )
+            for key in stale:
+                del self._entries[key]
+            if stale:
+                self._log([[time.time(), key, None, None] for key in stale])
+            return len(stale)
+
+
+# --- Shared Instance ---
+FILE_ID_CACHE = FileIdCache(FILE_ID_CACHE_FILE_PATH, max_entries=FILE_ID_CACHE_LEN, ttl=FILE_ID_CACHE_TTL)
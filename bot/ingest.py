@@ -0,0 +1,183 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import json
+import zlib
+import logging
+import threading
+from concurrent.futures import Future
+# PLAYABLE_CODECS comes from 'config', not 'media', so the collector does not import 'requests'.
+from config import INGEST_MAX_BATCH_BYTES, INGEST_QUEUE_MAX_ITEMS, PLAYABLE_CODECS, SLIM_API_RESPONSES
+
+# --- Basic Setup ---
+# The logger is configured in 'main.py' to ensure a consistent format.
+logger = logging.getLogger(__name__)
+
+# --- API Response Schema ---
+# The parts of a captured 'item_detail' response the bot actually reads.
+# 'True' keeps a value as it is, a dict keeps only the listed keys. Lists
+# are reduced element by element with the same schema.
+API_RESPONSE_SCHEMA = {
+    'itemInfo': {
+        'itemStruct': {
+            'id': True,
+            'author': {'uniqueId': True},
+            # Used by the direct video download (media.select_video_urls).
+            'video': {
+                'bitrateInfo': {
+                    'Bitrate': True,
+                    'CodecType': True,
+                    'PlayAddr': {'DataSize': True, 'UrlList': True},
+                },
+                'playAddr': True,
+                'downloadAddr': True,
+            },
+            # Used to send photo albums (bot.download_photo_video_item).
+            'imagePost': {
+                'images': {
+                    'displayImage': {'url_list': True},
+                },
+            },
+        },
+    },
+}
+
+
+def slim(value, schema):
+    """Return a copy of 'value' that only contains the parts described by 'schema'."""
+    if schema is True:
+        return value
+    if isinstance(value, list):
+        return [slim(element, schema) for element in value]
+    if isinstance(value, dict):
+        return {key: slim(value[key], sub_schema) for key, sub_schema in schema.items() if key in value}
+    return value
+
+def slim_item(item):
+    """
+    Reduce the 'apiResponse' of a collected item to the fields in API_RESPONSE_SCHEMA.
+    Video variants in a codec Telegram cannot play inline are dropped as well.
+    """
+    if not SLIM_API_RESPONSES or not isinstance(item.get('apiResponse'), dict):
+        return item
+    api_response = slim(item['apiResponse'], API_RESPONSE_SCHEMA)
+    video = api_response.get('itemInfo', {}).get('itemStruct', {}).get('video')
+    if isinstance(video, dict) and isinstance(video.get('bitrateInfo'), list):
+        # The same rule media.select_video_urls applies when it picks a variant.
+        video['bitrateInfo'] = [
+            info for info in video['bitrateInfo']
+            if not (info.get('CodecType') or '').lower() or (info.get('CodecType') or '').lower().startswith(PLAYABLE_CODECS)
+        ]
+    return dict(item, apiResponse=api_response)
+
+
+# --- Batch Decoding ---
+
+def _decompress(body, max_bytes):
+    """Inflate a gzip or zlib body, refusing to expand it beyond 'max_bytes'."""
+    # wbits=47 detects the gzip or zlib header automatically.
+    decompressor = zlib.decompressobj(wbits=47)
+    try:
+        data = decompressor.decompress(body, max_bytes + 1)
+    except zlib.error as e:
+        raise ValueError(f"Invalid compressed body: {e}")
+    if len(data) > max_bytes or decompressor.unconsumed_tail:
+        raise ValueError(f"Decompressed batch exceeds {max_bytes} bytes.")
+    return data
+
+def decode_batch(body, content_type='', content_encoding='', max_bytes=INGEST_MAX_BATCH_BYTES):
+    """
+    Decode a batch of items sent to '/send_items'.
+
+    The body is either NDJSON (one item per line) or a JSON array, and may
+    be compressed with 'Content-Encoding: gzip' or 'deflate'. Raises
+    ValueError if the body cannot be decoded.
+    """
+    encoding = (content_encoding or '').strip().lower()
+    if encoding in ('gzip', 'x-gzip', 'deflate'):
+        body = _decompress(body, max_bytes)
+    elif encoding not in ('', 'identity'):
+        raise ValueError(f"Unsupported Content-Encoding: {content_encoding}")
+    if len(body) > max_bytes:
+        raise ValueError(f"Batch exceeds {max_bytes} bytes.")
+
+    try:
+        text = body.decode('utf-8')
+        if 'ndjson' in (content_type or '') or 'jsonl' in (content_type or ''):
+            return [json.loads(line) for line in text.splitlines() if line.strip()]
+        items = json.loads(text)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid batch body: {e}")
+    if not isinstance(items, list):
+        raise ValueError("Invalid batch body: expected a JSON array or NDJSON lines.")
+    return items
+
+
+# --- Ingest Queue ---
+
+class IngestQueueFull(Exception):
+    """Raised when the ingest queue cannot take more items; the client should retry later."""
+
+
+class IngestWriter:
+    """
+    A bounded in-memory queue of received batches, drained by a single writer thread.
+
+    Request handlers only enqueue their items and wait for the result, so
+    they never block each other on disk I/O. The writer takes every batch
+    that is waiting and passes them to 'store(batches)' together, so a
+    burst of requests costs one journal write. 'store' must return one
+    result per batch. Once 'max_items' items are waiting, submit() raises
+    IngestQueueFull instead of letting memory grow.
+    """
+
+    def __init__(self, store, max_items=INGEST_QUEUE_MAX_ITEMS):
+        self.store = store
+        self.max_items = max_items
+        self._batches = []  # (items, future) pairs waiting for the writer.
+        self._pending_items = 0
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def __len__(self):
+        return self._pending_items
+
+    def start(self):
+        """Start the writer thread, if it is not running yet."""
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="IngestWriter", daemon=True)
+                self._thread.start()
+
+    def submit(self, items):
+        """
+        Queue a batch of items. Returns a Future with the batch's result.
+        A batch is always accepted while the queue is empty, even if it is larger than 'max_items'.
+        """
+        future = Future()
+        with self._cond:
+            if self._pending_items and self._pending_items + len(items) > self.max_items:
+                raise IngestQueueFull(f"{self._pending_items} items are already waiting to be written.")
+            self._batches.append((items, future))
+            self._pending_items += len(items)
+            self._cond.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._batches:
+                    self._cond.wait()
+                batches, self._batches = self._batches, []
+
+            try:
+                results = self.store([items for items, _ in batches])
+            except Exception as e:
+                logger.error("Failed to write %s received batches: %s", len(batches), e, exc_info=True)
+                for _, future in batches:
+                    future.set_exception(e)
+            else:
+                for (_, future), result in zip(batches, results):
+                    future.set_result(result)
+            finally:
+                with self._cond:
+                    self._pending_items -= sum(len(items) for items, _ in batches)
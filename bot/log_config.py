@@ -1,49 +1,261 @@
 # Copyright NGGT.LightKeeper. All Rights Reserved.
 
-import logging
+import os
 import sys
+import json
+import queue
+import atexit
+import reprlib
+import logging
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from config import (
+    LOG_LEVEL, LOG_FORMAT, LOG_FILE_NAME, LOG_FILE_MAX_BYTES, LOG_FILE_BACKUP_COUNT,
+    LOG_QUEUE_SIZE, LOG_MAX_VALUE_LENGTH, LOG_SAMPLING, LOG_SAMPLING_INTERVAL,
+)
+
+# Define a standard format for all log messages.
+TEXT_FORMAT = "%(asctime)s - %(name)-12s - %(levelname)-8s - %(message)s"
+# The same with the process name, for supervisor mode.
+PROCESS_TEXT_FORMAT = "%(asctime)s - %(processName)-14s - %(name)-12s - %(levelname)-8s - %(message)s"
+
+# The listener that writes queued log records, once logging is set up.
+_listener = None
+
+
+# --- Payload Truncation ---
+
+class _Shortened:
+    """A pre-rendered, truncated stand-in for a large log argument."""
+
+    def __init__(self, text):
+        self.text = text
+
+    def __str__(self):
+        return self.text
+
+    __repr__ = __str__
+
 
-def setup_logging():
+def _make_repr(max_length):
+    # reprlib stops descending into nested containers early, so even an item with
+    # a huge 'apiResponse' is rendered in bounded time.
+    short_repr = reprlib.Repr()
+    short_repr.maxlevel = 3
+    short_repr.maxdict = 12
+    short_repr.maxlist = short_repr.maxtuple = short_repr.maxset = short_repr.maxfrozenset = 12
+    short_repr.maxstring = short_repr.maxother = max(20, max_length // 4)
+    return short_repr
+
+def shorten(value, max_length, short_repr=None):
+    """Return 'value', or a truncated stand-in if it is a container or a string longer than 'max_length'."""
+    if isinstance(value, str):
+        if len(value) <= max_length:
+            return value
+        return f"{value[:max_length]}... ({len(value)} characters)"
+    if isinstance(value, (bytes, bytearray)):
+        return _Shortened(f"<{len(value)} bytes>") if len(value) > max_length else value
+    if isinstance(value, (dict, list, tuple, set, frozenset)):
+        text = (short_repr or _make_repr(max_length)).repr(value)
+        if len(text) > max_length:
+            text = f"{text[:max_length]}..."
+        return _Shortened(text)
+    return value
+
+
+# --- Handlers and Formatters ---
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Puts log records on a bounded queue for a background listener to write.
+
+    The calling thread never formats or writes the message; it only shortens
+    large arguments. If the queue is full the record is dropped, and the
+    number of dropped records is logged once there is room again.
+    """
+
+    def __init__(self, log_queue, max_value_length):
+        super().__init__(log_queue)
+        self.max_value_length = max_value_length
+        self._repr = _make_repr(max_value_length)
+        self._dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record):
+        # Formatting is left to the listener thread. Only large arguments are replaced,
+        # so the queue does not keep whole items alive and formatting stays cheap.
+        # This is the only handler that sees the record, so it is changed in place.
+        if isinstance(record.args, tuple):
+            record.args = tuple(shorten(arg, self.max_value_length, self._repr) for arg in record.args)
+        elif isinstance(record.args, dict):
+            record.args = {key: shorten(arg, self.max_value_length, self._repr) for key, arg in record.args.items()}
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self._dropped += 1
+            return
+        if self._dropped:
+            with self._dropped_lock:
+                dropped, self._dropped = self._dropped, 0
+            if dropped:
+                try:
+                    self.queue.put_nowait(logging.makeLogRecord({
+                        'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                        'msg': "Dropped %s log messages because the log queue was full.", 'args': (dropped,),
+                    }))
+                except queue.Full:
+                    with self._dropped_lock:
+                        self._dropped += dropped
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Limits repeated messages per logger.
+
+    'limits' maps logger names to the number of records with the same
+    message template that may pass per 'interval' seconds. Child loggers
+    share their parent's limit. The number of suppressed records is attached
+    as 'suppressed' to the first record of the next interval.
+    """
+
+    def __init__(self, limits, interval):
+        super().__init__()
+        self.limits = dict(limits)
+        self.interval = interval
+        self._windows = {}  # (logger name, template) -> [start, passed, suppressed]
+        self._lock = threading.Lock()
+
+    def _limit(self, name):
+        while name:
+            if name in self.limits:
+                return self.limits[name]
+            name = name.rpartition('.')[0]
+        return None
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        limit = self._limit(record.name)
+        if limit is None:
+            return True
+        # Messages use %-style arguments, so the template identifies "the same" message.
+        key = (record.name, record.msg)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or record.created - window[0] >= self.interval:
+                if window and window[2]:
+                    record.suppressed = window[2]
+                self._windows[key] = [record.created, 1, 0]
+                return True
+            if window[1] >= limit:
+                window[2] += 1
+                return False
+            window[1] += 1
+            return True
+
+
+class TextFormatter(logging.Formatter):
+    """The standard text format, noting how many similar messages were suppressed by sampling."""
+
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            text += f" ({suppressed} similar messages suppressed)"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats every record as a single JSON object."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.processName,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except queue.Full:
+            pass  # The listener thread is a daemon and exits with the process.
+        _listener = None
+
+
+def setup_logging(level=LOG_LEVEL, log_format=LOG_FORMAT, log_file=LOG_FILE_NAME, show_process=False):
     """
     Set up a standardized logging configuration for the entire application.
 
-    This function configures the root logger to ensure all modules use a
-    consistent format. It also specifically handles the 'telebot' logger
-    to prevent it from creating duplicate handlers, which can lead to
-    redundant log messages.
+    Every logger, including 'telebot', hands its records to a bounded queue.
+    A background listener formats them (as text or JSON lines) and writes
+    them to stderr and, optionally, to a size-rotated log file, so logging
+    never blocks the collector or the bot. 'show_process' adds the process
+    name to text logs. Returns the listener.
     """
-    # Define a standard format for all log messages.
-    log_format = "%(asctime)s - %(name)-12s - %(levelname)-8s - %(message)s"
-    formatter = logging.Formatter(log_format)
+    global _listener
+    # Calling this again replaces the previous configuration.
+    _stop_listener()
 
+    if log_format == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = TextFormatter(PROCESS_TEXT_FORMAT if show_process else TEXT_FORMAT)
     # Create a handler to output log messages to the console (stderr).
-    console_handler = logging.StreamHandler(sys.stderr)
-    console_handler.setLevel(logging.INFO)  # Set the minimum level of messages to handle.
-    console_handler.setFormatter(formatter)
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if log_file:
+        # File names are relative to the bot directory, like the queue and archive.
+        log_path = os.path.join(os.path.dirname(__file__), log_file)
+        handlers.append(RotatingFileHandler(
+            log_path, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUP_COUNT, encoding='utf-8', delay=True
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue, LOG_MAX_VALUE_LENGTH)
+    # Sampling happens before a record is queued, so suppressed messages cost almost nothing.
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLING, LOG_SAMPLING_INTERVAL))
 
     # Get the root logger and configure it.
     # All other loggers in the application will inherit this configuration.
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
-    
+    root_logger.setLevel(level)
     # Clear any existing handlers to avoid conflicts or multiple outputs.
-    if root_logger.hasHandlers():
-        root_logger.handlers.clear()
-    
-    # Add our configured handler to the root logger.
-    root_logger.addHandler(console_handler)
+    root_logger.handlers.clear()
+    root_logger.addHandler(queue_handler)
 
     # --- Special Handling for Telebot Logger ---
-    # Get the logger used by the 'telebot' library.
+    # Clear any default handlers that telebot might add, and use the shared queue instead.
+    # Propagation is disabled so telebot messages are not logged twice.
     telebot_logger = logging.getLogger('telebot')
-    telebot_logger.setLevel(logging.INFO)
-    
-    # Clear any default handlers that telebot might add.
+    telebot_logger.setLevel(level)
     telebot_logger.handlers.clear()
-    
-    # Add our shared handler to the telebot logger.
-    telebot_logger.addHandler(console_handler)
-    
-    # Prevent telebot log messages from being passed up to the root logger.
-    # This is crucial to avoid duplicate log entries.
+    telebot_logger.addHandler(queue_handler)
     telebot_logger.propagate = False
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+# Write the queued messages before the interpreter exits.
+atexit.register(_stop_listener)
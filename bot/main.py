@@ -1,11 +1,11 @@
 # Copyright NGGT.LightKeeper. All Rights Reserved.
 
 import sys
+import argparse
 import threading
 import time
 import logging
-import bot
-import collector
+from config import AUTO_DISPATCH, COLLECTOR_SERVER, BOT_MODE
 from log_config import setup_logging
 
 # --- Application Entry Point ---
@@ -15,44 +15,105 @@ from log_config import setup_logging
 setup_logging()
 logger = logging.getLogger(__name__)
 
-def run_bot():
+def run_bot(mode):
     """Wrapper function to run the Telegram bot's main loop in a dedicated thread."""
     logger.info("Starting Telegram bot thread.")
     try:
-        bot.main()
+        import bot
+        bot.main(mode)
     except Exception as e:
         # Log any critical errors that cause the bot thread to crash.
-        logger.critical(f"Fatal error in Telegram bot thread: {e}", exc_info=True)
+        logger.critical("Fatal error in Telegram bot thread: %s", e, exc_info=True)
 
-def run_collector():
-    """Wrapper function to run the Flask collector server in a dedicated thread."""
-    logger.info("Starting Flask collector thread.")
+def run_collector(server):
+    """Wrapper function to run the collector server in a dedicated thread."""
+    logger.info("Starting collector thread (%s server).", server)
     try:
-        collector.main()
+        import collector
+        collector.main(server)
     except Exception as e:
         # Log any critical errors that cause the collector thread to crash.
-        logger.critical(f"Fatal error in Flask collector thread: {e}", exc_info=True)
+        logger.critical("Fatal error in collector thread: %s", e, exc_info=True)
+
+def run_dispatcher():
+    """Wrapper function to run the automatic dispatcher in a dedicated thread."""
+    logger.info("Starting auto-dispatch thread.")
+    try:
+        import bot
+        bot.run_auto_dispatch()
+    except Exception as e:
+        # Log any critical errors that cause the dispatcher thread to crash.
+        logger.critical("Fatal error in auto-dispatch thread: %s", e, exc_info=True)
+
+def parse_args(argv):
+    """Parse the command line. Returns None if the 'runserver' command is missing."""
+    parser = argparse.ArgumentParser(prog="main.py")
+    parser.add_argument('command', nargs='?', choices=['runserver'])
+    parser.add_argument(
+        '--server', choices=['waitress', 'flask'], default=COLLECTOR_SERVER,
+        help="Server that runs the collector (default: %(default)s)."
+    )
+    parser.add_argument(
+        '--bot-mode', choices=['polling', 'webhook'], default=BOT_MODE,
+        help="How the bot receives Telegram updates (default: %(default)s)."
+    )
+    parser.add_argument(
+        '--workers', type=int, default=0,
+        help="Run the collector, the bot and this many media download workers in separate processes "
+             "(default: %(default)s, run everything in one process)."
+    )
+    args = parser.parse_args(argv)
+    if args.workers < 0:
+        parser.error("--workers must be 0 or more.")
+    return args if args.command else None
 
 if __name__ == "__main__":
     # This script requires a 'runserver' argument to start.
     # This prevents it from running accidentally.
-    if len(sys.argv) > 1 and sys.argv[1] == 'runserver':
+    args = parse_args(sys.argv[1:])
+    if args:
         logger.info("Initializing application...")
 
+        if args.workers:
+            # --- Supervisor Mode ---
+            # Every component runs in its own process and is restarted if it crashes.
+            setup_logging(show_process=True)
+            logger.info("Starting in supervisor mode with %s media workers.", args.workers)
+            from supervisor import create_supervisor
+            create_supervisor(args.workers, args.server, args.bot_mode).run()
+            sys.exit(0)
+
+        # The collector is imported before the bot, whose dependencies (telebot, requests)
+        # would otherwise compete with it for the CPU and delay the first accepted item.
+        import collector
+
+        # In webhook mode, Telegram updates are received by the collector server.
+        # The route must exist before the server starts, so the bot is imported first.
+        if args.bot_mode == 'webhook':
+            import bot
+            from webhook import create_webhook_blueprint
+            collector.app.register_blueprint(create_webhook_blueprint(bot.bot, bot.WEBHOOK_SECRET))
+
         # --- Threading Setup ---
-        # Create a thread for the Telegram bot.
+        # Create a thread for the URL collector server.
         # It's a daemon thread, so it will exit when the main thread exits.
-        bot_thread = threading.Thread(target=run_bot, name="BotThread", daemon=True)
+        collector_thread = threading.Thread(target=run_collector, args=(args.server,), name="CollectorThread", daemon=True)
 
-        # Create a thread for the Flask URL collector.
-        collector_thread = threading.Thread(target=run_collector, name="CollectorThread", daemon=True)
+        # Create a thread for the Telegram bot.
+        bot_thread = threading.Thread(target=run_bot, args=(args.bot_mode,), name="BotThread", daemon=True)
 
-        # Start both threads. They will run in parallel.
-        bot_thread.start()
+        # Start both threads. They will run in parallel. The collector starts first, so it
+        # accepts items from the extension while the bot still starts up.
         collector_thread.start()
+        bot_thread.start()
 
         logger.info("Bot and collector threads have been started.")
 
+        # Optionally send new items as they arrive, instead of waiting for /send.
+        if AUTO_DISPATCH:
+            dispatcher_thread = threading.Thread(target=run_dispatcher, name="DispatcherThread", daemon=True)
+            dispatcher_thread.start()
+
         # --- Main Loop ---
         # Keep the main thread alive. This is necessary because the other threads
         # are daemons. If the main thread were to exit, the daemon threads would be
@@ -67,5 +128,5 @@ if __name__ == "__main__":
             # The daemon threads will be terminated automatically when the main program exits.
     else:
         # If the 'runserver' argument is missing, show usage instructions.
-        print("Usage: python main.py runserver")
+        print("Usage: python main.py runserver [--server {waitress,flask}] [--bot-mode {polling,webhook}] [--workers N]")
         sys.exit(1)
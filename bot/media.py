@@ -0,0 +1,249 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import time
+import logging
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+from requests.adapters import HTTPAdapter
+from config import (
+    HTTP_POOL_SIZE, TELEGRAM_MAX_UPLOAD_BYTES, PLAYABLE_CODECS,
+    ALBUM_DOWNLOAD_WORKERS, ALBUM_MAX_IMAGE_BYTES, ALBUM_MAX_BYTES,
+)
+
+# --- Basic Setup ---
+# The logger is configured in 'main.py' to ensure a consistent format.
+logger = logging.getLogger(__name__)
+
+# Headers the TikTok CDN expects from a browser playing the video.
+DOWNLOAD_HEADERS = {
+    'User-Agent': (
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+        '(KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36'
+    ),
+    'Referer': 'https://www.tiktok.com/',
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+class DirectDownloadError(Exception):
+    """Raised when none of the captured media URLs could be downloaded."""
+
+
+def create_session():
+    """Create a requests session with a connection pool shared by all downloads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(DOWNLOAD_HEADERS)
+    return session
+
+
+# --- Shared Instance ---
+# Reusing one session keeps TCP/TLS connections to the CDN alive between downloads.
+HTTP_SESSION = create_session()
+
+
+# --- Video URL Selection ---
+
+def _url_expired(url, now):
+    """Return True if a signed CDN URL carries an expiry time that has already passed."""
+    query = parse_qs(urlparse(url).query)
+    for key in ('x-expires', 'expire'):
+        value = query.get(key, [None])[0]
+        if value and value.isdigit():
+            return int(value) <= now
+    return False
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _video_info(api_response):
+    return (api_response or {}).get('itemInfo', {}).get('itemStruct', {}).get('video', {})
+
+def expected_video_size(api_response, max_bytes=TELEGRAM_MAX_UPLOAD_BYTES):
+    """
+    The largest size a direct download of the video may have: the size of the biggest
+    'bitrateInfo' variant under 'max_bytes'. Returns None if no variant reports its size.
+    """
+    sizes = [
+        _to_int((info.get('PlayAddr') or {}).get('DataSize'))
+        for info in _video_info(api_response).get('bitrateInfo') or []
+    ]
+    sizes = [size for size in sizes if size is not None and size <= max_bytes]
+    return max(sizes) if sizes else None
+
+def select_video_urls(api_response, max_bytes=TELEGRAM_MAX_UPLOAD_BYTES):
+    """
+    Pick download URLs for a video from a captured 'item_detail' API response.
+
+    Variants from 'bitrateInfo' that use a playable codec and fit under
+    'max_bytes' come first, highest bitrate first. 'playAddr' and
+    'downloadAddr' are used as fallbacks. URLs that have already expired
+    are left out.
+    """
+    video = _video_info(api_response)
+    now = time.time()
+    variants = []
+    for info in video.get('bitrateInfo') or []:
+        play_addr = info.get('PlayAddr') or {}
+        size = _to_int(play_addr.get('DataSize'))
+        codec = (info.get('CodecType') or '').lower()
+        if size is not None and size > max_bytes:
+            continue
+        if codec and not codec.startswith(PLAYABLE_CODECS):
+            continue
+        variants.append((_to_int(info.get('Bitrate')) or 0, play_addr.get('UrlList') or []))
+
+    urls = []
+    for _, url_list in sorted(variants, key=lambda variant: variant[0], reverse=True):
+        urls.extend(url_list)
+    urls.extend(url for url in (video.get('playAddr'), video.get('downloadAddr')) if url)
+
+    # Drop duplicates and expired URLs, keeping the order.
+    seen = set()
+    return [url for url in urls if not (url in seen or seen.add(url)) and not _url_expired(url, now)]
+
+
+# --- Downloading ---
+
+def download_to_file(url, path, max_bytes=TELEGRAM_MAX_UPLOAD_BYTES, session=HTTP_SESSION, timeout=30):
+    """
+    Stream 'url' into 'path'. Returns the number of bytes written.
+    Raises DirectDownloadError if the response is rejected or larger than 'max_bytes'.
+    """
+    with session.get(url, stream=True, timeout=timeout) as response:
+        if response.status_code != 200:
+            raise DirectDownloadError(f"HTTP {response.status_code}")
+        length = _to_int(response.headers.get('Content-Length'))
+        if length is not None and length > max_bytes:
+            raise DirectDownloadError(f"File is too large ({length} bytes)")
+
+        written = 0
+        with open(path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                written += len(chunk)
+                if written > max_bytes:
+                    raise DirectDownloadError(f"File is larger than {max_bytes} bytes")
+                f.write(chunk)
+    if not written:
+        raise DirectDownloadError("Empty response")
+    return written
+
+def download_video_direct(api_response, path, max_bytes=TELEGRAM_MAX_UPLOAD_BYTES):
+    """
+    Download a video straight from the URLs captured in its API response.
+
+    Each candidate URL is tried in turn. Raises DirectDownloadError if
+    there are no usable URLs or all of them fail, e.g. because they have
+    expired or the CDN rejected them.
+    """
+    urls = select_video_urls(api_response, max_bytes)
+    if not urls:
+        raise DirectDownloadError("No usable video URLs in the API response")
+
+    errors = []
+    for url in urls:
+        try:
+            return download_to_file(url, path, max_bytes)
+        except (DirectDownloadError, requests.RequestException) as e:
+            errors.append(str(e))
+    raise DirectDownloadError(f"All {len(urls)} video URLs failed: {'; '.join(errors)}")
+
+
+def open_video_direct(api_response, max_bytes=TELEGRAM_MAX_UPLOAD_BYTES, session=HTTP_SESSION, timeout=30):
+    """
+    Open a video from the URLs captured in its API response for streaming.
+
+    The first URL that answers with an uncompressed body of known size
+    under 'max_bytes' is used. Returns (response, size); the caller must
+    close the response. Raises DirectDownloadError if no URL qualifies.
+    """
+    urls = select_video_urls(api_response, max_bytes)
+    if not urls:
+        raise DirectDownloadError("No usable video URLs in the API response")
+
+    errors = []
+    for url in urls:
+        try:
+            response = session.get(url, stream=True, timeout=timeout)
+        except requests.RequestException as e:
+            errors.append(str(e))
+            continue
+        size = _to_int(response.headers.get('Content-Length'))
+        encoding = response.headers.get('Content-Encoding', 'identity')
+        if response.status_code == 200 and size and size <= max_bytes and encoding == 'identity':
+            return response, size
+        response.close()
+        errors.append(f"HTTP {response.status_code}, {size} bytes, {encoding} encoding")
+    raise DirectDownloadError(f"None of the {len(urls)} video URLs can be streamed: {'; '.join(errors)}")
+
+
+# --- Album Images ---
+
+class _AlbumBudget:
+    """Tracks the bytes buffered in memory for one album and its peak."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, size):
+        with self._lock:
+            if self.used + size > self.max_bytes:
+                raise DirectDownloadError(f"Album exceeds the memory budget of {self.max_bytes} bytes")
+            self.used += size
+            self.peak = max(self.peak, self.used)
+
+    def release(self, size):
+        with self._lock:
+            self.used -= size
+
+
+def download_to_memory(url, budget, max_bytes=ALBUM_MAX_IMAGE_BYTES, session=HTTP_SESSION, timeout=30):
+    """Download 'url' into memory, charging every chunk against the album budget."""
+    buffer = bytearray()
+    try:
+        with session.get(url, stream=True, timeout=timeout) as response:
+            if response.status_code != 200:
+                raise DirectDownloadError(f"HTTP {response.status_code}")
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if len(buffer) + len(chunk) > max_bytes:
+                    raise DirectDownloadError(f"Image is larger than {max_bytes} bytes")
+                budget.reserve(len(chunk))
+                buffer += chunk
+    except BaseException:
+        budget.release(len(buffer))
+        raise
+    return bytes(buffer)
+
+
+def download_album(urls, max_bytes=ALBUM_MAX_BYTES, workers=ALBUM_DOWNLOAD_WORKERS):
+    """
+    Download album images in parallel over the shared connection pool.
+
+    Images are kept in memory and never written to disk. Returns a tuple
+    of (images, peak_bytes), where 'images' holds the image bytes in album
+    order, or None for images that could not be downloaded.
+    """
+    budget = _AlbumBudget(max_bytes)
+
+    def fetch(index_url):
+        index, url = index_url
+        try:
+            return download_to_memory(url, budget)
+        except (DirectDownloadError, requests.RequestException) as e:
+            logger.error("Failed to download image %s from %s: %s", index + 1, url, e)
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(urls))), thread_name_prefix="Album") as executor:
+        images = list(executor.map(fetch, enumerate(urls)))
+    return images, budget.peak
@@ -0,0 +1,276 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from config import MEDIA_SPOOL_DIR_NAME, MEDIA_WORKER_POLL_INTERVAL, MEDIA_JOB_TIMEOUT
+from pipeline import PreparedItem
+
+# --- Basic Setup ---
+# The logger is configured in 'main.py' to ensure a consistent format.
+logger = logging.getLogger(__name__)
+
+# --- Path Definitions ---
+BOT_DIR = os.path.dirname(__file__)
+# Job spool shared by the bot and the media worker processes.
+MEDIA_SPOOL_DIR = os.path.join(BOT_DIR, MEDIA_SPOOL_DIR_NAME)
+
+
+def discard_result(result):
+    """Delete the files of a download result nobody is waiting for."""
+    for path in result.get('paths') or []:
+        if os.path.exists(path):
+            os.remove(path)
+    if result.get('payloadDir'):
+        shutil.rmtree(result['payloadDir'], ignore_errors=True)
+
+
+class MediaJobSpool:
+    """
+    A persistent job queue in a directory, shared by the bot and the media workers.
+
+        pending/   Jobs waiting for a worker: '<created_ns>-<job_id>.json'.
+        claimed/   Jobs being downloaded: '<worker>--<created_ns>-<job_id>.json'.
+        done/      Results waiting for the bot: '<job_id>.json'.
+        files/     Downloaded album images, one directory per job.
+
+    A worker claims a job by renaming it into 'claimed/'. Renames are atomic,
+    so every job is downloaded by exactly one worker, and a job a worker could
+    not finish is handed back by renaming it into 'pending/' again.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.pending_dir = os.path.join(root, 'pending')
+        self.claimed_dir = os.path.join(root, 'claimed')
+        self.done_dir = os.path.join(root, 'done')
+        self.files_dir = os.path.join(root, 'files')
+        self.temp_dir = os.path.join(root, 'tmp')
+
+    def ensure_dirs(self):
+        for directory in (self.pending_dir, self.claimed_dir, self.done_dir, self.files_dir, self.temp_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    def _write_json(self, directory, name, data):
+        """Write a file atomically, so readers never see a partial job or result."""
+        temp_path = os.path.join(self.temp_dir, f"{uuid.uuid4().hex}.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, os.path.join(directory, name))
+
+    @staticmethod
+    def _read_json(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    # --- Bot Side ---
+
+    def submit(self, item, job_id=None):
+        """Queue a download job for 'item'. Returns (job_id, job_name)."""
+        job_id = job_id or uuid.uuid4().hex
+        job_name = f"{time.time_ns()}-{job_id}.json"
+        self._write_json(self.pending_dir, job_name, {'jobId': job_id, 'item': item})
+        return job_id, job_name
+
+    def cancel(self, job_name):
+        """Remove a job that no worker has claimed yet. Returns False if it was already claimed."""
+        try:
+            os.remove(os.path.join(self.pending_dir, job_name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def results(self):
+        """Yield (job_id, result) for every finished job, removing the result files."""
+        for name in os.listdir(self.done_dir):
+            path = os.path.join(self.done_dir, name)
+            try:
+                result = self._read_json(path)
+            except (OSError, ValueError) as e:
+                logger.warning("Could not read media job result '%s': %s", path, e)
+                continue
+            os.remove(path)
+            yield name[:-len('.json')], result
+
+    def purge(self):
+        """Remove pending jobs and unclaimed results, e.g. those of a bot process that crashed."""
+        removed = 0
+        for name in os.listdir(self.pending_dir):
+            os.remove(os.path.join(self.pending_dir, name))
+            removed += 1
+        for _, result in self.results():
+            discard_result(result)
+            removed += 1
+        return removed
+
+    # --- Worker Side ---
+
+    def claim(self, worker):
+        """Claim the oldest pending job. Returns (job_name, job) or None if there is none."""
+        for name in sorted(os.listdir(self.pending_dir)):
+            claimed_name = f"{worker}--{name}"
+            claimed_path = os.path.join(self.claimed_dir, claimed_name)
+            try:
+                os.rename(os.path.join(self.pending_dir, name), claimed_path)
+            except FileNotFoundError:
+                continue  # Another worker was faster, or the bot cancelled the job.
+            try:
+                return claimed_name, self._read_json(claimed_path)
+            except (OSError, ValueError) as e:
+                logger.error("Dropping unreadable media job '%s': %s", claimed_path, e)
+                os.remove(claimed_path)
+        return None
+
+    def complete(self, claimed_name, job_id, result):
+        """Publish the result of a claimed job."""
+        self._write_json(self.done_dir, f"{job_id}.json", result)
+        os.remove(os.path.join(self.claimed_dir, claimed_name))
+
+    def release(self, worker):
+        """Hand the jobs claimed by 'worker' back to the pending queue. Returns their number."""
+        prefix = f"{worker}--"
+        released = 0
+        for name in os.listdir(self.claimed_dir):
+            if name.startswith(prefix):
+                os.replace(os.path.join(self.claimed_dir, name), os.path.join(self.pending_dir, name[len(prefix):]))
+                released += 1
+        return released
+
+
+# --- Worker Process ---
+
+def _download(bot, spool, job_id, item):
+    """Download a media item. Returns the result to publish in the spool."""
+    try:
+        if item.get('type') == 'video':
+            # The bot checks the file_id cache before it submits a job, so the cache is skipped here.
+            prepared = bot.download_video_item(item, use_cache=False)
+        else:
+            prepared = bot.download_photo_video_item(item, use_cache=False)
+    except Exception as e:
+        logger.error("Media job %s for item %s failed: %s", job_id, item.get('itemId'), e)
+        return {'error': f"{type(e).__name__}: {e}"}
+
+    result = {'paths': prepared.paths, 'contentHash': prepared.content_hash, 'payloadDir': None, 'payloadCount': None}
+    if isinstance(prepared.payload, list):
+        # Album images are kept in memory by the downloader; pass them on as files.
+        payload_dir = os.path.join(spool.files_dir, job_id)
+        os.makedirs(payload_dir, exist_ok=True)
+        for index, image in enumerate(prepared.payload):
+            with open(os.path.join(payload_dir, f"{index}.jpg"), 'wb') as f:
+                f.write(image)
+        result['payloadDir'], result['payloadCount'] = payload_dir, len(prepared.payload)
+    return result
+
+def run_worker(name, poll_interval=MEDIA_WORKER_POLL_INTERVAL):
+    """
+    Download media jobs from the spool until the process is stopped.
+
+    A job that is interrupted (e.g. by SIGTERM, which the supervisor turns
+    into SystemExit) is handed back so another worker can take it over.
+    """
+    spool = MediaJobSpool(MEDIA_SPOOL_DIR)
+    spool.ensure_dirs()
+    # Jobs this worker claimed before it crashed are downloaded again.
+    released = spool.release(name)
+    if released:
+        logger.info("Handed back %s media jobs left over by the previous run of %s.", released, name)
+
+    import bot  # The download code, its caches and the yt-dlp pool; only needed once the worker runs.
+    logger.info("Media worker %s is ready.", name)
+    while True:
+        job = spool.claim(name)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        claimed_name, data = job
+        try:
+            result = _download(bot, spool, data['jobId'], data['item'])
+        except BaseException:
+            spool.release(name)
+            logger.info("Media worker %s stopped, its job was handed back.", name)
+            raise
+        spool.complete(claimed_name, data['jobId'], result)
+
+
+# --- Bot Process ---
+
+class MediaWorkerClient:
+    """
+    Hands media downloads to the worker processes and waits for the results.
+
+    'prepare(item)' blocks like a local download and returns a PreparedItem,
+    so it can be used by the send scheduler and the pipeline unchanged. A
+    single thread collects the results for all waiting callers.
+    """
+
+    def __init__(self, spool, poll_interval=MEDIA_WORKER_POLL_INTERVAL, timeout=MEDIA_JOB_TIMEOUT):
+        self.spool = spool
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self._futures = {}  # job_id -> Future
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        self.spool.ensure_dirs()
+        purged = self.spool.purge()
+        if purged:
+            logger.info("Removed %s media jobs and results left over by the previous run.", purged)
+        self._thread = threading.Thread(target=self._collect_results, name="MediaResults", daemon=True)
+        self._thread.start()
+        return self
+
+    def _collect_results(self):
+        while True:
+            try:
+                for job_id, result in self.spool.results():
+                    with self._lock:
+                        future = self._futures.pop(job_id, None)
+                    if future is None:
+                        # The caller gave up on this job.
+                        discard_result(result)
+                    else:
+                        future.set_result(result)
+            except OSError as e:
+                logger.error("Could not collect media job results: %s", e)
+            time.sleep(self.poll_interval)
+
+    def prepare(self, item):
+        """Download 'item' in a worker process. Returns a PreparedItem."""
+        future = Future()
+        # The future is registered before the job is published, so a fast worker's result is not discarded.
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._futures[job_id] = future
+        try:
+            _, job_name = self.spool.submit(item, job_id)
+        except Exception:
+            with self._lock:
+                self._futures.pop(job_id, None)
+            raise
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self._futures.pop(job_id, None)
+            self.spool.cancel(job_name)
+            return PreparedItem(error=TimeoutError(f"No media worker finished the download within {self.timeout}s."))
+
+        if result.get('error'):
+            return PreparedItem(error=RuntimeError(result['error']))
+        payload = None
+        if result.get('payloadDir'):
+            payload = []
+            for index in range(result['payloadCount']):
+                with open(os.path.join(result['payloadDir'], f"{index}.jpg"), 'rb') as f:
+                    payload.append(f.read())
+            shutil.rmtree(result['payloadDir'], ignore_errors=True)
+        elif result.get('payloadCount') == 0:
+            payload = []
+        return PreparedItem(paths=result.get('paths'), payload=payload, content_hash=result.get('contentHash'))
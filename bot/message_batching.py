@@ -0,0 +1,126 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import re
+
+# Maximum length of a Telegram text message, counted after entity parsing.
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Separator placed between chat lines merged into one Telegram message.
+LINE_SEPARATOR = "\n"
+
+# Characters that must be escaped everywhere in Telegram's MarkdownV2.
+_MARKDOWN_V2_SPECIAL = re.compile(r'([_*\[\]()~`>#+\-=|{}.!\\])')
+
+
+def escape_markdown_v2(text):
+    """Escape text for Telegram's MarkdownV2 parse mode."""
+    return _MARKDOWN_V2_SPECIAL.sub(r'\\\1', text)
+
+def visible_length(text):
+    """Length of text as Telegram counts it (UTF-16 code units)."""
+    return len(text.encode('utf-16-le')) // 2
+
+def is_valid_message(item):
+    return all([item.get('author'), item.get('text'), item.get('itemId')])
+
+def coalesce_messages(items, limit=TELEGRAM_MESSAGE_LIMIT, key=None):
+    """
+    Merge runs of consecutive 'message' items into 'message_batch' items.
+
+    A batch is closed when the next item is not a message or when adding the
+    next line would push the batch over 'limit' characters, so every batch
+    fits into a single Telegram message (unless one line is longer than the
+    limit on its own). If 'key' is given, only messages with the same
+    'key(item)' are merged, e.g. messages that go to the same chats. Other
+    items pass through unchanged, in order.
+    """
+    batch = []
+    batch_length = 0
+    batch_key = None
+
+    def flush():
+        nonlocal batch, batch_length
+        finished = {'type': 'message_batch', 'items': batch}
+        batch, batch_length = [], 0
+        return finished
+
+    for item in items:
+        if not isinstance(item, dict) or item.get('type') != 'message':
+            if batch:
+                yield flush()
+            yield item
+            continue
+
+        line_length = visible_length(f"{item.get('author')}: {item.get('text')}")
+        item_key = key(item) if key else None
+        if batch and (batch_length + len(LINE_SEPARATOR) + line_length > limit or item_key != batch_key):
+            yield flush()
+        batch_key = item_key
+        batch_length += (len(LINE_SEPARATOR) if batch else 0) + line_length
+        batch.append(item)
+
+    if batch:
+        yield flush()
+
+def _split_text(text, limit):
+    """Split text into pieces of at most 'limit' characters, preferring line breaks and spaces."""
+    pieces = []
+    while visible_length(text) > limit:
+        cut = limit
+        # Count in UTF-16 units: step back until the prefix fits.
+        while visible_length(text[:cut]) > limit:
+            cut -= 1
+        boundary = max(text.rfind('\n', 0, cut), text.rfind(' ', 0, cut))
+        if boundary > cut // 2:
+            cut = boundary
+        pieces.append(text[:cut])
+        text = text[cut:].lstrip()
+    if text:
+        pieces.append(text)
+    return pieces
+
+def pack_messages(items, limit=TELEGRAM_MESSAGE_LIMIT):
+    """
+    Format message items as '*author:* text' lines and pack them into Telegram messages.
+
+    Returns a list of (markdown_text, plain_text, item_ids, completed_ids)
+    tuples. 'item_ids' lists every item with text in that message and
+    'completed_ids' the items whose text ends in it, so delivery can be
+    tracked for every item. Lines longer than 'limit' are split across
+    several messages.
+    """
+    messages = []
+    parts_markdown, parts_plain, contained, completed = [], [], [], []
+    length = 0
+
+    def flush():
+        nonlocal parts_markdown, parts_plain, contained, completed, length
+        if parts_markdown:
+            messages.append((
+                LINE_SEPARATOR.join(parts_markdown), LINE_SEPARATOR.join(parts_plain), contained, completed
+            ))
+        parts_markdown, parts_plain, contained, completed, length = [], [], [], [], 0
+
+    for item in items:
+        author, text = item['author'], item['text']
+        prefix = f"{author}: "
+        pieces = _split_text(text, max(1, limit - visible_length(prefix)))
+        for index, piece in enumerate(pieces):
+            if index == 0:
+                markdown = f"*{escape_markdown_v2(author)}:* {escape_markdown_v2(piece)}"
+                plain = prefix + piece
+            else:
+                markdown = escape_markdown_v2(piece)
+                plain = piece
+            piece_length = visible_length(plain)
+            if parts_markdown and length + len(LINE_SEPARATOR) + piece_length > limit:
+                flush()
+            length += (len(LINE_SEPARATOR) if parts_markdown else 0) + piece_length
+            parts_markdown.append(markdown)
+            parts_plain.append(plain)
+            if not contained or contained[-1] != item['itemId']:
+                contained.append(item['itemId'])
+        completed.append(item['itemId'])
+
+    flush()
+    return messages
@@ -0,0 +1,373 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import os
+import json
+import time
+import atexit
+import bisect
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+# --- Basic Setup ---
+# The logger is configured in 'main.py' to ensure a consistent format.
+logger = logging.getLogger(__name__)
+
+# Default histogram buckets (in seconds), from fast disk writes to slow uploads.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base class for metrics with an optional, fixed set of label names."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"Metric '{self.name}' expects labels {self.labelnames}, got {tuple(labels)}.")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @staticmethod
+    def _add(total, value):
+        return (total or 0) + value
+
+    def render(self, extra=()):
+        """Render the metric. 'extra' are values of the same metric from other processes, added to the local ones."""
+        values = self._collect()
+        for other in extra:
+            for key, value in other.items():
+                values[key] = self._add(values.get(key), value)
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples(values))
+        return lines
+
+
+class Counter(_Metric):
+    """A value that only goes up, e.g. the number of received items."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = defaultdict(float)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0.0)
+
+    def _collect(self):
+        with self._lock:
+            return dict(self._values)
+
+    def _samples(self, values):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values.items()]
+
+
+class Gauge(_Metric):
+    """A value that goes up and down. It can also be read from a function when metrics are collected."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        self._functions = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function, **labels):
+        """Read the value from 'function()' every time the metrics are collected."""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = function
+
+    def _collect(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = list(self._functions.items())
+        for key, function in functions:
+            try:
+                values[key] = function()
+            except Exception as e:
+                logger.debug("Could not collect gauge '%s': %s", self.name, e)
+        return values
+
+    def _samples(self, values):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    """Counts observations (e.g. durations) in cumulative buckets, plus their sum and count."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the 'with' block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    @staticmethod
+    def _add(total, values):
+        return [a + b for a, b in zip(total, values)] if total else list(values)
+
+    def _collect(self):
+        with self._lock:
+            return {key: list(values) for key, values in self._series.items()}
+
+    def _samples(self, series):
+        lines = []
+        for key, values in series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                le = (('le', _format_value(float(bound))),)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(values[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    A collection of metrics that can be rendered in the Prometheus text format.
+
+    In supervisor mode every process has its own registry. The bot and the
+    media workers write snapshots of theirs to a directory (export_snapshots)
+    and the collector, which serves '/metrics', adds them to its own values
+    (merge_snapshots). Counters and histograms are summed; so are gauges,
+    e.g. the spool bytes reserved by every process.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.snapshot_dir = None
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric '{metric.name}' is already registered.")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        snapshots = self._read_snapshots() if self.snapshot_dir else []
+        lines = []
+        for metric in metrics:
+            extra = [{tuple(key): value for key, value in snapshot.get(metric.name, ())} for snapshot in snapshots]
+            lines.extend(metric.render(extra))
+        return '\n'.join(lines) + '\n'
+
+    # --- Other Processes ---
+
+    def snapshot(self):
+        """The current values of all metrics as a JSON-serializable dict."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: [[list(key), value] for key, value in metric._collect().items()] for metric in metrics}
+
+    def export_snapshots(self, directory, name, interval):
+        """Write a snapshot to '<directory>/<name>.json' every 'interval' seconds and when the process exits."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name}.json")
+
+        def write():
+            try:
+                with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                    json.dump(self.snapshot(), f)
+                os.replace(path + '.tmp', path)
+            except (OSError, TypeError, ValueError) as e:
+                logger.warning("Could not write the metrics snapshot '%s': %s", path, e)
+
+        def run():
+            while True:
+                write()
+                time.sleep(interval)
+
+        threading.Thread(target=run, name="MetricsExport", daemon=True).start()
+        atexit.register(write)
+
+    def merge_snapshots(self, directory):
+        """Add the snapshots other processes write to 'directory' to the rendered values."""
+        self.snapshot_dir = directory
+
+    def _read_snapshots(self):
+        snapshots = []
+        try:
+            names = sorted(os.listdir(self.snapshot_dir))
+        except FileNotFoundError:
+            return snapshots
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.snapshot_dir, name), 'r', encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.debug("Could not read the metrics snapshot '%s': %s", name, e)
+        return snapshots
+
+
+# --- Per-Item Spans ---
+
+class Span:
+    """
+    Timing breakdown of a single item, e.g. how long it spent downloading,
+    uploading and sleeping in the rate limiter.
+    """
+
+    def __init__(self, name, kind):
+        self.name = name
+        self.kind = kind
+        self.phases = defaultdict(float)
+        self.started = time.perf_counter()
+        self.duration = None
+        # An item sent to several chats records phases from several threads.
+        self._lock = threading.Lock()
+
+    def add(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] += seconds
+
+    def summary(self):
+        return ', '.join(f"{phase} {seconds:.2f}s" for phase, seconds in self.phases.items())
+
+
+_local = threading.local()
+
+def current_span():
+    """Return the span of the item being processed by this thread, or None."""
+    return getattr(_local, 'span', None)
+
+def add_phase(phase, seconds):
+    """Add time to a phase of the current thread's span, if there is one."""
+    span = getattr(_local, 'span', None)
+    if span is not None:
+        span.add(phase, seconds)
+
+@contextmanager
+def attach(item_span):
+    """Record phases on this thread into a span started on another thread, e.g. by a helper pool."""
+    previous, _local.span = getattr(_local, 'span', None), item_span
+    try:
+        yield item_span
+    finally:
+        _local.span = previous
+
+@contextmanager
+def span(name, kind):
+    """
+    Record a per-item span for the 'with' block on the current thread.
+    When the block ends, every phase is observed in SEND_PHASE_SECONDS.
+    """
+    item_span = Span(name, kind)
+    previous, _local.span = getattr(_local, 'span', None), item_span
+    try:
+        yield item_span
+    finally:
+        _local.span = previous
+        item_span.duration = time.perf_counter() - item_span.started
+        for phase, seconds in item_span.phases.items():
+            SEND_PHASE_SECONDS.observe(seconds, phase=phase, media_type=kind)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Item %s (%s) took %.2fs: %s.", name, kind, item_span.duration, item_span.summary())
+
+
+# --- Shared Instances ---
+REGISTRY = Registry()
+
+# Collector.
+INGEST_LATENCY = REGISTRY.histogram(
+    'tt2tg_ingest_latency_seconds', "Time to receive and store items from the extension.", ['endpoint'])
+INGEST_ITEMS = REGISTRY.counter(
+    'tt2tg_ingest_items_total', "Received items by de-duplication result (saved, duplicate or invalid).", ['result'])
+INGEST_REJECTED = REGISTRY.counter(
+    'tt2tg_ingest_rejected_total', "Requests answered with 503 because the ingest queue was full.")
+QUEUE_DEPTH = REGISTRY.gauge(
+    'tt2tg_queue_depth', "Items waiting in the in-memory ingest queue, or bytes in the queue journal.", ['queue'])
+
+# Downloads.
+YTDLP_SECONDS = REGISTRY.histogram(
+    'tt2tg_ytdlp_seconds', "Time yt-dlp spent extracting and downloading a video.")
+DOWNLOAD_BYTES = REGISTRY.counter(
+    'tt2tg_download_bytes_total', "Bytes downloaded by source (direct, ytdlp, direct_stream, ytdlp_stream or album).",
+    ['source'])
+SPOOL_BYTES = REGISTRY.gauge(
+    'tt2tg_download_spool_bytes', "Bytes reserved in the download spool, and its budget.", ['state'])
+
+# Telegram.
+UPLOAD_SECONDS = REGISTRY.histogram(
+    'tt2tg_upload_seconds', "Duration of Telegram API calls, by media type of the item being sent.", ['media_type'])
+TELEGRAM_THROTTLED = REGISTRY.counter(
+    'tt2tg_telegram_throttled_total', "Telegram API calls answered with Error 429.")
+BACKOFF_SECONDS = REGISTRY.counter(
+    'tt2tg_backoff_seconds_total', "Time spent backing off after Error 429.")
+RATE_LIMIT_WAIT_SECONDS = REGISTRY.counter(
+    'tt2tg_rate_limit_wait_seconds_total', "Time spent waiting for the rate limiter before a Telegram API call, without 429 backoff.")
+SEND_PHASE_SECONDS = REGISTRY.histogram(
+    'tt2tg_send_phase_seconds', "Per-item time by phase (download, download_wait, spool_wait, upload, sleep).",
+    ['phase', 'media_type'])
+LANE_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    'tt2tg_lane_queue_wait_seconds', "Time items waited in their send lane before being started.", ['lane'])
+FANOUT_SENDS = REGISTRY.counter(
+    'tt2tg_fanout_sends_total', "Items sent to additional chats without uploading them again, by method (file_id or copy).",
+    ['method'])
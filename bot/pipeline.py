@@ -0,0 +1,186 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import os
+import time
+import shutil
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Basic Setup ---
+# The logger is configured in 'main.py' to ensure a consistent format.
+logger = logging.getLogger(__name__)
+
+# Sentinel marking the end of the input items.
+_END = object()
+
+
+class PreparedItem:
+    """
+    The result of the prepare (download) stage for a single item.
+
+    Holds the temporary files and in-memory payloads the deliver (upload)
+    stage needs. Media that was uploaded before carries its cached Telegram
+    'file_ids' instead, and media that is streamed straight into its upload
+    is only marked as 'streamed'. If preparing failed, 'error' holds the
+    exception. 'timings' holds the seconds spent in the pipeline stages, by
+    phase. 'reservation' is the download spool space held by the files.
+    """
+
+    def __init__(self, paths=None, payload=None, error=None, file_ids=None, content_hash=None, streamed=False):
+        self.paths = paths or []
+        self.payload = payload
+        self.error = error
+        self.file_ids = file_ids
+        self.content_hash = content_hash
+        self.streamed = streamed
+        self.reservation = None
+        self.timings = {}
+
+    @property
+    def disk_size(self):
+        """Bytes held by this item's temporary files."""
+        total = 0
+        for path in self.paths:
+            if os.path.isfile(path):
+                total += os.path.getsize(path)
+            elif os.path.isdir(path):
+                for root, _, files in os.walk(path):
+                    total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        return total
+
+    @property
+    def size(self):
+        """Bytes held by this item on disk and in memory."""
+        total = self.disk_size
+        if isinstance(self.payload, (bytes, bytearray)):
+            total += len(self.payload)
+        elif isinstance(self.payload, list):
+            total += sum(len(part) for part in self.payload if isinstance(part, (bytes, bytearray)))
+        return total
+
+    def cleanup(self):
+        """Remove temporary files and release in-memory payloads."""
+        for path in self.paths:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+        self.paths = []
+        self.payload = None
+        if self.reservation is not None:
+            self.reservation.release()
+
+
+def prepare_timed(prepare, item, reservation=None):
+    """
+    Run 'prepare(item)', recording its duration and turning exceptions into a failed PreparedItem.
+    The spool 'reservation' made for the download is shrunk to the size of the downloaded files
+    and released when the item is cleaned up.
+    """
+    start = time.perf_counter()
+    try:
+        prepared = prepare(item)
+    except Exception as e:
+        prepared = PreparedItem(error=e)
+    prepared.timings['download'] = time.perf_counter() - start
+    if reservation is not None:
+        reservation.resize(prepared.disk_size)
+        prepared.reservation = reservation
+    return prepared
+
+
+class SendPipeline:
+    """
+    A two-stage pipeline that prepares upcoming items while the current one is delivered.
+
+    The 'prepare' callable runs in a thread pool for up to 'window' items
+    ahead of the consumer. Results are yielded strictly in input order, so
+    the delivery order never changes. Prefetching also pauses while the
+    prepared but not yet delivered items hold more than 'max_bytes'.
+
+    'reserve(item, blocking)' may reserve download spool space for an item
+    before it is prepared. Items ahead of the consumer are only started if
+    their space is free right away; only an item the consumer is waiting
+    for waits for space, so prefetched items never block the item in front
+    of them.
+    """
+
+    def __init__(self, prepare, window=3, max_bytes=None, reserve=None):
+        self.prepare = prepare
+        self.window = max(1, window)
+        self.max_bytes = max_bytes
+        self.reserve = reserve
+
+    def _run_prepare(self, item, reservation=None, spool_wait=0.0):
+        prepared = prepare_timed(self.prepare, item, reservation)
+        if spool_wait:
+            prepared.timings['spool_wait'] = spool_wait
+        return prepared
+
+    def _buffered_bytes(self, pending):
+        """Bytes held by items that finished preparing but were not delivered yet."""
+        return sum(
+            future.result().size for _, future, _ in pending
+            if future.done()
+        )
+
+    def run(self, items):
+        """
+        Yield (item, PreparedItem) pairs in input order.
+
+        Each prepared item is cleaned up once the consumer asks for the next
+        one. Closing the generator early cancels the outstanding downloads
+        and cleans up everything that was already prepared.
+        """
+        items = iter(items)
+        pending = deque()
+        # An item whose spool space was not free yet; it is started next.
+        held = []
+        exhausted = False
+
+        def fill(may_wait=True):
+            nonlocal exhausted
+            while not exhausted and len(pending) < self.window:
+                # The first item is always started so the pipeline cannot stall.
+                if pending and self.max_bytes and self._buffered_bytes(pending) >= self.max_bytes:
+                    break
+                item = held.pop() if held else next(items, _END)
+                if item is _END:
+                    exhausted = True
+                    break
+                reservation, spool_wait = None, 0.0
+                if self.reserve is not None:
+                    start = time.perf_counter()
+                    reservation = self.reserve(item, blocking=may_wait and not pending)
+                    if reservation is None:
+                        held.append(item)
+                        break
+                    spool_wait = time.perf_counter() - start
+                pending.append((item, executor.submit(self._run_prepare, item, reservation, spool_wait), reservation))
+
+        with ThreadPoolExecutor(max_workers=self.window, thread_name_prefix="Prefetch") as executor:
+            try:
+                fill()
+                while pending:
+                    item, future, _ = pending.popleft()
+                    start = time.perf_counter()
+                    prepared = future.result()
+                    # Time the consumer was blocked because the download was not finished yet.
+                    prepared.timings['download_wait'] = time.perf_counter() - start
+                    # The item about to be delivered still holds its spool space, so nothing may wait for it.
+                    fill(may_wait=False)
+                    try:
+                        yield item, prepared
+                    finally:
+                        prepared.cleanup()
+                    fill()
+            finally:
+                # Drop queued downloads and clean up the ones that already ran.
+                for _, future, _ in pending:
+                    future.cancel()
+                for _, future, reservation in pending:
+                    if not future.cancelled():
+                        future.result().cleanup()
+                    elif reservation is not None:
+                        reservation.release()
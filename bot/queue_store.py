@@ -0,0 +1,491 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import os
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from config import QUEUE_FILE_NAME, QUEUE_FSYNC, JSON_FILE_NAME
+
+# --- Basic Setup ---
+# The logger is configured in 'main.py' to ensure a consistent format.
+logger = logging.getLogger(__name__)
+
+# --- Path Definitions ---
+BOT_DIR = os.path.dirname(__file__)
+# Append-only journal that holds the items waiting to be sent.
+QUEUE_FILE_PATH = os.path.join(BOT_DIR, QUEUE_FILE_NAME)
+# Legacy queue format (a single JSON list), migrated into the journal on startup.
+LEGACY_JSON_FILE_PATH = os.path.join(BOT_DIR, JSON_FILE_NAME)
+
+# Block size used when scanning the journal backwards.
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class InterProcessLock:
+    """
+    An exclusive lock on a file, shared by all processes that open the same path.
+    Uses 'fcntl.flock' on POSIX systems and 'msvcrt.locking' on Windows.
+    It is re-entrant, but not thread-safe: callers serialize their threads,
+    like ItemQueue does with its own lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._depth = 0
+
+    def acquire(self):
+        if self._depth:
+            self._depth += 1
+            return
+        if self._file is None:
+            self._file = open(self.path, 'a+b')
+        if os.name == 'nt':
+            import msvcrt
+            self._file.seek(0)
+            # LK_LOCK retries for about 10 seconds before giving up; keep waiting after that.
+            while True:
+                try:
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        else:
+            import fcntl
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        self._depth = 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth:
+            return
+        if os.name == 'nt':
+            import msvcrt
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def item_id_of(item):
+    """Return the ID of a queued item. Legacy plain URL strings are their own ID."""
+    return item.get('itemId', item.get('url')) if isinstance(item, dict) else item
+
+
+class ItemQueue:
+    """
+    An append-only NDJSON journal of collected items.
+
+    Every item is stored as a single JSON line, so adding an item costs one
+    small write regardless of how many items are already queued. When fsync
+    is enabled, concurrent writers share a single fsync call (group commit):
+    the first writer to arrive syncs everything written so far, and the
+    others simply wait for it to finish instead of issuing their own.
+
+    The IDs of the items in every write are also appended to a small
+    sidecar file, '<journal>.ids', as '[inode, start, end, ids]', so the
+    queued IDs can be restored at startup without parsing every item. The
+    sidecar is not synced; the part of the journal it does not cover is
+    parsed instead. Journals whose IDs are never listed, e.g. the delivery
+    log, pass 'record_ids=False' to skip it.
+    """
+
+    def __init__(self, path, fsync=True, record_ids=True):
+        self.path = path
+        self.ids_path = path + '.ids'
+        self.record_ids = record_ids
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._synced = threading.Condition(self._lock)
+        self._file = None
+        self._ids_file = None
+        self._written_seq = 0  # Number of lines written to the journal.
+        self._synced_seq = 0   # Number of lines known to be on disk.
+        self._syncing = False  # True while a writer is running fsync for the group.
+        # Set by share_between_processes() when other processes write the same journal.
+        self._process_lock = None
+
+    def share_between_processes(self):
+        """
+        Coordinate with other processes that use the same journal, e.g. the
+        collector and the bot in supervisor mode. Writes and compaction then
+        take a lock file, and writers reopen the journal after it was rewritten.
+        """
+        self._process_lock = InterProcessLock(self.path + '.lock')
+
+    @contextmanager
+    def _locked_file(self):
+        """Hold the inter-process lock, if any. Must be called with the thread lock held."""
+        if self._process_lock is None:
+            yield
+            return
+        with self._process_lock:
+            yield
+
+    # --- Writing ---
+
+    @staticmethod
+    def _encode(item):
+        """Serialize an item into a single NDJSON line."""
+        return (json.dumps(item, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+    def _write_lines(self, lines, item_ids):
+        """Write encoded lines to the journal. Must be called with the lock held."""
+        with self._locked_file():
+            if self._file is not None and self._process_lock is not None and self._was_replaced():
+                # Another process compacted or removed the journal; continue in the new file.
+                self._close()
+            if self._file is None:
+                self._file = open(self.path, 'ab')
+                self._cut_torn_tail()
+            data = b''.join(lines)
+            self._file.write(data)
+            self._file.flush()
+            end = self._file.tell()
+            self._record_ids(os.fstat(self._file.fileno()).st_ino, end - len(data), end, item_ids)
+        self._written_seq += 1
+        return self._written_seq
+
+    def _cut_torn_tail(self):
+        """
+        Remove a partial last line left by a crash, so the next write does not continue it.
+        Must be called with the locks held, right after the journal was opened.
+        """
+        size = os.fstat(self._file.fileno()).st_size
+        end = size
+        with open(self.path, 'rb') as f:
+            while end > 0:
+                start = max(0, end - READ_BLOCK_SIZE)
+                f.seek(start)
+                block = f.read(end - start)
+                newline = block.rfind(b'\n')
+                if newline != -1:
+                    end = start + newline + 1
+                    break
+                end = start
+        if end < size:
+            logger.warning("Removing a partial line of %s bytes from the end of '%s'.", size - end, self.path)
+            self._file.truncate(end)
+
+    def _record_ids(self, inode, start, end, item_ids):
+        """Append the IDs of the journal bytes 'start' to 'end' to the sidecar. Must be called with the lock held."""
+        if not self.record_ids:
+            return
+        try:
+            if self._ids_file is None:
+                self._ids_file = open(self.ids_path, 'ab')
+            self._ids_file.write(json.dumps([inode, start, end, item_ids], ensure_ascii=False).encode('utf-8') + b'\n')
+            self._ids_file.flush()
+        except (OSError, TypeError, ValueError) as e:
+            # The journal is already written; the IDs will be read from it instead.
+            logger.warning("Could not record item IDs in '%s': %s", self.ids_path, e)
+
+    def _was_replaced(self):
+        """True if the journal path no longer refers to the open file."""
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino
+        except OSError:
+            return True
+
+    def _wait_synced(self, seq):
+        """
+        Block until the write with sequence number 'seq' is on disk.
+        Must be called with the lock held.
+        """
+        while self._synced_seq < seq:
+            if self._syncing:
+                # Another writer is already syncing; its fsync may cover our write too.
+                self._synced.wait()
+                continue
+
+            # Become the leader of this group commit.
+            self._syncing = True
+            target = self._written_seq
+            fd = self._file.fileno()
+            self._lock.release()
+            try:
+                os.fsync(fd)
+            finally:
+                self._lock.acquire()
+                self._syncing = False
+                self._synced_seq = max(self._synced_seq, target)
+                self._synced.notify_all()
+
+    def append(self, item):
+        """Append a single item to the journal."""
+        line = self._encode(item)
+        with self._lock:
+            seq = self._write_lines([line], [item_id_of(item)])
+            if self.fsync:
+                self._wait_synced(seq)
+
+    def extend(self, items):
+        """Append several items to the journal with a single write."""
+        lines = [self._encode(item) for item in items]
+        if not lines:
+            return
+        with self._lock:
+            seq = self._write_lines(lines, [item_id_of(item) for item in items])
+            if self.fsync:
+                self._wait_synced(seq)
+
+    def _close(self):
+        """Close the journal handle. Must be called with the lock held."""
+        while self._syncing:
+            self._synced.wait()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._ids_file is not None:
+            self._ids_file.close()
+            self._ids_file = None
+
+    # --- Reading ---
+
+    def exists(self):
+        """Return True if the journal file exists and is not empty."""
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    @staticmethod
+    def _decode(line):
+        """Parse a single journal line, returning None for blank or corrupted lines."""
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            return json.loads(line)
+        except ValueError:
+            logger.warning("Skipping corrupted journal line: %r", line[:80])
+            return None
+
+    def iter_items(self, reverse=False):
+        """
+        Stream items from the journal without loading the whole file.
+
+        Items are yielded oldest first, or newest first when 'reverse' is True.
+        A trailing line without a newline is treated as an unfinished write
+        and is ignored.
+        """
+        if not os.path.exists(self.path):
+            return
+        if reverse:
+            yield from self._iter_reversed()
+            return
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                item = self._decode(line)
+                if item is not None:
+                    yield item
+
+    def _read_recorded_ids(self, inode, size):
+        """
+        Read the sidecar records of the journal with 'inode'. Returns (covered, ids), where
+        'ids' are the item IDs of the journal's first 'covered' bytes.
+        """
+        records = {}
+        try:
+            with open(self.ids_path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        record_inode, start, end, item_ids = json.loads(line)
+                    except (ValueError, TypeError):
+                        continue
+                    if record_inode == inode and start <= end <= size:
+                        records[start] = (end, item_ids)
+        except FileNotFoundError:
+            pass
+        # Follow the records from the start of the journal until the first gap.
+        covered, ids = 0, []
+        while covered in records:
+            end, item_ids = records.pop(covered)
+            ids.extend(item_ids)
+            covered = end
+        return covered, ids
+
+    def item_ids(self):
+        """
+        Return the IDs of the queued items, oldest first.
+
+        The IDs are read from the sidecar; only journal lines it does not
+        cover, e.g. after a crash or when it is missing, are parsed. Their
+        IDs are then recorded, so the next call does not parse them again.
+        """
+        with self._lock, self._locked_file():
+            try:
+                f = open(self.path, 'rb')
+            except FileNotFoundError:
+                return []
+            with f:
+                inode, size = os.fstat(f.fileno()).st_ino, os.fstat(f.fileno()).st_size
+                covered, ids = self._read_recorded_ids(inode, size)
+                f.seek(covered)
+                position, tail_ids = covered, []
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    position += len(line)
+                    item = self._decode(line)
+                    if item is not None:
+                        tail_ids.append(item_id_of(item))
+            if position > covered:
+                logger.info("Read %s item IDs from the journal that were missing in '%s'.", len(tail_ids), self.ids_path)
+                self._record_ids(inode, covered, position, tail_ids)
+            return ids + tail_ids
+
+    def _iter_reversed(self):
+        """Yield journal items newest first by reading the file backwards in blocks."""
+        with open(self.path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            # Bytes of an incomplete line carried over from the previous (later) block.
+            remainder = b''
+            # True until the first line break is found. Anything after the last
+            # line break is a partial line left by an unfinished write.
+            in_tail = True
+            while position > 0:
+                read_size = min(READ_BLOCK_SIZE, position)
+                position -= read_size
+                f.seek(position)
+                block = f.read(read_size) + remainder
+                lines = block.split(b'\n')
+                remainder = lines.pop(0)
+                if in_tail and lines:
+                    lines.pop()
+                    in_tail = False
+                for line in reversed(lines):
+                    item = self._decode(line)
+                    if item is not None:
+                        yield item
+            if remainder and not in_tail:
+                item = self._decode(remainder)
+                if item is not None:
+                    yield item
+
+    def count(self):
+        """Count the items in the journal by scanning for line breaks."""
+        if not os.path.exists(self.path):
+            return 0
+        total = 0
+        with open(self.path, 'rb') as f:
+            for block in iter(lambda: f.read(READ_BLOCK_SIZE), b''):
+                total += block.count(b'\n')
+        return total
+
+    # --- Maintenance ---
+
+    def size(self):
+        """Size of the journal in bytes, used to notice newly appended items cheaply."""
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def clear(self):
+        """Delete the journal."""
+        with self._lock, self._locked_file():
+            self._close()
+            for path in (self.path, self.ids_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def compact(self, is_done, archive):
+        """
+        Move finished items out of the journal.
+
+        Items for which 'is_done(item)' is True are passed to
+        'archive.add(item, line)'; the rest stay in the journal in their
+        original order. 'archive.commit()' is called before the journal is
+        replaced, so every item is always in the journal or in the archive.
+        Appends are blocked while the journal is rewritten, so no item can be
+        lost. Returns a tuple of (archived_count, kept_count).
+        """
+        with self._lock, self._locked_file():
+            self._close()
+            if not os.path.exists(self.path):
+                return 0, 0
+
+            temp_path = self.path + '.tmp'
+            archived = kept = 0
+            kept_ids = []
+            with open(self.path, 'rb') as source, open(temp_path, 'wb') as journal:
+                for line in source:
+                    # No write can be in progress here, so a partial line is left over from a crash.
+                    if not line.endswith(b'\n'):
+                        break
+                    item = self._decode(line)
+                    if item is None:
+                        continue
+                    if is_done(item):
+                        archive.add(item, line)
+                        archived += 1
+                    else:
+                        journal.write(line)
+                        kept_ids.append(item_id_of(item))
+                        kept += 1
+                journal.flush()
+                os.fsync(journal.fileno())
+                record = [os.fstat(journal.fileno()).st_ino, 0, journal.tell(), kept_ids]
+
+            # The new sidecar describes the new journal by its inode, so a crash between the
+            # two renames leaves a sidecar that is ignored rather than a wrong one.
+            if self.record_ids:
+                with open(self.ids_path + '.tmp', 'wb') as ids_file:
+                    ids_file.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+            archive.commit()
+            os.replace(temp_path, self.path)
+            if self.record_ids:
+                os.replace(self.ids_path + '.tmp', self.ids_path)
+            return archived, kept
+
+    def migrate_legacy(self, json_path):
+        """
+        Import items from a legacy JSON list file into the journal.
+
+        The legacy file is renamed with a '.migrated' suffix afterwards, so
+        the migration runs only once. The collector and the bot both call
+        this at startup, so the whole migration holds the journal's locks.
+        """
+        if not os.path.exists(json_path):
+            return 0
+        with self._lock, self._locked_file():
+            # Another process may have migrated the file while this one waited for the lock.
+            if not os.path.exists(json_path):
+                return 0
+            try:
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    items = json.load(f)
+            except (json.JSONDecodeError, IOError) as e:
+                logger.error("Could not read legacy queue '%s' for migration: %s", json_path, e)
+                return 0
+
+            if not isinstance(items, list):
+                logger.warning("Legacy queue '%s' does not contain a JSON list. Skipping migration.", json_path)
+                items = []
+
+            if items:
+                self._write_lines([self._encode(item) for item in items], [item_id_of(item) for item in items])
+                if self.fsync:
+                    # The journal must be durable before the legacy file is renamed.
+                    os.fsync(self._file.fileno())
+            os.replace(json_path, json_path + '.migrated')
+        logger.info("Migrated %s items from legacy queue '%s' to '%s'.", len(items), json_path, self.path)
+        return len(items)
+
+
+# --- Shared Instance ---
+# The collector and the bot share one journal handle when they run in the same process.
+# In supervisor mode each process calls 'share_between_processes()' on its own instance.
+ITEM_QUEUE = ItemQueue(QUEUE_FILE_PATH, fsync=QUEUE_FSYNC)
@@ -0,0 +1,204 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import time
+import random
+import logging
+import threading
+from telebot.apihelper import ApiTelegramException
+import metrics
+from config import (
+    RATE_LIMIT_CHAT_PER_MINUTE, RATE_LIMIT_MIN_PER_MINUTE, RATE_LIMIT_GLOBAL_PER_SECOND,
+    RATE_LIMIT_MAX_RETRIES, RATE_LIMIT_PROBE_AFTER,
+)
+
+# --- Basic Setup ---
+# The logger is configured in 'main.py' to ensure a consistent format.
+logger = logging.getLogger(__name__)
+
+# Base delay (in seconds) for the jittered backoff when Telegram gives no 'retry_after'.
+BACKOFF_BASE = 1.0
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket.
+
+    'rate' tokens are added per second up to 'capacity'. Callers reserve
+    tokens and are told how long to wait until their reservation is due,
+    so concurrent senders are spaced out without a busy loop.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def reserve(self, tokens=1):
+        """Take 'tokens' from the bucket and return how many seconds to wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def block(self, seconds):
+        """Hold every reservation back for at least 'seconds' (e.g. after a 429 response)."""
+        with self._lock:
+            now = time.monotonic()
+            self._blocked_until = max(self._blocked_until, now + seconds)
+            # Start refilling from zero once the block is over.
+            self._tokens = min(self._tokens, 0)
+            self._updated = now + seconds
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+
+class ChatLimiter:
+    """
+    Adaptive per-chat rate state.
+
+    The rate is halved on every 429 response and raised again in small
+    steps after RATE_LIMIT_PROBE_AFTER consecutive successes (additive
+    increase, multiplicative decrease), so it settles just below the
+    highest rate Telegram accepts for the chat.
+    """
+
+    def __init__(self, max_rate, min_rate):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.bucket = TokenBucket(max_rate, capacity=1)
+        self._successes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def on_success(self):
+        with self._lock:
+            self._successes += 1
+            if self._successes < RATE_LIMIT_PROBE_AFTER or self.rate >= self.max_rate:
+                return
+            self._successes = 0
+            # Probe upwards by a tenth of the allowed range.
+            new_rate = min(self.max_rate, self.rate + (self.max_rate - self.min_rate) / 10)
+            self.bucket.set_rate(new_rate)
+            logger.debug("Raising send rate to %.1f messages/minute.", new_rate * 60)
+
+    def on_throttled(self, retry_after):
+        with self._lock:
+            self._successes = 0
+            new_rate = max(self.min_rate, self.rate / 2)
+            self.bucket.set_rate(new_rate)
+            self.bucket.block(retry_after)
+            logger.info("Lowering send rate to %.1f messages/minute for %ss.", new_rate * 60, retry_after)
+
+
+class RateLimiter:
+    """
+    Routes Telegram API calls through per-chat and global token buckets.
+
+    429 responses are retried automatically after the 'retry_after' period
+    Telegram asks for, plus a random jitter, up to RATE_LIMIT_MAX_RETRIES
+    times. Other errors are raised to the caller unchanged.
+    """
+
+    def __init__(self, chat_rate, min_rate, global_rate, max_retries):
+        self.chat_rate = chat_rate
+        self.min_rate = min_rate
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate, capacity=max(1, global_rate))
+        self._chats = {}
+        self._lock = threading.Lock()
+        # Statistics, mostly useful for benchmarks.
+        self.throttled_count = 0
+        self.backoff_seconds = 0.0
+
+    def chat(self, chat_id):
+        """Return the rate state for a chat, creating it on first use."""
+        with self._lock:
+            limiter = self._chats.get(chat_id)
+            if limiter is None:
+                limiter = self._chats[chat_id] = ChatLimiter(self.chat_rate, self.min_rate)
+            return limiter
+
+    @staticmethod
+    def _retry_after(error):
+        """Read 'retry_after' (in seconds) from a Telegram API error, if present."""
+        parameters = (error.result_json or {}).get('parameters') or {}
+        return parameters.get('retry_after')
+
+    def call(self, chat_id, func, *args, cost=1, **kwargs):
+        """
+        Call 'func(*args, **kwargs)' once the rate limits for 'chat_id' allow it.
+
+        'cost' is the number of messages the call produces, e.g. the number
+        of photos in a media group. 'func' may be called more than once, so
+        file uploads should open their files inside it.
+        """
+        limiter = self.chat(chat_id)
+        span = metrics.current_span()
+        media_type = span.kind if span else 'other'
+        # Backoff after a 429 is slept in the next wait, but counted in BACKOFF_SECONDS only.
+        backoff = 0.0
+        for attempt in range(self.max_retries + 1):
+            wait = max(limiter.bucket.reserve(cost), self.global_bucket.reserve(cost))
+            if wait > 0:
+                time.sleep(wait)
+                metrics.RATE_LIMIT_WAIT_SECONDS.inc(max(0.0, wait - backoff))
+                metrics.add_phase('sleep', wait)
+            backoff = 0.0
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except ApiTelegramException as e:
+                self._record_call(start, media_type)
+                if e.error_code != 429 or attempt == self.max_retries:
+                    raise
+                retry_after = self._retry_after(e)
+                if retry_after is None:
+                    retry_after = BACKOFF_BASE * 2 ** attempt
+                # Jitter keeps concurrent senders from retrying at the same moment.
+                delay = retry_after + random.uniform(0, BACKOFF_BASE * 2 ** attempt)
+                self.throttled_count += 1
+                self.backoff_seconds += delay
+                metrics.TELEGRAM_THROTTLED.inc()
+                metrics.BACKOFF_SECONDS.inc(delay)
+                logger.warning("Telegram rate limit hit for chat %s, retrying in %.1fs (attempt %s/%s).", chat_id, delay, attempt + 1, self.max_retries)
+                limiter.on_throttled(delay)
+                backoff = delay
+                continue
+            except Exception:
+                self._record_call(start, media_type)
+                raise
+            self._record_call(start, media_type)
+            limiter.on_success()
+            return result
+
+    @staticmethod
+    def _record_call(start, media_type):
+        """Record the duration of a Telegram API call as upload time."""
+        elapsed = time.perf_counter() - start
+        metrics.UPLOAD_SECONDS.observe(elapsed, media_type=media_type)
+        metrics.add_phase('upload', elapsed)
+
+
+# --- Shared Instance ---
+LIMITER = RateLimiter(
+    chat_rate=RATE_LIMIT_CHAT_PER_MINUTE / 60,
+    min_rate=RATE_LIMIT_MIN_PER_MINUTE / 60,
+    global_rate=RATE_LIMIT_GLOBAL_PER_SECOND,
+    max_retries=RATE_LIMIT_MAX_RETRIES,
+)
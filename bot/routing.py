@@ -0,0 +1,68 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import re
+from config import ROUTES, TARGET_CHAT_ID
+
+# The TikTok user name in a video or photo post URL.
+AUTHOR_URL_RE = re.compile(r'tiktok\.com/@([^/?#]+)')
+
+
+def author_of(item):
+    """The TikTok user name of an item, lowercase and without '@', or None if it is unknown."""
+    author = item.get('author')
+    if not author:
+        match = AUTHOR_URL_RE.search(item.get('url') or '')
+        author = match.group(1) if match else None
+    return author.lstrip('@').lower() if author else None
+
+
+class Router:
+    """
+    Decides which chats receive an item.
+
+    Every rule in 'routes' is a dict with a list of 'chats' and optional
+    'types' and 'authors' conditions; a rule without conditions matches
+    every item. An item goes to the chats of all matching rules, in the
+    order they are listed, and to 'default_chat_id' if no rule matches.
+    """
+
+    def __init__(self, routes, default_chat_id=None):
+        self.routes = []
+        for route in routes or []:
+            if not route.get('chats'):
+                raise ValueError(f"Route {route} has no 'chats'.")
+            self.routes.append((
+                set(route['types']) if route.get('types') else None,
+                {author.lstrip('@').lower() for author in route['authors']} if route.get('authors') else None,
+                list(route['chats']),
+            ))
+        self.default_chat_id = default_chat_id
+
+    def chats_for(self, item):
+        """Chat IDs that receive 'item', in order. A message batch goes where its messages go."""
+        if item.get('type') == 'message_batch':
+            item = item['items'][0]
+        chats = []
+        author = None
+        for types, authors, route_chats in self.routes:
+            if types is not None and item.get('type') not in types:
+                continue
+            if authors is not None:
+                author = author or author_of(item)
+                if author not in authors:
+                    continue
+            chats.extend(chat_id for chat_id in route_chats if chat_id not in chats)
+        if not chats and self.default_chat_id:
+            chats.append(self.default_chat_id)
+        return tuple(chats)
+
+    def all_chats(self):
+        """Every chat that can receive items."""
+        chats = [chat_id for _, _, route_chats in self.routes for chat_id in route_chats]
+        if self.default_chat_id:
+            chats.append(self.default_chat_id)
+        return list(dict.fromkeys(chats))
+
+
+# --- Shared Instance ---
+ROUTER = Router(ROUTES, TARGET_CHAT_ID)
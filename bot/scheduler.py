@@ -0,0 +1,158 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import metrics
+
+# --- Basic Setup ---
+# The logger is configured in 'main.py' to ensure a consistent format.
+logger = logging.getLogger(__name__)
+
+# Sentinel marking the end of the input items.
+_END = object()
+
+
+class Lane:
+    """
+    A queue of items of one kind, e.g. text messages or videos.
+
+    At most 'concurrency' items of the lane run at the same time. When
+    several lanes have items waiting, free workers are shared in proportion
+    to 'weight'. In an 'ordered' lane, items with the same order key (e.g.
+    the same TikTok conversation) are started one at a time, in queue order.
+    """
+
+    def __init__(self, name, concurrency=1, weight=1, ordered=False):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.weight = max(1, weight)
+        self.ordered = ordered
+        self.pending = deque()  # (item, order_keys, queued_at)
+        self.active = 0
+        self.started = 0
+        self.busy_keys = set()
+        # Queue wait of the items started in the current run, for the summary log.
+        self.waits = []
+
+    def next_item(self):
+        """Remove and return the first item that may start now, or None."""
+        if self.active >= self.concurrency:
+            return None
+        # Keys of skipped items: a later item sharing one of them must not overtake.
+        blocked = set(self.busy_keys)
+        for index, (item, keys, queued_at) in enumerate(self.pending):
+            if not keys & blocked:
+                del self.pending[index]
+                return item, keys, queued_at
+            if not self.ordered:
+                break
+            blocked |= keys
+        return None
+
+
+class LaneScheduler:
+    """
+    Runs items in separate lanes so cheap items do not wait behind expensive ones.
+
+    'lane_of(item)' names the lane of an item and 'order_keys(item)' returns
+    the keys whose order must be kept in ordered lanes. 'run(item, queue_wait)'
+    handles an item on one of 'max_workers' threads. Up to 'lookahead' items
+    are read ahead from the input so that, for example, a text message queued
+    behind many videos is found and sent right away.
+    """
+
+    def __init__(self, lanes, lane_of, run, max_workers, lookahead=500, order_keys=None):
+        self.lanes = {lane.name: lane for lane in lanes}
+        self.lane_of = lane_of
+        self.run_item = run
+        self.max_workers = max(1, max_workers)
+        self.lookahead = max(1, lookahead)
+        self.order_keys = order_keys or (lambda item: frozenset())
+
+    def _pick_lane(self):
+        """The lane with the fewest started items relative to its weight that can start an item."""
+        ready = [lane for lane in self.lanes.values() if lane.pending and lane.active < lane.concurrency]
+        ready.sort(key=lambda lane: lane.started / lane.weight)
+        for lane in ready:
+            entry = lane.next_item()
+            if entry:
+                return lane, entry
+        return None, None
+
+    def _run(self, lane, item, queued_at):
+        queue_wait = time.perf_counter() - queued_at
+        lane.waits.append(queue_wait)
+        metrics.LANE_QUEUE_WAIT_SECONDS.observe(queue_wait, lane=lane.name)
+        return self.run_item(item, queue_wait)
+
+    def run(self, items, should_stop=None):
+        """
+        Yield the result of 'run' for every item, in the order the items finish.
+
+        Once 'should_stop()' returns True, no new items are started; the
+        results of items already running are still yielded.
+        """
+        items = iter(items)
+        exhausted = False
+        queued = 0
+        running = {}  # future -> (lane, order_keys)
+        for lane in self.lanes.values():
+            lane.started, lane.waits = 0, []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="Lane") as executor:
+            try:
+                while True:
+                    stopping = should_stop is not None and should_stop()
+                    # Read ahead so every lane sees its items as early as possible.
+                    while not stopping and not exhausted and queued < self.lookahead:
+                        item = next(items, _END)
+                        if item is _END:
+                            exhausted = True
+                            break
+                        lane = self.lanes[self.lane_of(item)]
+                        keys = frozenset(self.order_keys(item)) if lane.ordered else frozenset()
+                        lane.pending.append((item, keys, time.perf_counter()))
+                        queued += 1
+
+                    while not stopping and len(running) < self.max_workers:
+                        lane, entry = self._pick_lane()
+                        if lane is None:
+                            break
+                        item, keys, queued_at = entry
+                        queued -= 1
+                        lane.active += 1
+                        lane.started += 1
+                        lane.busy_keys |= keys
+                        running[executor.submit(self._run, lane, item, queued_at)] = (lane, keys)
+
+                    if not running:
+                        if stopping and queued:
+                            logger.info("Stopped with %s items not started.", queued)
+                        return
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        lane, keys = running.pop(future)
+                        lane.active -= 1
+                        lane.busy_keys -= keys
+                        yield future.result()
+            finally:
+                if running:
+                    logger.warning("Send interrupted with %s items in progress; their results are lost.", len(running))
+                for lane in self.lanes.values():
+                    lane.pending.clear()
+                    lane.active = 0
+                    lane.busy_keys.clear()
+
+    def wait_summary(self):
+        """One line per lane with the queue wait of the items started in the last run."""
+        parts = []
+        for lane in self.lanes.values():
+            if lane.waits:
+                waits = sorted(lane.waits)
+                parts.append(
+                    f"{lane.name} {len(waits)} items, median {waits[len(waits) // 2]:.1f}s, max {waits[-1]:.1f}s"
+                )
+        return '; '.join(parts)
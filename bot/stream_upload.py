@@ -0,0 +1,106 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import uuid
+import hashlib
+import logging
+import requests
+import telebot
+from telebot.apihelper import ApiHTTPException, ApiTelegramException
+
+# --- Basic Setup ---
+# The logger is configured in 'main.py' to ensure a consistent format.
+logger = logging.getLogger(__name__)
+
+# --- Shared Instance ---
+# Streamed uploads bypass telebot, which would read the whole file into memory first.
+UPLOAD_SESSION = requests.Session()
+
+
+class StreamUnavailable(Exception):
+    """Raised when a video cannot be streamed, so it has to be downloaded to the spool first."""
+
+
+class MultipartStream:
+    """
+    A multipart/form-data request body whose file part is read from 'chunks' while it is sent.
+
+    'size' is the exact length of the file, so the body is sent with a
+    Content-Length header. The SHA-256 of the file is computed on the way
+    and is available from hexdigest() once the body was sent.
+    """
+
+    def __init__(self, fields, file_field, file_name, chunks, size, content_type='video/mp4'):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self._head = ''.join(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            for name, value in fields.items()
+        ).encode('utf-8') + (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{file_name}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode('utf-8')
+        self._tail = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        self._chunks = chunks
+        self._digest = hashlib.sha256()
+        self.size = size
+        self.sent = 0
+
+    def __len__(self):
+        # requests sets Content-Length from this instead of using chunked encoding.
+        return len(self._head) + self.size + len(self._tail)
+
+    def __iter__(self):
+        yield self._head
+        for chunk in self._chunks:
+            self.sent += len(chunk)
+            if self.sent > self.size:
+                raise StreamUnavailable(f"The source sent more than the announced {self.size} bytes.")
+            self._digest.update(chunk)
+            yield chunk
+        if self.sent != self.size:
+            raise StreamUnavailable(f"The source ended after {self.sent} of {self.size} bytes.")
+        yield self._tail
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+
+def _api_url(token, method):
+    """The Bot API URL of 'method', honouring a custom telebot API_URL like telebot itself does."""
+    if telebot.apihelper.API_URL:
+        return telebot.apihelper.API_URL.format(token, method)
+    return f"https://api.telegram.org/bot{token}/{method}"
+
+def _parse_response(method, response):
+    """
+    Return the JSON of a Bot API response. Errors are raised as telebot's public
+    exception types: ApiTelegramException if Telegram refused the call (with its
+    'error_code' and 'parameters'), ApiHTTPException if the body is not JSON.
+    """
+    try:
+        result_json = response.json()
+    except ValueError:
+        raise ApiHTTPException(method, response)
+    if not isinstance(result_json, dict) or 'ok' not in result_json:
+        raise ApiHTTPException(method, response)
+    if not result_json['ok']:
+        result_json.setdefault('error_code', response.status_code)
+        result_json.setdefault('description', response.reason)
+        raise ApiTelegramException(method, response, result_json)
+    return result_json
+
+def send_video_stream(token, chat_id, chunks, size, file_name, timeout=120):
+    """
+    Upload a video to 'chat_id' with 'sendVideo' while it is read from 'chunks'.
+
+    Returns the sent telebot Message and the SHA-256 of the video. Errors
+    from Telegram are raised as telebot's ApiTelegramException, so the rate
+    limiter handles Error 429 as for any other call. A streamed upload
+    cannot be replayed; retries must open the source again.
+    """
+    body = MultipartStream({'chat_id': chat_id}, 'video', file_name, chunks, size)
+    response = UPLOAD_SESSION.post(
+        _api_url(token, 'sendVideo'), data=body, headers={'Content-Type': body.content_type}, timeout=timeout,
+    )
+    result = _parse_response('sendVideo', response)
+    return telebot.types.Message.de_json(result['result']), body.hexdigest()
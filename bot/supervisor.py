@@ -0,0 +1,192 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import os
+import glob
+import time
+import signal
+import logging
+import threading
+import multiprocessing
+from config import (
+    AUTO_DISPATCH, LOG_FILE_NAME, SUPERVISOR_RESTART_DELAY, SUPERVISOR_RESTART_DELAY_MAX,
+    SUPERVISOR_STABLE_SECONDS, SUPERVISOR_SHUTDOWN_TIMEOUT, METRICS_SNAPSHOT_DIR_NAME, METRICS_SNAPSHOT_INTERVAL,
+)
+
+# --- Basic Setup ---
+# The logger is configured in 'main.py' to ensure a consistent format.
+logger = logging.getLogger(__name__)
+
+# --- Path Definitions ---
+# Metrics snapshots of the bot and media worker processes, merged into the collector's '/metrics'.
+METRICS_SNAPSHOT_DIR = os.path.join(os.path.dirname(__file__), METRICS_SNAPSHOT_DIR_NAME)
+
+
+# --- Child Processes ---
+
+def _raise_system_exit(signum, frame):
+    raise SystemExit(0)
+
+def _child_main(name, target, args):
+    """Entry point of every child process: set up signals and logging, then run 'target'."""
+    from log_config import setup_logging
+    # Ctrl+C reaches the whole process group; only the supervisor reacts to it and
+    # then stops the children in order with SIGTERM.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # SIGTERM unwinds the process with SystemExit, so 'finally' blocks run
+    # and media workers hand their current job back.
+    signal.signal(signal.SIGTERM, _raise_system_exit)
+    log_file = None
+    if LOG_FILE_NAME:
+        # Every process writes its own file, so log rotation never races between processes.
+        root, extension = os.path.splitext(LOG_FILE_NAME)
+        log_file = f"{root}.{name}{extension}"
+    setup_logging(log_file=log_file, show_process=True)
+    target(*args)
+
+def run_collector_process(server):
+    """Collector process: receives items from the extension and appends them to the queue journal."""
+    from queue_store import ITEM_QUEUE
+    # The bot process compacts the same journal.
+    ITEM_QUEUE.share_between_processes()
+    import metrics
+    metrics.REGISTRY.merge_snapshots(METRICS_SNAPSHOT_DIR)
+    import collector
+    collector.main(server)
+
+def run_bot_process(mode):
+    """Bot process: handles Telegram commands and uploads; downloads are done by the media workers."""
+    from queue_store import ITEM_QUEUE
+    ITEM_QUEUE.share_between_processes()
+    import metrics
+    metrics.REGISTRY.export_snapshots(METRICS_SNAPSHOT_DIR, 'bot', METRICS_SNAPSHOT_INTERVAL)
+    import bot
+    from media_workers import MediaJobSpool, MediaWorkerClient, MEDIA_SPOOL_DIR
+    bot.MEDIA_WORKERS = MediaWorkerClient(MediaJobSpool(MEDIA_SPOOL_DIR)).start()
+
+    if AUTO_DISPATCH:
+        threading.Thread(target=bot.run_auto_dispatch, name="AutoDispatchThread", daemon=True).start()
+    try:
+        bot.main(mode)
+        if mode == 'webhook':
+            from webhook import serve_webhook
+            serve_webhook(bot.bot, bot.WEBHOOK_SECRET)
+    finally:
+        # Let the items being sent finish so they are acknowledged. Items that were not
+        # started stay in the queue journal and are sent after the restart.
+        bot.DISPATCHER.stop()
+        if not bot.DISPATCHER.wait_idle(max(1, SUPERVISOR_SHUTDOWN_TIMEOUT - 5)):
+            logger.warning("Stopping while items are still being sent; they will be sent again after the restart.")
+
+def run_media_worker_process(name):
+    """Media worker process: downloads videos and albums for the bot."""
+    import metrics
+    metrics.REGISTRY.export_snapshots(METRICS_SNAPSHOT_DIR, name, METRICS_SNAPSHOT_INTERVAL)
+    from media_workers import run_worker
+    run_worker(name)
+
+
+class ChildProcess:
+    """A supervised process and its restart bookkeeping."""
+
+    def __init__(self, name, target, args=()):
+        self.name = name
+        self.target = target
+        self.args = args
+        self.process = None
+        self.started_at = None
+        self.crashes = 0
+        self.restart_at = None
+
+
+class Supervisor:
+    """
+    Runs child processes and restarts them when they exit unexpectedly.
+
+    A crashed child is restarted after 'restart_delay' seconds, doubling
+    with every further crash up to 'restart_delay_max'; the delay is reset
+    once a child has run for 'stable_seconds'. On SIGTERM or Ctrl+C the
+    children are stopped with SIGTERM in the order they were given, and
+    killed if they do not exit within 'shutdown_timeout' seconds.
+    """
+
+    def __init__(self, children, restart_delay=SUPERVISOR_RESTART_DELAY, restart_delay_max=SUPERVISOR_RESTART_DELAY_MAX,
+                 stable_seconds=SUPERVISOR_STABLE_SECONDS, shutdown_timeout=SUPERVISOR_SHUTDOWN_TIMEOUT):
+        self.children = children
+        self.restart_delay = restart_delay
+        self.restart_delay_max = restart_delay_max
+        self.stable_seconds = stable_seconds
+        self.shutdown_timeout = shutdown_timeout
+        self._context = multiprocessing.get_context('spawn')
+        self._stopping = threading.Event()
+
+    def _start(self, child):
+        child.process = self._context.Process(
+            target=_child_main, args=(child.name, child.target, child.args), name=child.name
+        )
+        child.process.start()
+        child.started_at = time.monotonic()
+        child.restart_at = None
+        logger.info("Started %s (pid %s).", child.name, child.process.pid)
+
+    def _check(self, child):
+        """Schedule a restart for a child that exited, and restart it once its delay is over."""
+        now = time.monotonic()
+        if child.restart_at is None:
+            if child.process.is_alive():
+                return
+            if now - child.started_at >= self.stable_seconds:
+                child.crashes = 0
+            delay = min(self.restart_delay_max, self.restart_delay * 2 ** child.crashes)
+            child.crashes += 1
+            child.restart_at = now + delay
+            logger.error(
+                "%s exited with code %s after %.0fs; restarting in %.0fs.",
+                child.name, child.process.exitcode, now - child.started_at, delay,
+            )
+        elif now >= child.restart_at:
+            self._start(child)
+
+    def stop(self, *_):
+        """Ask the supervisor to shut down. Also used as the SIGTERM and SIGINT handler."""
+        self._stopping.set()
+
+    def run(self, poll_interval=0.5):
+        """Start all children and supervise them until stop() is called."""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for child in self.children:
+            self._start(child)
+        try:
+            while not self._stopping.wait(poll_interval):
+                for child in self.children:
+                    self._check(child)
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """Stop all children gracefully, in order, killing those that do not exit in time."""
+        logger.info("Shutting down %s processes...", len(self.children))
+        for child in self.children:
+            if child.process is not None and child.process.is_alive():
+                child.process.terminate()
+                child.process.join(self.shutdown_timeout)
+                if child.process.is_alive():
+                    logger.warning("%s did not stop within %ss, killing it.", child.name, self.shutdown_timeout)
+                    child.process.kill()
+                    child.process.join()
+                logger.info("%s stopped (exit code %s).", child.name, child.process.exitcode)
+
+
+def create_supervisor(workers, server, bot_mode):
+    """The processes of 'runserver --workers N': the bot, N media workers and the collector."""
+    # Snapshots of a previous run, e.g. with more workers, would be counted again.
+    for path in glob.glob(os.path.join(METRICS_SNAPSHOT_DIR, '*.json')):
+        os.remove(path)
+    children = [ChildProcess('bot', run_bot_process, (bot_mode,))]
+    children += [
+        ChildProcess(f'media-worker-{number}', run_media_worker_process, (f'media-worker-{number}',))
+        for number in range(1, workers + 1)
+    ]
+    # The collector is stopped last, so items can be collected until the very end.
+    children.append(ChildProcess('collector', run_collector_process, (server,)))
+    return Supervisor(children)
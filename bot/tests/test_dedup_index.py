@@ -0,0 +1,92 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+# Make the bot modules importable when running from the 'tests' directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dedup_index
+from dedup_index import DedupIndex
+
+
+class DedupIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="tt2tg_test_dedup_")
+        self.path = os.path.join(self.dir, 'dedup_index.ndjson')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def reload(self, max_entries=100, ttl=None):
+        index = DedupIndex(self.path, max_entries=max_entries, ttl=ttl)
+        self.assertTrue(index.load())
+        return index
+
+    def test_duplicates_are_detected_across_restarts(self):
+        index = DedupIndex(self.path, max_entries=100)
+        self.assertTrue(index.add('a'))
+        self.assertFalse(index.add('a'))
+        self.assertEqual(index.add_many(['a', 'b', 'c']), ['b', 'c'])
+        self.assertEqual(len(self.reload()), 3)
+        self.assertIn('b', self.reload())
+
+    def test_least_recently_seen_id_is_evicted(self):
+        index = DedupIndex(self.path, max_entries=2)
+        index.add('a')
+        index.add('b')
+        index.add('a')  # Seen again, so 'b' is now the least recently seen.
+        index.add('c')
+        self.assertIn('a', index)
+        self.assertNotIn('b', index)
+        # The refreshed order was logged, so a restart evicts the same ID.
+        reloaded = self.reload(max_entries=2)
+        self.assertEqual(set(reloaded._entries), {'a', 'c'})
+
+    def test_ttl_counts_from_the_last_sighting(self):
+        with mock.patch.object(dedup_index.time, 'time', return_value=1000.0):
+            index = DedupIndex(self.path, max_entries=100, ttl=60)
+            index.add('a')
+            index.add('b')
+        with mock.patch.object(dedup_index.time, 'time', return_value=1050.0):
+            self.assertFalse(index.add('a'))  # Refreshed at 1050.
+        with mock.patch.object(dedup_index.time, 'time', return_value=1100.0):
+            self.assertIn('a', index)
+            self.assertNotIn('b', index)
+            # An expired ID counts as new again.
+            self.assertTrue(index.add('b'))
+
+    def test_restored_ids_are_not_refreshed(self):
+        with mock.patch.object(dedup_index.time, 'time', return_value=1000.0):
+            index = DedupIndex(self.path, max_entries=100)
+            index.add('a')
+        with open(self.path, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+        with mock.patch.object(dedup_index.time, 'time', return_value=2000.0):
+            self.assertEqual(index.add_many(['a', 'b'], refresh=False), ['b'])
+        self.assertEqual(index._entries['a'], 1000.0)
+        self.assertEqual(os.path.getsize(self.path) - size, len('[2000.0, "b"]\n'))
+
+    def test_discarded_ids_stay_discarded_after_a_restart(self):
+        index = DedupIndex(self.path, max_entries=100)
+        index.add('a')
+        index.discard('a')
+        self.assertNotIn('a', index)
+        self.assertNotIn('a', self.reload())
+
+    def test_damaged_log_lines_are_skipped(self):
+        index = DedupIndex(self.path, max_entries=100)
+        index.add_many(['a', 'b'])
+        index._file.close()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('[1000.0, "c"\n[1000.0, "d"]\n')
+        self.assertEqual(set(self.reload()._entries), {'a', 'b', 'd'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# Make the bot modules importable when running from the 'tests' directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive_store import ArchiveStore
+from dispatcher import DeliveryLog, Dispatcher
+from queue_store import ItemQueue
+
+
+def _message(item_id):
+    return {'type': 'message', 'itemId': item_id, 'author': 'user', 'text': f"Message {item_id}"}
+
+
+class DeliveryLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="tt2tg_test_dispatcher_")
+        self.path = os.path.join(self.dir, 'sent_acks.ndjson')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_outcome_per_chat(self):
+        log = DeliveryLog(self.path, fsync=False)
+        log.load()
+        self.assertEqual(log.ack(['1', '2'], {10: {'1', '2'}, 20: {'1'}}), 1)
+        log.ack(['3'], {10: set()})
+        log.ack(['4'], {})
+        self.assertEqual(log.outcome(_message('1'))[0], 'sent')
+        self.assertEqual(log.outcome(_message('2'))[0], 'partial')
+        self.assertEqual(log.outcome(_message('2'))[2], {'10': 'sent', '20': 'failed'})
+        self.assertEqual(log.outcome(_message('3'))[0], 'failed')
+        self.assertEqual(log.outcome(_message('4'))[0], 'unrouted')
+
+    def test_acks_survive_a_restart_without_an_id_sidecar(self):
+        log = DeliveryLog(self.path, fsync=False)
+        log.load()
+        log.ack(['1'], {10: {'1'}})
+        reloaded = DeliveryLog(self.path, fsync=False)
+        reloaded.load()
+        self.assertTrue(reloaded.is_done(_message('1')))
+        self.assertFalse(os.path.exists(self.path + '.ids'))
+
+
+class DispatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="tt2tg_test_dispatcher_")
+        self.queue = ItemQueue(os.path.join(self.dir, 'queue.ndjson'), fsync=False)
+        self.log = DeliveryLog(os.path.join(self.dir, 'sent_acks.ndjson'), fsync=False)
+        self.log.load()
+        self.archive = ArchiveStore(os.path.join(self.dir, 'sent_archive'))
+        self.sent = []
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def process(self, items, should_stop):
+        """Send every item to chat 10, except items whose ID starts with 'fail'."""
+        for item in items:
+            self.sent.append(item['itemId'])
+            delivered = set() if item['itemId'].startswith('fail') else {item['itemId']}
+            yield [item['itemId']], {10: delivered}
+
+    def test_pending_count_skips_acknowledged_items(self):
+        self.queue.extend([_message(str(number)) for number in range(5)])
+        dispatcher = Dispatcher(self.queue, self.log, self.process, self.archive)
+        self.log.ack(['1', '3'], {10: {'1', '3'}})
+        self.assertEqual(dispatcher.pending_count(), 3)
+        self.assertEqual(dispatcher.pending_count(), sum(1 for _ in dispatcher.pending_items()))
+
+    def test_drain_acks_archives_and_keeps_new_items(self):
+        self.queue.extend([_message('1'), _message('fail-2'), _message('3')])
+        dispatcher = Dispatcher(self.queue, self.log, self.process, self.archive)
+        self.assertEqual(dispatcher.drain(), (3, 2))
+        # Newest first, like /send.
+        self.assertEqual(self.sent, ['3', 'fail-2', '1'])
+        self.assertEqual(dispatcher.pending_count(), 0)
+        self.assertEqual(self.archive.lookup('1')['status'], 'sent')
+        self.assertEqual(self.archive.lookup('fail-2')['status'], 'failed')
+
+        self.queue.append(_message('4'))
+        self.assertEqual(dispatcher.pending_count(), 1)
+        self.assertEqual(dispatcher.drain(), (1, 1))
+        self.assertEqual(self.sent[-1], '4')
+
+
+if __name__ == '__main__':
+    unittest.main()
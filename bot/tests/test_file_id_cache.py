@@ -0,0 +1,50 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# Make the bot modules importable when running from the 'tests' directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_id_cache import FileIdCache, item_key, content_key
+
+
+class FileIdCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="tt2tg_test_cache_")
+        self.cache = FileIdCache(os.path.join(self.dir, 'cache.ndjson'), max_entries=100)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_legacy_url_items_do_not_share_a_key(self):
+        # Legacy queue entries are plain URLs, normalized to items without an 'itemId'.
+        first = {'type': 'video', 'url': 'https://www.tiktok.com/@a/video/1'}
+        second = {'type': 'video', 'url': 'https://www.tiktok.com/@b/video/2'}
+        self.cache.put([item_key(first.get('itemId')), content_key('hash_of_first')], 'video', ['FILE_ID_1'])
+
+        self.assertIsNone(item_key(second.get('itemId')))
+        self.assertIsNone(self.cache.get(item_key(second.get('itemId')), 'video'))
+        self.assertIsNone(self.cache.file_ids_of(second))
+        # The content hash key still lets identical media be re-sent.
+        self.assertEqual(self.cache.get(content_key('hash_of_first'), 'video'), ['FILE_ID_1'])
+
+    def test_item_and_content_keys_survive_reload(self):
+        self.cache.put([item_key('1'), content_key('abc')], 'video', ['FILE_ID_1'])
+        cache = FileIdCache(self.cache.path, max_entries=100)
+        self.assertTrue(cache.load())
+        self.assertEqual(cache.file_ids_of({'type': 'video', 'itemId': '1'}), ['FILE_ID_1'])
+        self.assertIsNone(cache.get(item_key('1'), 'photo_video'))
+
+    def test_invalidate_by_file_id_drops_every_alias(self):
+        self.cache.put([item_key('1'), content_key('abc')], 'video', ['FILE_ID_1'])
+        self.assertEqual(self.cache.invalidate(file_ids=['FILE_ID_1']), 2)
+        self.assertIsNone(self.cache.get(content_key('abc'), 'video'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import os
+import sys
+import shutil
+import json
+import tempfile
+import threading
+import unittest
+
+# Make the bot modules importable when running from the 'tests' directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from queue_store import ItemQueue
+
+
+class TornTailTest(unittest.TestCase):
+    """A partial line left by a crash must not swallow the next item."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="tt2tg_test_queue_")
+        self.path = os.path.join(self.dir, 'queue.ndjson')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_append_after_torn_tail(self):
+        queue = ItemQueue(self.path, fsync=False)
+        queue.append({'type': 'message', 'itemId': 'a'})
+        queue._close()
+        with open(self.path, 'ab') as f:
+            f.write(b'{"itemId":"torn"')
+
+        queue = ItemQueue(self.path, fsync=False)
+        queue.append({'type': 'message', 'itemId': 'b'})
+        self.assertEqual([item['itemId'] for item in queue.iter_items()], ['a', 'b'])
+        self.assertEqual(queue.item_ids(), ['a', 'b'])
+        queue._close()
+
+
+class MigrateLegacyTest(unittest.TestCase):
+    """The collector and the bot may migrate the legacy queue at the same time."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="tt2tg_test_queue_")
+        self.path = os.path.join(self.dir, 'queue.ndjson')
+        self.json_path = os.path.join(self.dir, 'urls_to_send.json')
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump([f"https://www.tiktok.com/@user/video/{number}" for number in range(20000)], f)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_concurrent_migration_imports_items_once(self):
+        # Separate instances take the lock file like separate processes do.
+        queues = [ItemQueue(self.path, fsync=False) for _ in range(4)]
+        for queue in queues:
+            queue.share_between_processes()
+        start = threading.Barrier(len(queues))
+
+        def migrate(queue):
+            start.wait()
+            queue.migrate_legacy(self.json_path)
+
+        threads = [threading.Thread(target=migrate, args=(queue,)) for queue in queues]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(list(queues[0].iter_items())), 20000)
+        self.assertEqual(len(queues[0].item_ids()), 20000)
+        self.assertFalse(os.path.exists(self.json_path))
+        for queue in queues:
+            queue._close()
+
+
+if __name__ == '__main__':
+    unittest.main()
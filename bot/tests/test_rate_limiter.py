@@ -0,0 +1,81 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+# Make the bot modules importable when running from the 'tests' directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telebot.apihelper import ApiTelegramException
+import metrics
+import rate_limiter
+from rate_limiter import RateLimiter
+
+
+def _telegram_error(code, retry_after=None):
+    result_json = {'ok': False, 'error_code': code, 'description': f"Error {code}"}
+    if retry_after is not None:
+        result_json['parameters'] = {'retry_after': retry_after}
+    return ApiTelegramException('sendMessage', None, result_json)
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.limiter = RateLimiter(chat_rate=1000, min_rate=1, global_rate=1000, max_retries=2)
+        # Keep the jitter short, so the tests do not sleep for seconds.
+        patcher = mock.patch.object(rate_limiter, 'BACKOFF_BASE', 0.01)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_retries_after_429_and_counts_the_backoff_once(self):
+        responses = [_telegram_error(429, retry_after=0.05), 'sent']
+
+        def send():
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        wait_before = metrics.RATE_LIMIT_WAIT_SECONDS.value()
+        backoff_before = metrics.BACKOFF_SECONDS.value()
+        with metrics.span('item', 'message') as span:
+            self.assertEqual(self.limiter.call(1, send), 'sent')
+
+        self.assertEqual(self.limiter.throttled_count, 1)
+        backoff = self.limiter.backoff_seconds
+        self.assertGreaterEqual(backoff, 0.05)
+        self.assertAlmostEqual(metrics.BACKOFF_SECONDS.value() - backoff_before, backoff)
+        # The backoff is slept once and recorded once, not also as rate limiter wait.
+        self.assertLess(span.phases['sleep'], backoff + 0.02)
+        self.assertLess(metrics.RATE_LIMIT_WAIT_SECONDS.value() - wait_before, 0.02)
+        # The chat's rate was halved.
+        self.assertEqual(self.limiter.chat(1).rate, 500)
+
+    def test_gives_up_after_max_retries(self):
+        calls = []
+
+        def send():
+            calls.append(1)
+            raise _telegram_error(429, retry_after=0.01)
+
+        with self.assertRaises(ApiTelegramException):
+            self.limiter.call(2, send)
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_are_not_retried(self):
+        calls = []
+
+        def send():
+            calls.append(1)
+            raise _telegram_error(400)
+
+        with self.assertRaises(ApiTelegramException):
+            self.limiter.call(3, send)
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import os
+import sys
+import hashlib
+import unittest
+from unittest import mock
+
+# Make the bot modules importable when running from the 'tests' directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telebot.apihelper import ApiHTTPException, ApiTelegramException
+import stream_upload
+from stream_upload import StreamUnavailable, send_video_stream
+from rate_limiter import RateLimiter
+
+VIDEO = b'\x00\x01video' * 1000
+
+
+class FakeResponse:
+    def __init__(self, status_code, json_body=None, text=''):
+        self.status_code = status_code
+        self.reason = 'Fake'
+        self.text = text
+        self._json = json_body
+
+    def json(self):
+        if self._json is None:
+            raise ValueError("No JSON")
+        return self._json
+
+
+def _message(chat_id):
+    return {'message_id': 7, 'date': 0, 'chat': {'id': chat_id, 'type': 'private'}}
+
+
+class SendVideoStreamTest(unittest.TestCase):
+
+    def post(self, *responses):
+        """Patch the upload session to consume the body and answer with 'responses' in turn."""
+        responses = list(responses)
+        self.bodies = []
+
+        def post(url, data, headers, timeout):
+            body = b''.join(data)
+            self.assertEqual(len(body), len(data))
+            self.bodies.append(body)
+            return responses.pop(0)
+
+        patcher = mock.patch.object(stream_upload.UPLOAD_SESSION, 'post', side_effect=post)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_success_returns_message_and_digest(self):
+        self.post(FakeResponse(200, {'ok': True, 'result': _message(5)}))
+        message, digest = send_video_stream('1:TOKEN', 5, [VIDEO[:5000], VIDEO[5000:]], len(VIDEO), 'video.mp4')
+        self.assertEqual(message.chat.id, 5)
+        self.assertEqual(digest, hashlib.sha256(VIDEO).hexdigest())
+        self.assertIn(VIDEO, self.bodies[0])
+
+    def test_telegram_error_is_raised_as_api_telegram_exception(self):
+        self.post(FakeResponse(429, {
+            'ok': False, 'error_code': 429, 'description': "Too Many Requests", 'parameters': {'retry_after': 3},
+        }))
+        with self.assertRaises(ApiTelegramException) as raised:
+            send_video_stream('1:TOKEN', 5, [VIDEO], len(VIDEO), 'video.mp4')
+        self.assertEqual(raised.exception.error_code, 429)
+        self.assertEqual(RateLimiter._retry_after(raised.exception), 3)
+
+    def test_non_json_response_is_raised_as_http_error(self):
+        self.post(FakeResponse(502, text="Bad Gateway"))
+        with self.assertRaises(ApiHTTPException):
+            send_video_stream('1:TOKEN', 5, [VIDEO], len(VIDEO), 'video.mp4')
+
+    def test_short_source_is_not_sent_as_complete(self):
+        self.post(FakeResponse(200, {'ok': True, 'result': _message(5)}))
+        with self.assertRaises(StreamUnavailable):
+            send_video_stream('1:TOKEN', 5, [VIDEO[:100]], len(VIDEO), 'video.mp4')
+
+
+if __name__ == '__main__':
+    unittest.main()
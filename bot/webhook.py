@@ -0,0 +1,61 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import hmac
+import logging
+import telebot
+from flask import Flask, Blueprint, request, jsonify
+from config import WEBHOOK_PATH, WEBHOOK_PORT, COLLECTOR_HOST
+
+# --- Basic Setup ---
+# The logger is configured in 'main.py' to ensure a consistent format.
+logger = logging.getLogger(__name__)
+
+# Header Telegram uses to send the secret token given to 'setWebhook'.
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def create_webhook_blueprint(telegram_bot, secret_token, path=WEBHOOK_PATH):
+    """
+    Create a Flask blueprint that receives Telegram updates for 'telegram_bot'.
+
+    Requests without the matching secret token are rejected with 403. Valid
+    updates are passed to 'process_new_updates', which runs the message
+    handlers on telebot's worker threads, so Telegram gets its answer right
+    away even for long commands such as /send.
+    """
+    blueprint = Blueprint('telegram_webhook', __name__)
+
+    @blueprint.route(path, methods=['POST'])
+    def receive_update():
+        received_token = request.headers.get(SECRET_TOKEN_HEADER, '')
+        if not hmac.compare_digest(received_token.encode('utf-8'), secret_token.encode('utf-8')):
+            logger.warning("Rejected a webhook request with a missing or wrong secret token from %s.", request.remote_addr)
+            return jsonify({"status": "error", "message": "Forbidden"}), 403
+
+        try:
+            update = telebot.types.Update.de_json(request.get_data(as_text=True))
+        except Exception as e:
+            logger.error("Could not parse a webhook update: %s", e)
+            return jsonify({"status": "error", "message": "Invalid update"}), 400
+
+        telegram_bot.process_new_updates([update])
+        return jsonify({"status": "success"})
+
+    return blueprint
+
+
+def serve_webhook(telegram_bot, secret_token, host=COLLECTOR_HOST, port=WEBHOOK_PORT):
+    """
+    Serve the webhook route on its own server. Used in supervisor mode,
+    where the bot does not run in the same process as the collector.
+    """
+    app = Flask(__name__)
+    app.register_blueprint(create_webhook_blueprint(telegram_bot, secret_token))
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        logger.info("Starting Flask server for Telegram updates on http://%s:%s", host, port)
+        app.run(host=host, port=port, threaded=True)
+        return
+    logger.info("Starting waitress server for Telegram updates on http://%s:%s", host, port)
+    waitress_serve(app, host=host, port=port, threads=4)
@@ -0,0 +1,173 @@
+# Copyright NGGT.LightKeeper. All Rights Reserved.
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+import metrics
+from config import YTDLP_POOL_SIZE, YTDLP_MAX_JOBS, YTDLP_IDLE_TIMEOUT, TELEGRAM_MAX_UPLOAD_BYTES
+from download_spool import DOWNLOAD_SPOOL
+
+# --- Basic Setup ---
+# The logger is configured in 'main.py' to ensure a consistent format.
+logger = logging.getLogger(__name__)
+
+# yt_dlp is imported by the first worker, not here: its extractor registry takes a
+# noticeable time to load and most videos are downloaded without it.
+
+
+class VideoTooLargeError(Exception):
+    """Raised when every available format is larger than Telegram's upload limit."""
+
+
+def size_aware_format(max_bytes):
+    """
+    Build a yt-dlp format selector that only picks formats under 'max_bytes'.
+
+    Formats with an unknown size are still allowed ('<?'); the 'max_filesize'
+    option stops those downloads as soon as the server reports a larger size.
+    """
+    fits = f"[filesize<?{max_bytes}][filesize_approx<?{max_bytes}]"
+    return f"best[ext=mp4]{fits}/best{fits}/worst[ext=mp4]/worst"
+
+
+class _Worker:
+    """A long-lived YoutubeDL instance and its bookkeeping."""
+
+    def __init__(self, ydl_opts):
+        import yt_dlp
+        self.ydl = yt_dlp.YoutubeDL(ydl_opts)
+        self.jobs = 0
+        self.healthy = True
+        self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            self.ydl.close()
+        except Exception as e:
+            logger.debug("Error while closing a yt-dlp instance: %s", e)
+
+
+class YtdlpPool:
+    """
+    A pool of reusable YoutubeDL instances.
+
+    Keeping instances alive preserves extractor setup, cookies and open HTTP
+    connections between videos. At most 'size' downloads run at once. An
+    instance is replaced after 'max_jobs' downloads, after an unexpected
+    error, or when it sat idle for longer than 'idle_timeout' seconds.
+    """
+
+    def __init__(self, size, max_jobs, idle_timeout, max_bytes, download_dir):
+        self.max_bytes = max_bytes
+        self.max_jobs = max_jobs
+        self.idle_timeout = idle_timeout
+        self.ydl_opts = {
+            'outtmpl': os.path.join(download_dir, 'video_%(id)s.%(ext)s'),
+            'format': size_aware_format(max_bytes),
+            'max_filesize': max_bytes,
+            'quiet': True,
+            'no_warnings': True,
+        }
+        self._idle = []
+        self._slots = threading.Semaphore(size)
+        self._lock = threading.Lock()
+
+    def _is_usable(self, worker):
+        """Health check run before an idle instance is handed out again."""
+        if not worker.healthy or worker.jobs >= self.max_jobs:
+            return False
+        return time.monotonic() - worker.last_used < self.idle_timeout
+
+    @contextmanager
+    def acquire(self):
+        """Borrow a YoutubeDL instance, creating or recycling one as needed."""
+        with self._slots:
+            worker = None
+            with self._lock:
+                while self._idle:
+                    candidate = self._idle.pop()
+                    if self._is_usable(candidate):
+                        worker = candidate
+                        break
+                    candidate.close()
+            if worker is None:
+                worker = _Worker(self.ydl_opts)
+            try:
+                yield worker.ydl
+            except Exception as e:
+                # Ordinary extraction failures (e.g. a deleted video) do not affect the instance.
+                from yt_dlp.utils import DownloadError
+                if not isinstance(e, DownloadError):
+                    worker.healthy = False
+                raise
+            finally:
+                worker.jobs += 1
+                worker.last_used = time.monotonic()
+                if self._is_usable(worker):
+                    with self._lock:
+                        self._idle.append(worker)
+                else:
+                    worker.close()
+
+    def download(self, url):
+        """
+        Download the best format of 'url' that fits under the upload limit.
+        Returns the path of the downloaded file.
+        """
+        with self.acquire() as ydl, metrics.YTDLP_SECONDS.time():
+            info_dict = ydl.extract_info(url, download=True)
+            video_path = ydl.prepare_filename(info_dict)
+
+        if not os.path.exists(video_path):
+            # yt-dlp skips downloads that exceed 'max_filesize' instead of failing.
+            size = info_dict.get('filesize') or info_dict.get('filesize_approx')
+            raise VideoTooLargeError(
+                f"No format of {url} fits under {self.max_bytes} bytes (selected format: {size} bytes)."
+            )
+        metrics.DOWNLOAD_BYTES.inc(os.path.getsize(video_path), source='ytdlp')
+        return video_path
+
+    def open_stream(self, url):
+        """
+        Open the format of 'url' yt-dlp selects for reading, without downloading it to a file.
+
+        Returns (response, size), where 'response.read(n)' returns the video
+        bytes, or None if the format cannot be streamed: if it is made of
+        separate video and audio streams that yt-dlp would merge, uses a
+        segmented protocol such as HLS, or its size is not known up front.
+        The caller must close the response.
+        """
+        with self.acquire() as ydl:
+            with metrics.YTDLP_SECONDS.time():
+                info_dict = ydl.extract_info(url, download=False)
+            if info_dict.get('requested_formats') or info_dict.get('protocol') not in ('http', 'https'):
+                return None
+            # yt-dlp sends the headers and cookies the extractor set up.
+            from yt_dlp.networking import Request
+            response = ydl.urlopen(Request(info_dict['url'], headers=info_dict.get('http_headers') or {}))
+
+        size = response.headers.get('Content-Length')
+        size = int(size) if size and size.isdigit() else None
+        if not size or size > self.max_bytes or response.headers.get('Content-Encoding', 'identity') != 'identity':
+            response.close()
+            return None
+        return response, size
+
+    def close(self):
+        """Close all idle instances."""
+        with self._lock:
+            for worker in self._idle:
+                worker.close()
+            self._idle.clear()
+
+
+# --- Shared Instance ---
+YTDLP_POOL = YtdlpPool(
+    size=YTDLP_POOL_SIZE,
+    max_jobs=YTDLP_MAX_JOBS,
+    idle_timeout=YTDLP_IDLE_TIMEOUT,
+    max_bytes=TELEGRAM_MAX_UPLOAD_BYTES,
+    download_dir=DOWNLOAD_SPOOL.root,
+)
@@ -124,23 +124,107 @@ chrome.webRequest.onCompleted.addListener(
   { urls: [ `${ITEM_DETAIL_URL}*` ] }
 );
 
+// --- Batched Upload to the Local Server ---
+
+const SERVER_URL = "http://127.0.0.1:5000/send_items";
+const BATCH_MAX_ITEMS = 25;    // Send a batch as soon as it holds this many items.
+const BATCH_MAX_DELAY_MS = 500; // Otherwise send whatever has been gathered after this delay.
+const RETRY_MAX_ATTEMPTS = 6;   // Attempts per batch while the server is busy or unreachable.
+const RETRY_BASE_DELAY_MS = 1000; // First backoff delay, doubled on every further attempt.
+
+// Items waiting for the next batch, each with the callbacks of its sendToServer() promise.
+let pendingBatch = [];
+let batchTimer = null;
+
 /**
- * Sends a data payload to the local Python server.
+ * Queues a data payload for the local Python server.
+ * Items are gathered into short batches, so a burst of intercepted items costs one request.
  * @param {object} payload The data to send.
+ * @returns {Promise<void>} Resolves once the batch containing the payload has been accepted.
  */
-async function sendToServer(payload) {
-    const serverResponse = await fetch("http://127.0.0.1:5000/send_item", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(payload),
-    });
-
-    if (!serverResponse.ok) {
-        throw new Error(`Server responded with status: ${serverResponse.status}`);
+function sendToServer(payload) {
+  return new Promise((resolve, reject) => {
+    pendingBatch.push({ payload, resolve, reject });
+    if (pendingBatch.length >= BATCH_MAX_ITEMS) {
+      flushBatch();
+    } else if (batchTimer === null) {
+      batchTimer = setTimeout(flushBatch, BATCH_MAX_DELAY_MS);
     }
+  });
+}
+
+/**
+ * Compresses a string with gzip, if the browser supports CompressionStream.
+ * @param {string} text The text to compress.
+ * @returns {Promise<{body: BodyInit, encoding: string|null}>} The request body and its encoding.
+ */
+async function gzipText(text) {
+  if (typeof CompressionStream === 'undefined') {
+    return { body: text, encoding: null };
+  }
+  const stream = new Blob([text]).stream().pipeThrough(new CompressionStream('gzip'));
+  return { body: await new Response(stream).blob(), encoding: 'gzip' };
+}
+
+/**
+ * Returns how long to wait before retrying a batch.
+ * The server's 'Retry-After' header (in seconds) wins over the exponential backoff.
+ * @param {Response|null} response The busy response, or null if the server was unreachable.
+ * @param {number} attempt The number of attempts made so far.
+ * @returns {number} The delay in milliseconds.
+ */
+function retryDelay(response, attempt) {
+  const retryAfter = response ? parseFloat(response.headers.get('Retry-After')) : NaN;
+  const backoff = RETRY_BASE_DELAY_MS * 2 ** (attempt - 1);
+  // Jitter keeps several service worker instances from retrying in lockstep.
+  const delay = Number.isFinite(retryAfter) ? retryAfter * 1000 : backoff;
+  return delay * (1 + Math.random() * 0.25);
+}
+
+/**
+ * Sends all queued items to the server as one gzip-compressed NDJSON request.
+ * While the server answers 429/503 or cannot be reached, the batch is retried with backoff.
+ */
+async function flushBatch() {
+  clearTimeout(batchTimer);
+  batchTimer = null;
+  const batch = pendingBatch;
+  pendingBatch = [];
+  if (batch.length === 0) return;
+
+  try {
+    const ndjson = batch.map((entry) => JSON.stringify(entry.payload)).join('\n');
+    const { body, encoding } = await gzipText(ndjson);
+    const headers = { "Content-Type": "application/x-ndjson" };
+    if (encoding) headers["Content-Encoding"] = encoding;
+
+    for (let attempt = 1; ; attempt++) {
+      let serverResponse = null;
+      try {
+        serverResponse = await fetch(SERVER_URL, { method: "POST", headers, body });
+      } catch (networkError) {
+        if (attempt >= RETRY_MAX_ATTEMPTS) throw networkError;
+      }
+
+      if (serverResponse && serverResponse.ok) {
+        const serverData = await serverResponse.json();
+        console.log(`Server response for a batch of ${batch.length} items:`, serverData);
+        batch.forEach((entry) => entry.resolve());
+        return;
+      }
 
-    const serverData = await serverResponse.json();
-    console.log("Server response:", serverData);
+      const busy = !serverResponse || serverResponse.status === 429 || serverResponse.status === 503;
+      if (!busy || attempt >= RETRY_MAX_ATTEMPTS) {
+        throw new Error(`Server responded with status: ${serverResponse ? serverResponse.status : 'unreachable'}`);
+      }
+
+      const delay = retryDelay(serverResponse, attempt);
+      console.warn(`Server is busy, retrying a batch of ${batch.length} items in ${Math.round(delay)} ms.`);
+      await new Promise((resolve) => setTimeout(resolve, delay));
+    }
+  } catch (error) {
+    batch.forEach((entry) => entry.reject(error));
+  }
 }
 
 // --- Communication from Content & Popup Scripts ---